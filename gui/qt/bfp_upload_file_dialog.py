@@ -1,6 +1,5 @@
 import copy
 import datetime
-import time
 from functools import partial
 import json
 import threading
@@ -20,12 +19,10 @@ from electroncash.plugins import run_hook
 from .util import *
 
 from electroncash.util import bfh, format_satoshis_nofloat, format_satoshis_plain_nofloat, NotEnoughFunds, ExcessiveFee, InvalidPassword
-from electroncash.transaction import Transaction
 
 from electroncash import bitcoinfiles
 
 from .transaction_dialog import show_transaction
-from electroncash.slp_checker import SlpTransactionChecker
 
 from electroncash.bitcoinfiles import *
 
@@ -34,6 +31,9 @@ dialogs = []  # Otherwise python randomly garbage collects the dialogs...
 
 class BitcoinFilesUploadDialog(QDialog, MessageBoxMixin):
 
+    progress_sig = pyqtSignal(int, int)
+    sign_hook_sig = pyqtSignal(object)
+
     def __init__(self, parent, file_receiver=None, show_on_create=False, screen_name="Upload Token Document"):
         # We want to be a top-level window
         QDialog.__init__(self, parent)
@@ -166,6 +166,10 @@ class BitcoinFilesUploadDialog(QDialog, MessageBoxMixin):
         self.progress.setHidden(True)
         self.progress.setGeometry(200, 80, 250, 20)
         vbox.addWidget(self.progress)
+        self.progress_sig.connect(self.progress_slot, Qt.QueuedConnection)
+        # The chain is signed on a worker thread, which waits for the hook to
+        # have run in the GUI thread before signing each tx.
+        self.sign_hook_sig.connect(self.sign_hook_slot, Qt.BlockingQueuedConnection)
 
         hbox = QHBoxLayout()
         vbox.addLayout(hbox)
@@ -289,7 +293,7 @@ class BitcoinFilesUploadDialog(QDialog, MessageBoxMixin):
                 self.bitcoinfileAddr_label.setText('')
 
                 bytes = f.read()
-                if len(bytes) > 5261:
+                if len(bytes) > MAX_UPLOAD_BYTES:
                     self.show_error("Files cannot be larger than 5.261kB in size.")
                     return
                 import hashlib
@@ -317,105 +321,54 @@ class BitcoinFilesUploadDialog(QDialog, MessageBoxMixin):
                     self.main_window.token_type_combo.setCurrentIndex(0)
                     assert self.main_window.slp_token_id is None
 
-                try:
-                    self.tx_batch.append(getFundingTxn(self.parent.wallet, addr, cost, self.parent.config))
-                    self.progress_label.setText('')
-                except NotEnoughFunds:
-                    self.show_message("Insufficient funds.\n\nYou must have a CONFIRMED balance of at least: " + str(cost) + " satoshis.")
-                    self.progress_label.setText('')
-                    self.filename = None
-                    self.make_dirty()
-                    return
-
-                # Rewind and put file into chunks
-                f.seek(0, 0)
-                chunks = []
-                while True:
-                    b = f.read(220)
-                    if b == b'': break
-                    try:
-                        chunks.append(b)
-                        self.chunks_total += 1
-                    except ValueError:
-                        break
-
-                min_len = 223 - len(make_bitcoinfile_metadata_opreturn(1, 0, None, self.metadata['filename'], self.metadata['fileext'], self.metadata['filesize'], self.metadata['file_sha256'], self.metadata['prev_file_sha256'], self.metadata['uri'])[1].to_script())
-                
-                # determine if the metadata txn data chunk will be empty for progress bar accuracy
-                if len(bytes) < 220:
-                    chunk_count_adder = 1 if len(bytes) > min_len else 0
-                else:
-                    chunk_count_adder = 1 if min_len - (len(bytes) % 220) < 0 else 0
-
-                self.progress.setMaximum(len(chunks) + chunk_count_adder + 1)
                 self.progress.setMinimum(0)
+                self.progress.setValue(0)
                 self.progress.setVisible(True)
-                self.progress_label.setText("Signing 1 of " + str(len(chunks) + chunk_count_adder + 1) + " transactions")
-                
-                # callback to recursive sign next txn or finish
-                def sign_done(success):
-                    if success:
-                        self.tx_batch_signed_count += 1
-                        self.progress.setValue(self.tx_batch_signed_count)
-                        self.activateWindow()
-                        self.raise_()
-                        self.progress_label.setText("Signing " + str(self.tx_batch_signed_count + 1) + " of " + str(len(chunks) + chunk_count_adder + 1) + " transactions")
-                        if self.chunks_processed <= self.chunks_total and not self.final_metadata_txn_created:
-                            try:
-                                chunk_bytes = chunks[self.chunks_processed]
-                            except IndexError:
-                                chunk_bytes = None
-                            try:
-                                txn, self.final_metadata_txn_created = getUploadTxn(self.parent.wallet, self.tx_batch[self.chunks_processed], self.chunks_processed, self.chunks_total, chunk_bytes, self.parent.config, self.metadata, self.file_receiver)
-                                self.tx_batch.append(txn)
-                            except NotEnoughFunds as e:
-                                self.show_message("Insufficient funds for file chunk #" + str(self.chunks_processed + 1))
-                                return
-                            self.chunks_processed += 1
-
-                        if self.tx_batch_signed_count < len(self.tx_batch):
-                            self.sign_tx_with_password(self.tx_batch[self.tx_batch_signed_count], sign_done, self.password)
-                        else:
-                            uri = "bitcoinfile:" + self.tx_batch[len(self.tx_batch)-1].txid()
-                            self.bitcoinfileAddr_label.setText(uri)
-                            self.progress_label.setText("Signing complete. Ready to upload.")
-                            self.progress.setHidden(True)
-                            self.is_dirty = False
-                            self.progress.setValue(0)
-                            self.sign_button.setDisabled(True)
-                            self.upload_button.setEnabled(True)
-                            self.upload_button.setDefault(True)
-                            self.activateWindow()
-                            self.raise_()
-                self.sign_tx_with_password(self.tx_batch[0], sign_done, self.password)
-
-    def sign_tx_with_password(self, tx, callback, password):
-        '''Sign the transaction in a separate thread.  When done, calls
-        the callback with a success code of True or False.
-        '''
-        
-        # check transaction SLP validity before signing
-        try:
-            assert SlpTransactionChecker.check_tx_slp(self.wallet, tx, require_tx_in_wallet=False)
-        except (Exception, AssertionError) as e:
-            self.show_error(str(e))
-            return
-
+                self.progress_label.setText("Signing transactions")
+
+                # Build and sign the whole chain in one pass, with the password given when the dialog was opened
+                task = partial(make_upload_chain, self.wallet, self.parent.config, bytes, self.metadata, self.password,
+                               funding_address=addr, file_receiver=self.file_receiver,
+                               on_progress=self.progress_sig.emit,
+                               external_keypairs=self.main_window.tx_external_keypairs or None,
+                               before_sign=self.sign_hook_sig.emit)
+
+                def on_signed(txs):
+                    self.tx_batch = txs
+                    uri = "bitcoinfile:" + txs[-1].txid()
+                    self.bitcoinfileAddr_label.setText(uri)
+                    self.progress_label.setText("Signing complete. Ready to upload.")
+                    self.progress.setHidden(True)
+                    self.is_dirty = False
+                    self.progress.setValue(0)
+                    self.sign_button.setDisabled(True)
+                    self.upload_button.setEnabled(True)
+                    self.upload_button.setDefault(True)
+                    self.activateWindow()
+                    self.raise_()
+
+                def on_failed(exc_info):
+                    self.progress.setHidden(True)
+                    self.progress_label.setText('')
+                    if isinstance(exc_info[1], NotEnoughFunds):
+                        self.show_message("Insufficient funds.\n\nYou must have a CONFIRMED balance of at least: " + str(cost) + " satoshis.")
+                        self.filename = None
+                        self.make_dirty()
+                    else:
+                        self.show_error(str(exc_info[1]))
+
+                WaitingDialog(self, _('Signing transactions...'), task, on_signed, on_failed)
+
+    @pyqtSlot(int, int)
+    def progress_slot(self, done, total):
+        self.progress.setMaximum(total)
+        self.progress.setValue(done)
+
+    @pyqtSlot(object)
+    def sign_hook_slot(self, tx):
         # call hook to see if plugin needs gui interaction
         run_hook('sign_tx', self, tx)
 
-        def on_signed(result):
-            callback(True)
-        def on_failed(exc_info):
-            self.on_error(exc_info)
-            callback(False)
-
-        if self.main_window.tx_external_keypairs:
-            task = partial(Transaction.sign, tx, self.main_window.tx_external_keypairs)
-        else:
-            task = partial(self.wallet.sign_transaction, tx, password)
-        WaitingDialog(self, _('Signing transaction...'), task, on_signed, on_failed)
-
     def select_file(self):
         if self.wallet.has_password():
             if self.password == None:
@@ -443,38 +396,34 @@ class BitcoinFilesUploadDialog(QDialog, MessageBoxMixin):
         
     def upload(self):
         if not self.is_dirty:
-            self.progress_label.setText("Broadcasting 1 of " + str(len(self.tx_batch)) + " transactions")
+            self.progress_label.setText("Broadcasting " + str(len(self.tx_batch)) + " transactions")
             self.progress.setVisible(True)
             self.progress.setMinimum(0)
             self.progress.setMaximum(len(self.tx_batch))
-            broadcast_count = 0
-            # Broadcast all transaction to the nexwork
-            for tx in self.tx_batch:
-                tx_desc = None
-                status, msg = self.network.broadcast_transaction(tx)
-                # print(status)
-                # print(msg)
-                if status == False:
-                    self.show_error(msg)
-                    self.show_error("Upload failed. Try again.")
-                    return
+            self.progress.setValue(0)
+            self.upload_button.setDisabled(True)
 
-                broadcast_count += 1
-                time.sleep(0.1)
-                self.progress_label.setText("Broadcasting " + str(broadcast_count) + " of " + str(len(self.tx_batch)) + " transactions")
-                self.progress.setValue(broadcast_count)
-                QApplication.processEvents()
+            # Broadcast all transactions to the network, several at a time
+            task = partial(broadcast_upload_chain, self.network, self.tx_batch, on_progress=self.progress_sig.emit)
 
-            self.progress_label.setText("Broadcasting complete.")
-            self.progress.setHidden(True)
-            try:
-                self.parent.token_dochash_e.setText(self.hash.text())
-                self.parent.token_url_e.setText(self.bitcoinfileAddr_label.text())
-            except AttributeError:
-                pass
+            def on_done(file_id):
+                self.progress_label.setText("Broadcasting complete.")
+                self.progress.setHidden(True)
+                try:
+                    self.parent.token_dochash_e.setText(self.hash.text())
+                    self.parent.token_url_e.setText(self.bitcoinfileAddr_label.text())
+                except AttributeError:
+                    pass
+
+                self.show_message("File upload complete.")
+                self.close()
+
+            def on_failed(exc_info):
+                self.upload_button.setEnabled(True)
+                self.show_error(str(exc_info[1]))
+                self.show_error("Upload failed. Try again.")
 
-            self.show_message("File upload complete.")
-            self.close()
+            WaitingDialog(self, _('Broadcasting transactions...'), task, on_done, on_failed)
 
     def closeEvent(self, event):
         event.accept()
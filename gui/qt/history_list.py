@@ -26,7 +26,7 @@
 from .util import *
 import electroncash.web as web
 from electroncash.i18n import _
-from electroncash.util import timestamp_to_datetime, profiler, Weak
+from electroncash.util import profiler, Weak
 
 
 TX_ICONS = [
@@ -72,8 +72,9 @@ class HistoryList(MyTreeWidget):
         self.update_headers(headers)
 
     def get_domain(self):
-        '''Replaced in address_dialog.py'''
-        return self.wallet.get_addresses()
+        '''Replaced in address_dialog.py. None is the whole wallet, for which
+        the wallet's history index is used.'''
+        return None
 
     @rate_limited(1.0, classlevel=True, ts_after=True) # We rate limit the history list refresh no more than once every second, app-wide
     def update(self):
@@ -116,7 +117,12 @@ class HistoryList(MyTreeWidget):
         self.has_unknown_balances = False
         fx = self.parent.fx
         if fx: fx.history_used_spot = False
-        for h_item in h:
+        show_fx = fx and fx.show_history()
+        if show_fx:
+            now = time.time()
+            fx_rates = fx.history_rates([now if conf <= 0 else timestamp
+                                         for _, _, conf, timestamp, _, _ in h])
+        for n, h_item in enumerate(h):
             tx_hash, height, conf, timestamp, value, balance = h_item
             label = self.wallet.get_label(tx_hash)
             if value is None or balance is None:
@@ -132,10 +138,9 @@ class HistoryList(MyTreeWidget):
             v_str = self.parent.format_amount(value, True, whitespaces=True)
             balance_str = self.parent.format_amount(balance, whitespaces=True)
             entry = ['', tx_hash, status_str, label, v_str, balance_str]
-            if fx and fx.show_history():
-                date = timestamp_to_datetime(time.time() if conf <= 0 else timestamp)
+            if show_fx:
                 for amount in [value, balance]:
-                    text = fx.historical_value_str(amount, date)
+                    text = fx.value_str(amount, fx_rates[n])
                     entry.append(text)
             item = SortableTreeWidgetItem(entry)
             if icon: item.setIcon(0, icon)
@@ -50,7 +50,7 @@ from electroncash.util import (format_time, format_satoshis, PrintError,
                                format_fee_satoshis, Weak, print_error)
 import electroncash.web as web
 from electroncash import Transaction
-from electroncash import util, bitcoin, commands
+from electroncash import util, bitcoin, commands, metrics
 from electroncash import paymentrequest
 from electroncash.wallet import Multisig_Wallet, sweep_preparations
 try:
@@ -110,6 +110,7 @@ class StatusBarButton(QPushButton):
 
 from electroncash.paymentrequest import PR_PAID
 
+GUI_UPDATE_SECONDS = metrics.histogram('gui_update_seconds', 'Time taken by full wallet window updates')
 
 class ElectrumWindow(QMainWindow, MessageBoxMixin, PrintError):
 
@@ -1143,6 +1144,7 @@ class ElectrumWindow(QMainWindow, MessageBoxMixin, PrintError):
     @rate_limited(1.0, classlevel=True, ts_after=True) # Limit tab updates to no more than 1 per second, app-wide. Multiple calls across instances will be collated into 1 deferred series of calls (1 call per extant instance)
     def update_tabs(self):
         if self.cleaned_up: return
+        t0 = time.time()
         self.history_list.update()
         self.request_list.update()
         self.address_list.update()
@@ -1154,6 +1156,7 @@ class ElectrumWindow(QMainWindow, MessageBoxMixin, PrintError):
             self.slp_history_list.update()
             self.token_list.update()
         self.history_updated_signal.emit() # inform things like address_dialog that there's a new history, also clears self.tx_update_mgr.verif_q
+        GUI_UPDATE_SECONDS.observe(time.time() - t0)
         self.need_update.clear() # clear flag
         if self.labels_need_update.is_set():
             # if flag was set, might as well declare the labels updated since they necessarily were due to a full update.
@@ -2696,10 +2699,11 @@ class ElectrumWindow(QMainWindow, MessageBoxMixin, PrintError):
             self.on_error(exc_info)
             callback(False)
 
+        num_workers = self.config.get_sign_workers()
         if self.tx_external_keypairs:
-            task = partial(Transaction.sign, tx, self.tx_external_keypairs, use_cache=True)
+            task = partial(Transaction.sign, tx, self.tx_external_keypairs, use_cache=True, num_workers=num_workers)
         else:
-            task = partial(self.wallet.sign_transaction, tx, password, use_cache=True)
+            task = partial(self.wallet.sign_transaction, tx, password, use_cache=True, num_workers=num_workers)
         WaitingDialog(self, _('Signing transaction...'), task,
                       on_signed, on_failed)
 
@@ -4334,54 +4338,63 @@ class ElectrumWindow(QMainWindow, MessageBoxMixin, PrintError):
         def task():
             def update_prog(x):
                 if dlg: dlg.update_progress(int(x*100))
-            return wallet.export_history(fx=self.fx,
-                                         show_addresses=include_addresses,
-                                         decimal_point=self.decimal_point,
-                                         fee_calc_timeout=timeout,
-                                         download_inputs=download_inputs,
-                                         progress_callback=update_prog)
-        success = False
-        def on_success(history):
-            nonlocal success
+            history = wallet.export_history_iter(fx=self.fx,
+                                                 show_addresses=include_addresses,
+                                                 decimal_point=self.decimal_point,
+                                                 fee_calc_timeout=timeout,
+                                                 download_inputs=download_inputs,
+                                                 progress_callback=update_prog)
             ccy = (self.fx and self.fx.get_currency()) or ''
-            has_fiat_columns = history and self.fx and self.fx.show_history() and 'fiat_value' in history[0] and 'fiat_balance' in history[0] and 'fiat_fee' in history[0]
-            lines = []
-            for item in history:
-                if is_csv:
-                    cols = [item['txid'], item.get('label', ''), item['confirmations'], item['value'], item['fee'], item['date']]
-                    if has_fiat_columns:
-                        cols += [item['fiat_value'], item['fiat_balance'], item['fiat_fee']]
-                    if include_addresses:
-                        inaddrs_filtered = (x for x in (item.get('input_addresses') or [])
-                                            if Address.is_valid(x))
-                        outaddrs_filtered = (x for x in (item.get('output_addresses') or [])
-                                             if Address.is_valid(x))
-                        cols.append( ','.join(inaddrs_filtered) )
-                        cols.append( ','.join(outaddrs_filtered) )
-                    lines.append(cols)
-                else:
-                    if has_fiat_columns and ccy:
-                        item['fiat_currency'] = ccy  # add the currency to each entry in the json. this wastes space but json is bloated anyway so this won't hurt too much, we hope
-                    elif not has_fiat_columns:
-                        # No need to include these fields as they will always be 'No Data'
-                        item.pop('fiat_value', None)
-                        item.pop('fiat_balance', None)
-                        item.pop('fiat_fee', None)
-                    lines.append(item)
-
+            has_fiat_columns = None  # determined from the first item
+            # Items are written out as they are produced, rather than all at
+            # the end, to keep memory use down on huge wallets.
             with open(fileName, "w+", encoding="utf-8") as f:  # ensure encoding to utf-8. Avoid Windows cp1252. See #1453.
                 if is_csv:
                     transaction = csv.writer(f, lineterminator='\n')
-                    cols = ["transaction_hash","label", "confirmations", "value", "fee", "timestamp"]
-                    if has_fiat_columns:
-                        cols += [f"fiat_value_{ccy}", f"fiat_balance_{ccy}", f"fiat_fee_{ccy}"]  # in CSV mode, we use column names eg fiat_value_USD, etc
-                    if include_addresses:
-                        cols += ["input_addresses", "output_addresses"]
-                    transaction.writerow(cols)
-                    for line in lines:
-                        transaction.writerow(line)
                 else:
-                    f.write(json.dumps(lines, indent=4))
+                    f.write('[')
+                for n, item in enumerate(history):
+                    if has_fiat_columns is None:
+                        has_fiat_columns = bool(self.fx and self.fx.show_history() and 'fiat_value' in item and 'fiat_balance' in item and 'fiat_fee' in item)
+                        if is_csv:
+                            cols = ["transaction_hash","label", "confirmations", "value", "fee", "timestamp"]
+                            if has_fiat_columns:
+                                cols += [f"fiat_value_{ccy}", f"fiat_balance_{ccy}", f"fiat_fee_{ccy}"]  # in CSV mode, we use column names eg fiat_value_USD, etc
+                            if include_addresses:
+                                cols += ["input_addresses", "output_addresses"]
+                            transaction.writerow(cols)
+                    if is_csv:
+                        cols = [item['txid'], item.get('label', ''), item['confirmations'], item['value'], item['fee'], item['date']]
+                        if has_fiat_columns:
+                            cols += [item['fiat_value'], item['fiat_balance'], item['fiat_fee']]
+                        if include_addresses:
+                            inaddrs_filtered = (x for x in (item.get('input_addresses') or [])
+                                                if Address.is_valid(x))
+                            outaddrs_filtered = (x for x in (item.get('output_addresses') or [])
+                                                 if Address.is_valid(x))
+                            cols.append( ','.join(inaddrs_filtered) )
+                            cols.append( ','.join(outaddrs_filtered) )
+                        transaction.writerow(cols)
+                    else:
+                        if has_fiat_columns and ccy:
+                            item['fiat_currency'] = ccy  # add the currency to each entry in the json. this wastes space but json is bloated anyway so this won't hurt too much, we hope
+                        elif not has_fiat_columns:
+                            # No need to include these fields as they will always be 'No Data'
+                            item.pop('fiat_value', None)
+                            item.pop('fiat_balance', None)
+                            item.pop('fiat_fee', None)
+                        # same layout as json.dumps(list_of_items, indent=4)
+                        f.write(',' if n else '')
+                        f.write('\n    ' + json.dumps(item, indent=4).replace('\n', '\n    '))
+                if is_csv:
+                    if has_fiat_columns is None:
+                        transaction.writerow(["transaction_hash","label", "confirmations", "value", "fee", "timestamp"]
+                                             + (["input_addresses", "output_addresses"] if include_addresses else []))
+                else:
+                    f.write('\n]' if has_fiat_columns is not None else ']')
+        success = False
+        def on_success(_):
+            nonlocal success
             success = True
         # kick off the waiting dialog to do all of the above
         dlg = WaitingDialog(self.top_level_window(),
@@ -129,9 +129,8 @@ class SlpMgt(MyTreeWidget):
             SlpBurnTokenDialog(self.parent, token_id_hex = current.data(0, Qt.UserRole), token_name=current.text(1))
 
     def get_balance_from_token_id(self,slpTokenId):
-        # implement by looking at UTXO for this token!
-        # for now return dummy value.
-        bal=self.parent.wallet.get_slp_token_balance(slpTokenId, self.parent.config)[0]
+        # on_update fetches the balances of all tokens at once, into self._balances
+        bal = self._balances.get(slpTokenId, (0,))[0]
         return bal
 
     @rate_limited(.333, classlevel=True, ts_after=True) # We rate limit the slp mgt refresh no more than 3 times every second, app-wide
@@ -145,6 +144,7 @@ class SlpMgt(MyTreeWidget):
         selected_item = self.currentItem()
         current_token_id = selected_item.data(0, Qt.UserRole) if selected_item else None
         self.clear()
+        self._balances = self.parent.wallet.get_slp_token_balances(self.parent.config)
         tokens = self.parent.wallet.token_types.copy()
         for token_id, i in tokens.items():
             name     = i["name"]
@@ -30,6 +30,7 @@ import struct
 from . import cashaddr, networks
 from enum import IntEnum
 from .bitcoin import EC_KEY, is_minikey, minikey_to_private_key, SCRIPT_TYPES
+from .caches import ExpiringCache
 from .util import cachedproperty, inv_dict
 
 _sha256 = hashlib.sha256
@@ -462,12 +463,26 @@ class Address(namedtuple("AddressTuple", "hash160 kind")):
     # Default to CashAddr using 'simpleledger' or 'slptest' prefix
     FMT_UI = FMT_SLPADDR
 
+    # Formatted strings, only allocated on first use by to_string().  If
+    # not None this is a list of: [net, str_fmt_0, str_fmt_1, ...]
+    _addr2str_cache = None
+
+    # Identical (hash160, kind) pairs share one instance. Addresses are
+    # immutable so this is safe, and large wallets otherwise create many
+    # duplicate instances while loading and walking the history.
+    _intern_cache = ExpiringCache(maxlen=100000, name="Address intern cache")
+    # (string, net) -> Address, for from_string()
+    _decode_cache = ExpiringCache(maxlen=100000, name="Address decode cache")
+
     def __new__(cls, hash160, kind):
-        assert kind in (cls.ADDR_P2PKH, cls.ADDR_P2SH)
         hash160 = to_bytes(hash160)
-        assert len(hash160) == 20, "hash must be 20 bytes"
-        ret = super().__new__(cls, hash160, kind)
-        ret._addr2str_cache = [None] * cls._NUM_FMTS
+        key = (cls, hash160, kind)
+        ret = cls._intern_cache.get(key)
+        if ret is None:
+            assert kind in (cls.ADDR_P2PKH, cls.ADDR_P2SH)
+            assert len(hash160) == 20, "hash must be 20 bytes"
+            ret = super().__new__(cls, hash160, kind)
+            cls._intern_cache.put(key, ret)
         return ret
 
     @classmethod
@@ -524,6 +539,15 @@ class Address(namedtuple("AddressTuple", "hash160 kind")):
     def from_string(cls, string, *, net=None):
         '''Construct from an address string.'''
         if net is None: net = networks.net
+        key = (cls, string, net)
+        ret = cls._decode_cache.get(key)
+        if ret is None:
+            ret = cls._from_string(string, net=net)
+            cls._decode_cache.put(key, ret)
+        return ret
+
+    @classmethod
+    def _from_string(cls, string, *, net):
         if len(string) > 35:
             try:
                 try:
@@ -634,13 +658,16 @@ class Address(namedtuple("AddressTuple", "hash160 kind")):
     def to_string(self, fmt, *, net=None):
         '''Converts to a string of the given format.'''
         if net is None: net = networks.net
-        if net is networks.net:
-            try:
-                cached = self._addr2str_cache[fmt]
-                if cached:
-                    return cached
-            except (IndexError, TypeError):
+        try:
+            if not 0 <= fmt < self._NUM_FMTS:
                 raise AddressError('unrecognised format')
+        except TypeError:
+            raise AddressError('unrecognised format')
+        cache = self._addr2str_cache
+        if cache is not None and cache[0] is net:
+            cached = cache[fmt + 1]
+            if cached:
+                return cached
 
         try:
             cached = None
@@ -671,7 +698,10 @@ class Address(namedtuple("AddressTuple", "hash160 kind")):
             return cached
         finally:
             if cached and net is networks.net:
-                self._addr2str_cache[fmt] = cached
+                if cache is None or cache[0] is not net:
+                    # (Re)create on first use, or if networks.net changed
+                    cache = self._addr2str_cache = [net] + [None] * self._NUM_FMTS
+                cache[fmt + 1] = cached
 
     def to_full_string(self, fmt, *, net=None):
         '''Convert to text, with a URI prefix for cashaddr format.'''
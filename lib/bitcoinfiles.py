@@ -10,6 +10,12 @@ Multi-part file chunks are committed to the blockchain as transactions using the
 
 Max message length to fit in 223 byte op_return relay limit: 204 bytes
 """
+import hashlib
+import os
+import queue
+import threading
+import time
+
 from .address import Address, ScriptOutput
 from . import util
 from . import bitcoin
@@ -17,6 +23,7 @@ from . import bitcoin
 from .transaction import Transaction
 from .bitcoin import TYPE_SCRIPT, TYPE_ADDRESS
 from .address import Script, ScriptError, OpCodes
+from .keystore import Software_KeyStore
 from enum import Enum
 from .network import Network
 
@@ -407,3 +414,339 @@ class BfpMessage:
         else:
             raise BfpInvalidOutputMessage('Not a BFP metadata message')
         return bfpMsg
+
+
+class BfpDownloadError(Exception):
+    pass
+
+
+class BfpDownloader(util.PrintError):
+    """
+    Downloads a BFP file, given the txid of its metadata transaction, to `path`.
+
+    The chunk chain is walked backwards from the metadata transaction, so chunks
+    arrive last one first. Each chunk is written straight to its place in
+    `path` + '.part' (at the offset implied by the metadata's file size, if
+    any), so neither the chunks nor the whole file are held in memory. Once all
+    chunks are in, the file is hashed in blocks, checked against the metadata
+    sha256 and renamed to `path`.
+
+    Chunk transactions are taken from the wallet (if any) or the app-wide tx
+    store (which is also filled by graph search and other wallets) before
+    asking the server. Downloaded transactions are added to the tx store.
+
+    Use `start()` with the `on_progress(chunks_done, chunk_count)` and
+    `on_done(downloader)` callbacks, which are called from the network thread,
+    or the blocking `download()`.
+    """
+
+    # an OP_RETURN is at most 223 bytes, so no chunk can be larger than this
+    MAX_CHUNK_BYTES = 223
+    HASH_BLOCK_BYTES = 64 * 1024
+
+    def __init__(self, network, file_id, path, *, wallet=None, on_progress=None, on_done=None):
+        self.network = network
+        self.wallet = wallet
+        self.file_id = file_id.strip().replace('bitcoinfiles:', '').replace('bitcoinfile:', '')
+        self.path = path
+        self.part_path = path + '.part'
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.metadata = None  # the BfpMessage, once known
+        self.chunk_count = 0
+        self.chunks_done = 0
+        self.file = None
+        self.end = self.pos = 0  # chunks are written backwards from end; pos is the start of the data so far
+        self.error = None
+        self.result = None
+        self.cancelled = False
+        self.done = threading.Event()
+
+    def diagnostic_name(self):
+        return 'BfpDownloader ' + self.file_id[:8]
+
+    def start(self):
+        self._walk(self.file_id, self._on_metadata_tx)
+
+    def cancel(self):
+        self.cancelled = True
+
+    def download(self, timeout=None):
+        ''' Downloads the file, blocking. Returns the result dict (see
+        `_finish`) or raises BfpDownloadError. '''
+        self.start()
+        if not self.done.wait(timeout):
+            self.cancel()
+            raise util.TimeoutException('BFP download timed out')
+        if self.error:
+            raise BfpDownloadError(self.error)
+        return self.result
+
+    def _cached_tx(self, txid):
+        tx = self.wallet and self.wallet.transactions.get(txid)
+        return tx or Transaction.tx_cache_get(txid)
+
+    def _walk(self, txid, handler):
+        ''' Calls handler(tx) for txid, and so on for the (txid, handler)
+        each handler returns, until one returns None. Cached txs are handled
+        in this loop, so that walking a chain that is all cached (a second
+        download, or the wallet that uploaded the file) doesn't recurse.
+        The walk only goes on from a network callback on a cache miss. '''
+        while txid is not None:
+            tx = self._cached_tx(txid)
+            if not tx:
+                self._request(txid, handler)
+                return
+            txid, handler = self._call(handler, tx)
+
+    def _request(self, txid, handler):
+        def callback(response):
+            if response.get('error'):
+                return self._fail('Error downloading {}: {}'.format(txid, response['error'].get('message')))
+            tx = Transaction(response.get('result'))
+            if tx.txid() != txid:
+                return self._fail('Server sent a transaction not matching {}'.format(txid))
+            Transaction.tx_cache_put(tx, txid)
+            self._walk(*self._call(handler, tx))
+        self.network.send([('blockchain.transaction.get', [txid])], callback)
+
+    def _call(self, handler, tx):
+        ''' Returns what handler(tx) returns, or (None, None) if it returned
+        None or the download failed. '''
+        if self.cancelled:
+            self._fail('Cancelled')
+            return None, None
+        try:
+            return handler(tx) or (None, None)
+        except Exception as e:
+            self._fail(str(e) or repr(e))
+            return None, None
+
+    def _on_metadata_tx(self, tx):
+        try:
+            msg = BfpMessage.parseBfpScriptOutput(tx.outputs()[0][1])
+        except BfpUnsupportedBfpMsgType as e:
+            raise BfpDownloadError('Unsupported BFP message type: {}'.format(e.args[0]))
+        except BfpParsingError as e:
+            raise BfpDownloadError('Not a valid BFP message: {}'.format(e.args))
+        self.metadata = msg
+        self.chunk_count = msg.op_return_fields['chunk_count']
+        if self.chunk_count < 1:
+            raise BfpDownloadError('This file does not contain any data')
+        # Without a size, write backwards from the largest possible size and
+        # move the data to the start of the file at the end.
+        self.end = self.pos = msg.op_return_fields['size'] or self.chunk_count * self.MAX_CHUNK_BYTES
+        self.file = open(self.part_path, 'w+b')
+        data = msg.op_return_fields['chunk_data']
+        if data:
+            self._write_chunk(data)
+        return self._next(tx)
+
+    def _on_chunk_tx(self, tx):
+        data = parseOpreturnToChunks(tx.outputs()[0][1].to_script(), allow_op_0=False, allow_op_number=False)
+        if len(data) != 1:
+            raise BfpDownloadError('Chunk {} does not contain any data'.format(tx.txid()))
+        self._write_chunk(data[0])
+        return self._next(tx)
+
+    def _next(self, tx):
+        ''' Returns the (txid, handler) of the previous chunk, or None once
+        the file is done. '''
+        if self.chunks_done >= self.chunk_count:
+            self._finish()
+            return None
+        txin = tx.inputs()[0]
+        if txin['prevout_n'] != 1:
+            raise BfpDownloadError('Broken chunk chain at {}'.format(tx.txid()))
+        return txin['prevout_hash'], self._on_chunk_tx
+
+    def _write_chunk(self, data):
+        if len(data) > self.pos:
+            raise BfpDownloadError('File is larger than its metadata says')
+        self.pos -= len(data)
+        self.file.seek(self.pos)
+        self.file.write(data)
+        self.chunks_done += 1
+        if self.on_progress:
+            self.on_progress(self.chunks_done, self.chunk_count)
+
+    def _finish(self):
+        f, size = self.file, self.end - self.pos
+        h = hashlib.sha256()
+        f.flush()
+        for offset in range(0, size, self.HASH_BLOCK_BYTES):
+            f.seek(self.pos + offset)
+            block = f.read(min(self.HASH_BLOCK_BYTES, size - offset))
+            if self.pos:
+                # move the data to the start of the file; the source is always ahead of the destination
+                f.seek(offset)
+                f.write(block)
+            h.update(block)
+        f.truncate(size)
+        f.close()
+        self.file = None
+        fields = self.metadata.op_return_fields
+        sha256 = h.hexdigest()
+        if fields['file_sha256'] and fields['file_sha256'].hex() != sha256:
+            raise BfpDownloadError('The hash of the downloaded file does not match its metadata')
+        os.replace(self.part_path, self.path)
+        self.result = {
+            'path': self.path,
+            'size': size,
+            'chunks': self.chunk_count,
+            'sha256': sha256,
+            'hash_verified': bool(fields['file_sha256']),
+            'filename': fields['filename'].decode('utf-8', errors='replace'),
+            'fileext': fields['fileext'].decode('utf-8', errors='replace'),
+        }
+        self.print_error('downloaded', size, 'bytes to', self.path)
+        self._done()
+
+    def _fail(self, error):
+        if self.done.is_set():
+            return
+        self.error = error
+        self.print_error('download failed:', error)
+        if self.file:
+            self.file.close()
+            self.file = None
+        try:
+            os.remove(self.part_path)
+        except OSError:
+            pass
+        self._done()
+
+    def _done(self):
+        self.done.set()
+        if self.on_done:
+            self.on_done(self)
+
+
+class BfpUploadError(Exception):
+    pass
+
+
+# Larger files need a chain of unconfirmed txs longer than servers accept
+MAX_UPLOAD_BYTES = 5261
+
+# Broadcast errors meaning the server already has the tx
+_ALREADY_BROADCAST = ('txn-already-in-mempool', 'txn-already-known', 'transaction already in block chain')
+
+
+def _sign_chain_tx(wallet, tx, password, keypairs, external_keypairs=None, before_sign=None):
+    ''' Signs tx, deriving only the keys not already in `keypairs` (which is
+    updated). Every tx in an upload chain spends the previous one's output to
+    the same address, so the key is derived once for the whole chain. '''
+    if before_sign:
+        before_sign(tx)
+    keystore = wallet.keystore
+    if external_keypairs:
+        tx.sign(external_keypairs, use_cache=True)
+    elif isinstance(keystore, Software_KeyStore):
+        derivations = keystore.get_tx_derivations(tx)
+        missing = {k: v for k, v in derivations.items() if k not in keypairs}
+        if missing:
+            keypairs.update(keystore.get_private_keys(missing, password))
+        tx.sign(keypairs, use_cache=True)
+    else:
+        wallet.sign_transaction(tx, password, use_cache=True)
+    if not tx.is_complete():
+        raise BfpUploadError('Could not sign upload transaction')
+
+
+def make_upload_chain(wallet, config, data, metadata, password, *, funding_address=None, file_receiver=None,
+                      on_progress=None, external_keypairs=None, before_sign=None):
+    """
+    Builds and signs, in one pass, the funding tx and the chain of chunk txs
+    that upload `data`. `metadata` is a dict as used by getUploadTxn. The
+    password is checked once, and `on_progress(txs_done, txs_total)` is called
+    as txs are signed.
+
+    If given, `external_keypairs` are used to sign instead of the wallet's
+    keys, and `before_sign(tx)` is called before each tx is signed (the GUI
+    runs the 'sign_tx' plugin hook from it).
+
+    Returns the list of txs in broadcast order. The last one holds the
+    metadata; its txid is the file id.
+    """
+    from .slp_checker import SlpTransactionChecker
+    if len(data) > MAX_UPLOAD_BYTES:
+        raise BfpUploadError('Files cannot be larger than {} bytes'.format(MAX_UPLOAD_BYTES))
+    wallet.keystore.check_password(password)
+    chunks = [data[i:i+220] for i in range(0, len(data), 220)]
+    total = len(chunks) + 2  # an upper bound until we know where the last chunk goes
+    address = funding_address or wallet.get_unused_address() or wallet.get_addresses()[0]
+    tx = getFundingTxn(wallet, address, calculateUploadCost(len(data), metadata), config)
+    SlpTransactionChecker.check_tx_slp(wallet, tx, require_tx_in_wallet=False)
+    keypairs = dict()
+    def sign(tx):
+        _sign_chain_tx(wallet, tx, password, keypairs, external_keypairs, before_sign)
+    sign(tx)
+    txs = [tx]
+    is_metadata_txn = False
+    while not is_metadata_txn:
+        chunk_index = len(txs) - 1
+        chunk = chunks[chunk_index] if chunk_index < len(chunks) else None
+        tx, is_metadata_txn = getUploadTxn(wallet, txs[-1], chunk_index, len(chunks), chunk, config, metadata, file_receiver)
+        sign(tx)
+        txs.append(tx)
+        if on_progress:
+            on_progress(len(txs), len(txs) if is_metadata_txn else total)
+    return txs
+
+
+def broadcast_upload_chain(network, txs, *, window=8, retries=3, timeout=60, total_timeout=None,
+                           on_progress=None):
+    """
+    Broadcasts an upload chain in order, keeping up to `window` broadcasts in
+    flight rather than waiting for each reply. A tx the server rejects (eg.
+    because it got there before its parent did) is sent again once all txs
+    before it are accepted, up to `retries` times. `on_progress(txs_done,
+    txs_total)` is called as txs are accepted.
+
+    `timeout` is how long to wait for any one reply; if `total_timeout` is
+    given, the whole chain must also be accepted within that many seconds.
+
+    Returns the txid of the last tx, or raises BfpUploadError.
+    """
+    replies = queue.Queue()
+    n = len(txs)
+    accepted = [False] * n
+    attempts = [0] * n
+    to_resend = set()
+    next_index = done = in_flight = 0
+    deadline = time.time() + total_timeout if total_timeout is not None else None
+
+    def send(i):
+        nonlocal in_flight
+        attempts[i] += 1
+        in_flight += 1
+        network.broadcast_transaction(txs[i], lambda response: replies.put((i, response)))
+
+    while done < n:
+        for i in sorted(j for j in to_resend if j <= done):
+            to_resend.discard(i)
+            send(i)
+        while in_flight < window and next_index < n:
+            send(next_index)
+            next_index += 1
+        wait = timeout if deadline is None else min(timeout, max(deadline - time.time(), 0))
+        try:
+            i, response = replies.get(timeout=wait)
+        except queue.Empty:
+            raise BfpUploadError('Server did not answer')
+        in_flight -= 1
+        error = response.get('error')
+        if error and not any(msg in str(error) for msg in _ALREADY_BROADCAST):
+            if attempts[i] > retries:
+                raise BfpUploadError(Network.transmogrify_broadcast_response_for_gui(error))
+            to_resend.add(i)
+            continue
+        if not error and response.get('result') != txs[i].txid():
+            raise BfpUploadError('Server response does not match signed transaction ID')
+        accepted[i] = True
+        while done < n and accepted[done]:
+            done += 1
+        if on_progress:
+            on_progress(done, n)
+    return txs[-1].txid()
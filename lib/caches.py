@@ -5,6 +5,7 @@
 # This file Copyright (C) 2019 Calin Culianu <calin.culianu@gmail.com>
 # License: MIT License
 #
+import sys
 import time
 import threading
 import queue
@@ -50,25 +51,83 @@ class ExpiringCache:
     expire items when the cache overflows (so that get and put never stall
     to manage the cache's size and/or to flush old items).  This background
     thread runs every 10 seconds -- so caches may temporarily overflow past
-    their maxlen for up to 10 seconds. '''
-    def __init__(self, *, maxlen=10000, name="An Unnamed Cache", timeout=None):
+    their maxlen for up to 10 seconds.
+
+    Alternatively, if `max_bytes' is specified, the cache is bounded by the
+    total size of its items as well. Each item's size is measured once, at
+    `put', with `sizeof' (default: sys.getsizeof, which is only accurate for
+    flat objects such as str and bytes, so pass something better for other
+    items). When over budget, the least recently used items are evicted right
+    away in `put', so the cache never overshoots. This mode takes a lock in
+    get() and put() so it is a bit slower.
+
+    Hit/miss/eviction counts for all caches are available from
+    get_cache_stats(). '''
+    def __init__(self, *, maxlen=10000, name="An Unnamed Cache", timeout=None,
+                 max_bytes=None, sizeof=None):
         assert maxlen > 0
+        assert max_bytes is None or max_bytes > 0
         timeout = (isinstance(timeout, (float, int)) and timeout > 0.0 and timeout) or None
         self.timeout_ticks = timeout and math.ceil(timeout/_ExpiringCacheMgr.tick_interval)
         self.maxlen = maxlen
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof or sys.getsizeof
         self.name = name
-        self.d = dict()
+        self.d = dict()  # key -> [tick, value], or [tick, value, size] in LRU order if max_bytes
+        self.lock = threading.Lock()  # only used if max_bytes
+        self.bytes = 0  # only tracked if max_bytes
+        self.hits = self.misses = self.evictions = 0
         _ExpiringCacheMgr.add_cache(self)
     def get(self, key, default=None):
+        if self.max_bytes:
+            return self._get_sized(key, default)
         res = self.d.get(key)
         if res is not None:
             # cache hit
             res[0] = _ExpiringCacheMgr.tick  # update tick access time for this cache hit
+            self.hits += 1
             return res[1]
         # cache miss
+        self.misses += 1
         return default
     def put(self, key, value):
+        if self.max_bytes:
+            return self._put_sized(key, value)
         self.d[key] = [_ExpiringCacheMgr.tick, value]
+    def _get_sized(self, key, default):
+        with self.lock:
+            res = self.d.pop(key, None)
+            if res is None:
+                self.misses += 1
+                return default
+            self.d[key] = res  # move to the end, as most recently used
+            res[0] = _ExpiringCacheMgr.tick
+            self.hits += 1
+            return res[1]
+    def _put_sized(self, key, value):
+        size = self.sizeof(value)
+        with self.lock:
+            old = self.d.pop(key, None)
+            if old is not None:
+                self.bytes -= old[2]
+            self.d[key] = [_ExpiringCacheMgr.tick, value, size]
+            self.bytes += size
+            while self.bytes > self.max_bytes and len(self.d) > 1:
+                lru_key = next(iter(self.d))
+                self.bytes -= self.d.pop(lru_key)[2]
+                self.evictions += 1
+    def discard(self, key):
+        ''' Removes key from the cache, if present. Used by the cache manager
+        thread to expire items. '''
+        if self.max_bytes:
+            with self.lock:
+                res = self.d.pop(key, None)
+                if res is not None:
+                    self.bytes -= res[2]
+        else:
+            res = self.d.pop(key, None)  # despite appearances, this is atomic (thread-safe)
+        if res is not None:
+            self.evictions += 1
     def size_bytes(self):
         ''' Returns the cache's memory usage in bytes. This is done by doing a
         deep, recursive examination of the cache contents. '''
@@ -80,6 +139,20 @@ class ExpiringCache:
         or otherwise examining the cache. The returned dict format is:
         d[item_key] -> [tick, item_value]'''
         return self.d.copy()
+    def stats(self):
+        ''' Returns a dict of usage statistics for this cache. 'bytes' is
+        only known (not None) if max_bytes was specified. '''
+        lookups = self.hits + self.misses
+        return {
+            'items': len(self.d),
+            'maxlen': self.maxlen,
+            'bytes': self.bytes if self.max_bytes else None,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            'evictions': self.evictions,
+        }
     def __len__(self):
         return len(self.d)
     def __repr__(self):
@@ -91,6 +164,29 @@ class ExpiringCache:
         )
         return (f'<{__class__.__name__} "{name}" at {address}, {length} item{"s" if length != 1 else ""} (maxlen={maxlen} timeout={timeout})>')
 
+def get_cache_stats():
+    ''' Returns a dict of cache name -> stats dict (see ExpiringCache.stats)
+    for all live ExpiringCaches. The stats of caches sharing a name are
+    summed. '''
+    with _ExpiringCacheMgr._lock:
+        slf = _ExpiringCacheMgr._instance
+        caches = tuple(slf.caches) if slf else ()
+    ret = dict()
+    for c in caches:
+        st = c.stats()
+        prev = ret.get(c.name)
+        if prev:
+            for k in ('items', 'bytes', 'hits', 'misses', 'evictions'):
+                if prev[k] is not None and st[k] is not None:
+                    prev[k] += st[k]
+            lookups = prev['hits'] + prev['misses']
+            prev['hit_rate'] = round(prev['hits'] / lookups, 4) if lookups else None
+            prev['instances'] += 1
+        else:
+            st['instances'] = 1
+            ret[c.name] = st
+    return ret
+
 class _ExpiringCacheMgr(PrintError):
     '''Do not use this class directly. Instead just create ExpiringCache
     instances and that will handle the creation of this object automatically
@@ -184,7 +280,7 @@ class _ExpiringCacheMgr(PrintError):
                     if c.timeout_ticks and len(c.d) and 0 == (cls.tick % c.timeout_ticks):
                         # expire timed-out items first, if any. This check only runs every timeout_ticks ticks.
                         t0 = time.time()
-                        num = cls._remove_timed_out_items(c.d, cls.tick - c.timeout_ticks)
+                        num = cls._remove_timed_out_items(c, cls.tick - c.timeout_ticks)
                         tf = time.time()
                         if num:
                             self.print_error("{}: flushed {} timed-out items in {:.02f} msec".format(c.name, num, (tf-t0)*1e3))
@@ -192,7 +288,7 @@ class _ExpiringCacheMgr(PrintError):
                     len_c = len(c.d)  # capture length here as c.d may mutate and grow while this code executes.
                     if len_c > c.maxlen:
                         t0 = time.time()
-                        num = cls._try_to_expire_old_items(c.d, len_c - c.maxlen)
+                        num = cls._try_to_expire_old_items(c, len_c - c.maxlen)
                         tf = time.time()
                         self.print_error("{}: flushed {} items in {:.02f} msec".format(c.name, num, (tf-t0)*1e3))
         finally:
@@ -200,8 +296,8 @@ class _ExpiringCacheMgr(PrintError):
                 self.print_error("thread exit")
 
     @classmethod
-    def _try_to_expire_old_items(cls, d_orig, num):
-        d = d_orig.copy()  # yes, this is slow but this makes it so we don't need locks.
+    def _try_to_expire_old_items(cls, cache, num):
+        d = cache.d.copy()  # yes, this is slow but this makes it so we don't need locks.
         if len(d) < num or num <= 0:
             # cache modified from underneath our feet. We abort gracefully and complain.
             print_error(f'[{__class__.__name__}] Cache data may have been removed by another thread. Aborting flush operation and will try again later...')
@@ -226,10 +322,7 @@ class _ExpiringCacheMgr(PrintError):
         while ct < num and bins:
             tick = sorted_bin_keys[0]
             for key in bins[tick]:
-                # KeyError here should never happen in normal use, but it
-                # may if client code is messing with the .d dict.
-                try: del d_orig[key]  # despite appearances, this is atomic (thread-safe)
-                except KeyError: pass
+                cache.discard(key)
                 ct += 1
                 if ct >= num:
                     break
@@ -239,8 +332,8 @@ class _ExpiringCacheMgr(PrintError):
         return ct
 
     @classmethod
-    def _remove_timed_out_items(cls, d_orig, tick_cutoff):
-        d = d_orig.copy()  # yes, this is slow but this makes it so we don't need locks.
+    def _remove_timed_out_items(cls, cache, tick_cutoff):
+        d = cache.d.copy()  # yes, this is slow but this makes it so we don't need locks.
         if not len(d) or tick_cutoff < 0:
             # cache modified from underneath our feet. We abort gracefully and complain.
             print_error(f'[{__class__.__name__}] Cache data may have been removed by another thread. Aborting flush operation and will try again later...')
@@ -251,8 +344,7 @@ class _ExpiringCacheMgr(PrintError):
         for k,v in d.items():
             tick = v[0]
             if tick < tick_cutoff:
-                try: del d_orig[k]  # despite appearances, this is atomic (thread-safe)
-                except KeyError: pass
+                cache.discard(k)
                 ct += 1
         return ct
 
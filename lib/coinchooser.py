@@ -40,12 +40,20 @@ class PRNG:
     def __init__(self, seed):
         self.sha = sha256(seed)
         self.pool = bytearray()
+        self.pos = 0  # read position in self.pool
+
+    def _refill(self):
+        # drop consumed bytes rather than re-slicing the pool on every read
+        del self.pool[:self.pos]
+        self.pos = 0
+        self.pool.extend(self.sha)
+        self.sha = sha256(self.sha)
 
     def get_bytes(self, n):
-        while len(self.pool) < n:
-            self.pool.extend(self.sha)
-            self.sha = sha256(self.sha)
-        result, self.pool = self.pool[:n], self.pool[n:]
+        while len(self.pool) - self.pos < n:
+            self._refill()
+        result = self.pool[self.pos:self.pos + n]
+        self.pos += n
         return result
 
     def randint(self, start, end):
@@ -54,7 +62,10 @@ class PRNG:
         r = 0
         p = 1
         while p < n:
-            r = self.get_bytes(1)[0] + (r << 8)
+            if self.pos >= len(self.pool):
+                self._refill()
+            r = self.pool[self.pos] + (r << 8)
+            self.pos += 1
             p = p << 8
         return start + (r % n)
 
@@ -73,12 +84,47 @@ Bucket = namedtuple('Bucket', ['desc', 'size', 'value', 'coins'])
 def strip_unneeded(bkts, sufficient_funds):
     '''Remove buckets that are unnecessary in achieving the spend amount'''
     bkts = sorted(bkts, key = lambda bkt: bkt.value)
+    # Suffix sums so each check is O(1) rather than re-summing bkts[i + 1:]
+    values, sizes = [0] * (len(bkts) + 1), [0] * (len(bkts) + 1)
+    for i in reversed(range(len(bkts))):
+        values[i] = values[i + 1] + bkts[i].value
+        sizes[i] = sizes[i + 1] + bkts[i].size
     for i in range(len(bkts)):
-        if not sufficient_funds(bkts[i + 1:]):
+        if not sufficient_funds.totals(values[i + 1], sizes[i + 1]):
             return bkts[i:]
     # Shouldn't get here
     return bkts
 
+
+class FundsCheck:
+    '''Callable that, given a list of buckets, returns True if they (plus
+    any mandatory coins) have enough value to pay for the transaction.
+
+    The mandatory coins are only bucketized and summed once, and `totals`
+    allows callers that keep running sums to avoid re-summing buckets.'''
+
+    def __init__(self, base_size, spent_amount, fee_estimator, mandatory_buckets,
+                 change_cost=0):
+        self.base_size = base_size + sum(bucket.size for bucket in mandatory_buckets)
+        self.spent_amount = spent_amount - sum(bucket.value for bucket in mandatory_buckets)
+        self.fee_estimator = fee_estimator
+        # What it costs to add a change output rather than give the excess
+        # to fees. Used by the branch and bound chooser.
+        self.change_cost = change_cost
+
+    def excess(self, value, size):
+        '''Amount by which inputs of total `value` and estimated `size`
+        exceed what the transaction needs. Negative if insufficient.'''
+        return value - self.spent_amount - self.fee_estimator(size + self.base_size)
+
+    def totals(self, value, size):
+        return self.excess(value, size) >= 0
+
+    def __call__(self, buckets):
+        return self.totals(sum(bucket.value for bucket in buckets),
+                           sum(bucket.size for bucket in buckets))
+
+
 class CoinChooserBase(PrintError):
 
     def keys(self, coins):
@@ -90,9 +136,21 @@ class CoinChooserBase(PrintError):
         for key, coin in zip(keys, coins):
             buckets[key].append(coin)
 
+        # Unsigned inputs of the same script type and key layout always have
+        # the same estimated size, so only serialize one of each.
+        sizes = {}
+        def input_size(coin):
+            if coin.get('scriptSig') is not None or coin['type'] not in ('p2pkh', 'p2sh', 'p2pk'):
+                return Transaction.estimated_input_size(coin, sign_schnorr=sign_schnorr)
+            shape = (coin['type'], coin.get('num_sig', 1), len(coin.get('x_pubkeys', [None])),
+                     Transaction.estimate_pubkey_size_for_txin(coin))
+            size = sizes.get(shape)
+            if size is None:
+                size = sizes[shape] = Transaction.estimated_input_size(coin, sign_schnorr=sign_schnorr)
+            return size
+
         def make_Bucket(desc, coins):
-            size = sum(Transaction.estimated_input_size(coin, sign_schnorr=sign_schnorr)
-                       for coin in coins)
+            size = sum(input_size(coin) for coin in coins)
             value = sum(coin['value'] for coin in coins)
             return Bucket(desc, size, value, coins)
 
@@ -173,10 +231,10 @@ class CoinChooserBase(PrintError):
         added to the transaction fee.'''
 
         # Remove mandatory_coin items from coin chooser's list
-        for c in mandatory_coins:
-            for coin in coins.copy():
-                if coin['prevout_hash'] == c['prevout_hash'] and coin['prevout_n'] == c['prevout_n']:
-                    coins.remove(coin)
+        if mandatory_coins:
+            mandatory_outpoints = {(c['prevout_hash'], c['prevout_n']) for c in mandatory_coins}
+            coins[:] = [coin for coin in coins
+                        if (coin['prevout_hash'], coin['prevout_n']) not in mandatory_outpoints]
 
         # Deterministic randomness from coins
         utxos = [c['prevout_hash'] + str(c['prevout_n']) for c in coins]
@@ -188,15 +246,11 @@ class CoinChooserBase(PrintError):
         base_size = tx.estimated_size()
         spent_amount = tx.output_value()
 
-        def sufficient_funds(buckets):
-            '''Given a list of buckets, return True if it has enough
-            value to pay for the transaction'''
-            mandatory_coins_bucket = self.bucketize_coins(mandatory_coins, sign_schnorr=sign_schnorr)
-            mandatory_input = sum(coin.value for coin in mandatory_coins_bucket)
-            mandatory_input_size = sum(coin.size for coin in mandatory_coins_bucket)
-            total_input = sum(bucket.value for bucket in buckets) + mandatory_input
-            total_size = sum(bucket.size for bucket in buckets) + mandatory_input_size + base_size
-            return total_input >= spent_amount + fee_estimator(total_size)
+        mandatory_buckets = self.bucketize_coins(mandatory_coins, sign_schnorr=sign_schnorr)
+        # each pay-to-bitcoin-address output serializes as 34 bytes
+        change_cost = fee_estimator(34) + dust_threshold
+        sufficient_funds = FundsCheck(base_size, spent_amount, fee_estimator,
+                                      mandatory_buckets, change_cost)
 
         # Collect the coins into buckets, choose a subset of the buckets
         buckets = self.bucketize_coins(coins, sign_schnorr=sign_schnorr)
@@ -242,13 +296,17 @@ class CoinChooserRandom(CoinChooserBase):
         permutation = list(range(len(buckets)))
         for i in range(attempts):
             # Get a random permutation of the buckets, and
-            # incrementally combine buckets until sufficient
-            self.p.shuffle(permutation)
-            bkts = []
-            for count, index in enumerate(permutation):
-                bkts.append(buckets[index])
-                if sufficient_funds(bkts):
-                    candidates.add(tuple(sorted(permutation[:count + 1])))
+            # incrementally combine buckets until sufficient. The
+            # permutation is drawn lazily (Fisher-Yates from the end) so
+            # we only pay for as many buckets as we end up using.
+            value = size = 0
+            for k in reversed(range(len(permutation))):
+                j = self.p.randint(0, k + 1)
+                permutation[k], permutation[j] = permutation[j], permutation[k]
+                value += buckets[permutation[k]].value
+                size += buckets[permutation[k]].size
+                if sufficient_funds.totals(value, size):
+                    candidates.add(tuple(sorted(permutation[k:])))
                     break
             else:
                 raise NotEnoughFunds()
@@ -298,8 +356,75 @@ class CoinChooserPrivacy(CoinChooserRandom):
         return penalty
 
 
+class CoinChooserBranchAndBound(CoinChooserPrivacy):
+    '''Looks for a set of buckets that pays for the transaction without
+    needing a change output (the excess would cost less than creating and
+    later spending the change). Does a depth-first branch and bound search
+    over the buckets sorted by value, trying larger buckets first, with a
+    bounded number of tries. Falls back to CoinChooserPrivacy if no such
+    set is found.'''
+
+    max_tries = 100000
+
+    def choose_buckets(self, buckets, sufficient_funds, penalty_func):
+        winner = self.branch_and_bound(buckets, sufficient_funds)
+        if winner is None:
+            return super().choose_buckets(buckets, sufficient_funds, penalty_func)
+        self.print_error("Bucket sets:", len(buckets))
+        self.print_error("Branch and bound found a changeless set of", len(winner))
+        return winner
+
+    def branch_and_bound(self, buckets, sufficient_funds):
+        bkts = sorted(buckets, key=lambda bkt: bkt.value, reverse=True)
+        n = len(bkts)
+        # remaining[i] is the value of all buckets from i onwards
+        remaining = [0] * (n + 1)
+        for i in reversed(range(n)):
+            remaining[i] = remaining[i + 1] + bkts[i].value
+        change_cost = sufficient_funds.change_cost
+        best, best_excess = None, None
+        selected = []
+        tries = 0
+        # Iterative DFS: each stack entry is (index, value, size, include?)
+        stack = [(0, 0, 0, False), (0, 0, 0, True)]
+        while stack and tries < self.max_tries:
+            i, value, size, include = stack.pop()
+            tries += 1
+            del selected[i:]
+            if include:
+                value += bkts[i].value
+                size += bkts[i].size
+                selected.append(i)
+            else:
+                selected.append(None)
+            excess = sufficient_funds.excess(value, size)
+            if excess >= 0:
+                if excess <= change_cost and (best_excess is None or excess < best_excess):
+                    best = [bkts[j] for j in selected if j is not None]
+                    best_excess = excess
+                    if excess == 0:
+                        break
+                # adding more buckets only increases the excess
+                continue
+            if i + 1 >= n or sufficient_funds.excess(value + remaining[i + 1], size) < 0:
+                # can't reach the target down this branch
+                continue
+            stack.append((i + 1, value, size, False))
+            stack.append((i + 1, value, size, True))
+        return best
+
+
+COIN_CHOOSERS = {
+    'Privacy': CoinChooserPrivacy,
+    'BranchAndBound': CoinChooserBranchAndBound,
+}
+
 def get_name(config):
     kind = config.get('coin_chooser')
     if not kind in COIN_CHOOSERS:
-        kind = 'Priority'
+        kind = 'Privacy'
     return kind
+
+def get_coin_chooser(config):
+    klass = COIN_CHOOSERS[get_name(config)]
+    return klass()
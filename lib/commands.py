@@ -30,7 +30,9 @@ import datetime
 import json
 import queue
 import sys
+import threading
 import time
+import weakref
 
 from decimal import Decimal as PyDecimal  # Qt 5.12 also exports Decimal
 from functools import wraps
@@ -41,12 +43,12 @@ from . import util
 from .address import Address, AddressError
 from .bitcoin import hash_160, COIN, TYPE_ADDRESS
 from .i18n import _
-from .paymentrequest import PR_PAID, PR_UNPAID, PR_UNKNOWN, PR_EXPIRED
+from .util import PR_PAID, PR_UNPAID, PR_UNKNOWN, PR_EXPIRED
 from .plugins import run_hook
 from .slp_coinchooser import SlpCoinChooser
 from .slp_checker import SlpTransactionChecker
 from .transaction import Transaction, multisig_script
-from .util import bfh, bh2u, format_satoshis, json_decode, print_error, to_bytes, get_satoshis_nofloat, PrintError
+from .util import bfh, bh2u, format_satoshis, json_decode, print_error, to_bytes, get_satoshis_nofloat, PrintError, RWLock
 
 known_commands = {}
 
@@ -62,6 +64,7 @@ class Command:
         self.requires_network = 'n' in s
         self.requires_wallet = 'w' in s
         self.requires_password = 'p' in s
+        self.updates_wallet = 'u' in s
         self.description = func.__doc__
         self.help = self.description.split('.')[0] if self.description else None
         varnames = func.__code__.co_varnames[1:func.__code__.co_argcount]
@@ -103,11 +106,30 @@ def command(s):
             if c.requires_password and password is None and wallet.storage.get('use_encryption') \
                and not kwargs.get("unsigned"):
                 return {'error': 'Password required' }
-            return func(*args, **kwargs)
+            if not c.requires_wallet:
+                return func(*args, **kwargs)
+            # Commands may be run concurrently by the daemon's RPC server.
+            # Those that only read the wallet may run side by side, but ones
+            # that update it get the wallet to themselves.
+            lock = get_wallet_lock(wallet)
+            with (lock.write_locked() if c.updates_wallet else lock.read_locked()):
+                return func(*args, **kwargs)
         return func_wrapper
     return decorator
 
 
+_wallet_locks = weakref.WeakKeyDictionary()  # wallet -> RWLock
+_wallet_locks_lock = threading.Lock()
+
+def get_wallet_lock(wallet):
+    ''' Returns the RWLock used to serialize commands run on `wallet`. '''
+    with _wallet_locks_lock:
+        lock = _wallet_locks.get(wallet)
+        if lock is None:
+            lock = _wallet_locks[wallet] = RWLock()
+        return lock
+
+
 class Commands(PrintError):
 
     def __init__(self, config, wallet, network, callback = None):
@@ -195,7 +217,7 @@ class Commands(PrintError):
         seed, type '?' or ':' (concealed) """
         raise BaseException('Not a JSON-RPC command')
 
-    @command('wp')
+    @command('wpu')
     def password(self, password=None, new_password=None):
         """Change wallet password. """
         b = self.wallet.storage.is_encrypted()
@@ -308,9 +330,9 @@ class Commands(PrintError):
         if privkey:
             txin_type, privkey2, compressed = bitcoin.deserialize_privkey(privkey)
             pubkey = bitcoin.public_key_from_private_key(privkey2, compressed)
-            tx.sign({pubkey:(privkey2, compressed)})
+            tx.sign({pubkey:(privkey2, compressed)}, num_workers=self.config.get_sign_workers())
         else:
-            self.wallet.sign_transaction(tx, password)
+            self.wallet.sign_transaction(tx, password, num_workers=self.config.get_sign_workers())
         return tx.as_dict()
 
     @command('')
@@ -333,13 +355,13 @@ class Commands(PrintError):
         address = bitcoin.hash160_to_p2sh(hash_160(bfh(redeem_script)))
         return {'address':address, 'redeemScript':redeem_script}
 
-    @command('w')
+    @command('wu')
     def freeze(self, address):
         """Freeze address. Freeze the funds at one of your wallet\'s addresses"""
         address = Address.from_string(address)
         return self.wallet.set_frozen_state([address], True)
 
-    @command('w')
+    @command('wu')
     def unfreeze(self, address):
         """Unfreeze address. Unfreeze the funds at one of your wallet\'s address"""
         address = Address.from_string(address)
@@ -454,7 +476,7 @@ class Commands(PrintError):
         s = self.wallet.get_seed(password)
         return s
 
-    @command('wp')
+    @command('wpu')
     def importprivkey(self, privkey, password=None):
         """Import a private key."""
         if not self.wallet.can_import_privkey():
@@ -522,10 +544,10 @@ class Commands(PrintError):
             tx.locktime = locktime
         if not unsigned:
             run_hook('sign_tx', self.wallet, tx)
-            self.wallet.sign_transaction(tx, password)
+            self.wallet.sign_transaction(tx, password, num_workers=self.config.get_sign_workers())
         return tx
 
-    @command('wp')
+    @command('wpu')
     def payto(self, destination, amount, fee=None, from_addr=None, change_addr=None, nocheck=False, unsigned=False, password=None, locktime=None):
         """Create a transaction. """
         tx_fee = satoshis(fee)
@@ -533,7 +555,7 @@ class Commands(PrintError):
         tx = self._mktx([(destination, amount)], tx_fee, change_addr, domain, nocheck, unsigned, password, locktime)
         return tx.as_dict()
 
-    @command('wp')
+    @command('wpu')
     def paytomany(self, outputs, fee=None, from_addr=None, change_addr=None, nocheck=False, unsigned=False, password=None, locktime=None):
         """Create a multi-output transaction. """
         tx_fee = satoshis(fee)
@@ -585,10 +607,10 @@ class Commands(PrintError):
             tx.locktime = locktime
         if not unsigned:
             run_hook('sign_tx', self.wallet, tx)
-            self.wallet.sign_transaction(tx, password)
+            self.wallet.sign_transaction(tx, password, num_workers=self.config.get_sign_workers())
         return tx
 
-    @command('wp')
+    @command('wpu')
     def payto_slp(self, token_id, destination_slp, amount_slp, fee=None, from_addr=None, change_addr=None, unsigned=False, password=None, locktime=None):
         """Create an SLP token transaction. """
         if not self.wallet.is_slp:
@@ -613,7 +635,7 @@ class Commands(PrintError):
         tx = self._mktx_slp(token_id, [(destination_slp, amount_slp)], tx_fee, change_addr, domain, unsigned, password, locktime)
         return tx.as_dict()
 
-    @command('wp')
+    @command('wpu')
     def paytomany_slp(self, token_id, outputs, fee=None, from_addr=None, change_addr=None, unsigned=False, password=None, locktime=None):
         """Create a multi-output SLP token transaction. """
         if not self.wallet.is_slp:
@@ -640,7 +662,7 @@ class Commands(PrintError):
         tx = self._mktx_slp(token_id, outputs, tx_fee, change_addr, domain, unsigned, password, locktime)
         return tx.as_dict()
 
-    @command('wp')
+    @command('wpu')
     def slp_add_token(self, token_id, password=None):
         ''' Add an SLP token to this wallet, kicking off validation if appropriate.
         Returns True on success. '''
@@ -659,16 +681,19 @@ class Commands(PrintError):
         return True
 
     @command('w')
-    def history(self, year=0, show_addresses=False, show_fiat=False, use_net=False, timeout=30.0):
-        """Wallet history. Returns the transaction history of your wallet."""
+    def history(self, year=0, show_addresses=False, show_fiat=False, use_net=False, timeout=30.0, offset=0, limit=0):
+        """Wallet history. Returns the transaction history of your wallet,
+        newest first."""
         t0 = time.time()
-        year, show_addresses, show_fiat, use_net, timeout = (
+        year, show_addresses, show_fiat, use_net, timeout, offset, limit = (
             int(year), bool(show_addresses), bool(show_fiat), bool(use_net),
-            float(timeout) )
+            float(timeout), int(offset), int(limit) )
         def time_remaining(): return max(timeout - (time.time()-t0), 0)
         kwargs = { 'show_addresses'   : show_addresses,
                    'fee_calc_timeout' : timeout,
-                   'download_inputs'  : use_net,        }
+                   'download_inputs'  : use_net,
+                   'offset'           : max(offset, 0),
+                   'limit'            : limit if limit > 0 else None, }
         if year:
             start_date = datetime.datetime(year, 1, 1)
             end_date = datetime.datetime(year+1, 1, 1)
@@ -702,7 +727,7 @@ class Commands(PrintError):
                 kwargs['fee_calc_timeout'] = time_remaining()  # since we blocked above, recompute time_remaining for kwargs
         return self.wallet.export_history(**kwargs)
 
-    @command('w')
+    @command('wu')
     def setlabel(self, key, label):
         """Assign a label to an item. Item may be a bitcoin address address or a
         transaction ID"""
@@ -766,56 +791,217 @@ class Commands(PrintError):
         return tx.as_dict()
 
     @command('wn')
-    def slpvalidate(self, txid, debug, reset): # Wish I could make debug, reset as optional but EC console doesn't allow. >_>
+    def slpvalidate(self, txid, debug, reset, timeout=3.0): # Wish I could make debug, reset as optional but EC console doesn't allow. >_>
         """
-        (Temporary crude command)
-        SLP-validate a transaction. Will run in main thread so this will block
-        until finished!
+        SLP-validate a transaction. Validation runs on the app-wide validator
+        thread, sharing token graphs and the wallet's validity cache with
+        previous requests. Waits up to `timeout` seconds (default 3) and
+        returns the validity. If validation hasn't concluded by then, the job
+        keeps running in the background and its status is returned instead;
+        use `slpvalidate_result` to poll for the result.
         """
+        from . import slp_validator_0x01
 
-        from . import slp_validator_0x01, slp_validator_0x01_nft1
-        from .slp_validator_0x01_nft1 import Validator_NFT1
-        from .slp import SlpMessage
-        from queue import Queue, Empty
+        timeout = float(timeout)
+        requests = slp_validator_0x01.shared_requests
 
-        graph_db, graph_db_nft1 = slp_validator_0x01.GraphContext(), slp_validator_0x01_nft1.GraphContext_NFT1()
+        job = requests.get_job(txid)
+        if job is None:
+            validity_name = not reset and requests.get_result(txid)
+            if validity_name:
+                return validity_name
 
+            tx = self._slp_fetch_txs([txid]).get(txid)
+            if tx is None:
+                raise RuntimeError("Unknown transaction")
+            validity_name, job = self._slp_start_validation(tx, debug, reset)
+            if validity_name:
+                return validity_name
 
-        q = Queue()
+        q = queue.Queue()
+        job.add_callback(q.put, way='weakmethod')
+        try:
+            q.get(timeout=timeout)
+        except queue.Empty:
+            pass
+        return requests.get_result(txid) or self._slp_job_status(txid, job)
 
-        if self.wallet and txid in self.wallet.transactions:
-            tx = self.wallet.transactions[txid]
-        else:
-            raw = self.network.synchronous_get(('blockchain.transaction.get', [txid]))
-            if raw:
-                tx = Transaction(raw)
+    @command('wn')
+    def slpvalidate_batch(self, txids, timeout=30.0):
+        """
+        SLP-validate a list of transactions, possibly of many different
+        tokens. Transactions of the same token are validated back to back so
+        their shared ancestry is only walked once. Returns one entry per
+        txid, in the order validation concluded, noting which results came
+        from cache. Entries for jobs still running after `timeout` seconds
+        (default 30) carry their status instead; poll those with
+        `slpvalidate_result`.
+        """
+        from . import slp_validator_0x01
+
+        t0 = time.time()
+        timeout = float(timeout)
+        requests = slp_validator_0x01.shared_requests
+        results = []
+        jobs = dict()  # txid -> ValidationJob
+
+        def add_result(txid, validity_name, cached):
+            results.append({'txid': txid, 'validity': validity_name, 'cached': cached})
+
+        to_fetch = []
+        for txid in dict.fromkeys(txids):  # de-dupe, keeping order
+            job = requests.get_job(txid)
+            validity_name = job is None and requests.get_result(txid)
+            if job:
+                jobs[txid] = job
+            elif validity_name:
+                add_result(txid, validity_name, True)
             else:
-                raise RuntimeError("Unknown transaction")
+                to_fetch.append(txid)
+
+        txs = self._slp_fetch_txs(to_fetch, timeout=timeout)
+        by_token = []
+        for txid in to_fetch:
+            tx = txs.get(txid)
+            if tx is None:
+                results.append({'txid': txid, 'error': 'Unknown transaction'})
+                continue
+            try:
+                slp_msg = slp.SlpMessage.parseSlpOutputScript(tx.outputs()[0][1])
+            except Exception as e:
+                results.append({'txid': txid, 'error': str(e)})
+                continue
+            token_id_hex = slp_msg.op_return_fields.get('token_id_hex', txid)
+            by_token.append((slp_msg.token_type, token_id_hex, txid))
+        # Group jobs by token so that each token's graph is worked on in one
+        # go by the validator thread.
+        by_token.sort()
+        for token_type, token_id_hex, txid in by_token:
+            try:
+                validity_name, job = self._slp_start_validation(txs[txid], False, False)
+            except Exception as e:
+                results.append({'txid': txid, 'error': str(e)})
+                continue
+            if validity_name:
+                add_result(txid, validity_name, True)
+            else:
+                jobs[txid] = job
+
+        q = queue.Queue()
+        job_txids = {job: txid for txid, job in jobs.items()}
+        for job in jobs.values():
+            job.add_callback(q.put, way='weakmethod')
+        while jobs:
+            try:
+                job = q.get(timeout=max(timeout - (time.time() - t0), 0.001))
+            except queue.Empty:
+                break
+            txid = job_txids.get(job)
+            if txid not in jobs:
+                continue
+            # The job is over, with or without a result
+            del jobs[txid]
+            validity_name = requests.get_result(txid)
+            if validity_name:
+                add_result(txid, validity_name, False)
+            else:
+                result = self._slp_job_status(txid, job)
+                result['txid'] = txid
+                results.append(result)
+        for txid, job in jobs.items():
+            result = self._slp_job_status(txid, job)
+            result['txid'] = txid
+            results.append(result)
+        return results
+
+    def _slp_fetch_txs(self, txids, timeout=30.0):
+        ''' Returns a dict of txid -> Transaction for the given txids, taking
+        them from the wallet if possible and otherwise requesting them from
+        the server all at once. Unknown txids are left out. '''
+        txs = dict()
+        missing = []
+        for txid in txids:
+            tx = self.wallet and self.wallet.transactions.get(txid)
+            if tx:
+                txs[txid] = tx
+            else:
+                missing.append(txid)
+        if not missing:
+            return txs
+        q = queue.Queue()
+        self.network.send([('blockchain.transaction.get', [txid]) for txid in missing], q.put)
+        t0 = time.time()
+        for _ in missing:
+            try:
+                r = q.get(timeout=max(timeout - (time.time() - t0), 0.001))
+            except queue.Empty:
+                break
+            if r.get('result') and not r.get('error'):
+                txid = r['params'][0]
+                tx = Transaction(r['result'])
+                # don't trust the server to send the tx we asked for
+                if tx.txid() == txid:
+                    txs[txid] = tx
+        return txs
+
+    def _slp_start_validation(self, tx, debug, reset):
+        ''' Returns a tuple of (validity_name, None) if the wallet already
+        knows the validity of `tx`, otherwise (None, job) for a validation job
+        started on the app-wide graph contexts. '''
+        from . import slp_validator_0x01, slp_validator_0x01_nft1
+        from .slp_validator_0x01 import Validator_SLP1
+        from .slp_validator_0x01_nft1 import Validator_NFT1
+
+        requests = slp_validator_0x01.shared_requests
+        txid = tx.txid_fast()
+        slp_msg = slp.SlpMessage.parseSlpOutputScript(tx.outputs()[0][1])
+        validator_class = Validator_SLP1 if slp_msg.token_type == 1 else Validator_NFT1
+        validity = not reset and self.wallet.slpv1_validity.get(txid)
+        if validity:
+            return validator_class.validity_states[validity], None
+
+        if not requests.can_add():
+            raise RuntimeError("Too many SLP validation jobs pending, try again later")
 
         if debug:
             self.print_error("Debug info will be printed to stderr.")
 
-        slp_msg = SlpMessage.parseSlpOutputScript(tx.outputs()[0][1])
         if slp_msg.token_type == 1:
-            job = graph_db.make_job(tx, self.wallet, self.network, debug=2, reset=reset)
+            job = slp_validator_0x01.shared_context.make_job(tx, self.wallet, self.network, debug=2 if debug else 0, reset=reset)
         else:
-            job = graph_db_nft1.make_job(tx, self.wallet, self.network, debug=2, reset=reset)
-        job.add_callback(q.put, way='weakmethod')
-        try:
-            q.get(timeout=3)
-        except Empty:
-            self.print_error("Validation job taking too long. Returning now as to not freeze UI for too long!")
-            self.print_error("(returned job is still running in background)")
-            return job
+            nft_type = 'SLP65' if slp_msg.token_type == 65 else 'SLP129'
+            job = slp_validator_0x01_nft1.shared_context_nft1.make_job(tx, self.wallet, self.network, nft_type, debug=2 if debug else 0, reset=reset)
+        if job is None:
+            raise RuntimeError("Not a validatable SLP transaction")
+        requests.add(txid, job)
+        return None, job
 
-        if not job.running and isinstance(job.graph.validator, Validator_NFT1):
-            self.print_error("Validation job is taking too long. Returning now as to not freeze UI for too long!")
-            self.print_error("(returned job is still running in background)")
-            return job
+    @command('wn')
+    def slpvalidate_result(self, txid):
+        """
+        Return the result of an SLP validation job previously started with
+        `slpvalidate`, or its status if it is still in progress.
+        """
+        from . import slp_validator_0x01
+
+        requests = slp_validator_0x01.shared_requests
+        validity_name = requests.get_result(txid)
+        if validity_name:
+            return validity_name
+        job = requests.get_job(txid)
+        if job is None:
+            raise RuntimeError("No SLP validation job for this transaction")
+        return self._slp_job_status(txid, job)
 
-        n = next(iter(job.nodes.values()))
-        validity_name = job.graph.validator.validity_states[n.validity]
-        return validity_name
+    @staticmethod
+    def _slp_job_status(txid, job):
+        if job.running:
+            status = 'running'
+        elif job.has_never_run:
+            status = 'queued'
+        else:
+            status = 'stopped: {}'.format(job.stop_reason)
+        return {'job_id': txid, 'status': status}
 
     @command('')
     def encrypt(self, pubkey, message):
@@ -883,18 +1069,18 @@ class Commands(PrintError):
             out = list(filter(lambda x: x.get('status')==f, out))
         return list(map(self._format_request, out))
 
-    @command('w')
+    @command('wu')
     def createnewaddress(self):
         """Create a new receiving address, beyond the gap limit of the wallet"""
         return self.wallet.create_new_address(False).to_ui_string()
 
-    @command('w')
+    @command('wu')
     def getunusedaddress(self):
         """Returns the first unused address of the wallet, or None if all addresses are used.
         An address is considered as used if it has received a transaction, or if it is used in a payment request."""
         return self.wallet.get_unused_address().to_ui_string()
 
-    @command('w')
+    @command('wu')
     def addrequest(self, amount, memo='', expiration=None, force=False, payment_url=None, index_url=None):
         """Create a payment request, using the first unused address of the wallet.
         The address will be condidered as used after this operation.
@@ -916,7 +1102,7 @@ class Commands(PrintError):
         out = self.wallet.get_payment_request(addr, self.config)
         return self._format_request(out)
 
-    @command('wp')
+    @command('wpu')
     def signrequest(self, address, password=None):
         "Sign payment request with an OpenAlias"
         alias = self.config.get('alias')
@@ -925,12 +1111,12 @@ class Commands(PrintError):
         alias_addr = self.wallet.contacts.resolve(alias)['address']
         self.wallet.sign_payment_request(address, alias, alias_addr, password)
 
-    @command('w')
+    @command('wu')
     def rmrequest(self, address):
         """Remove a payment request"""
         return self.wallet.remove_payment_request(address, self.config)
 
-    @command('w')
+    @command('wu')
     def clearrequests(self):
         """Remove all payment requests"""
         for k in list(self.wallet.receive_requests.keys()):
@@ -965,6 +1151,113 @@ class Commands(PrintError):
         to config settings (static/dynamic)"""
         return self.config.fee_per_kb()
 
+    @command('')
+    def getcachestats(self):
+        """Return usage statistics (items, bytes, hits, misses, evictions) of
+        the in-memory caches, by name."""
+        from .caches import get_cache_stats
+        from . import tx_store
+        ret = get_cache_stats()
+        ret[tx_store.shared_store.name] = tx_store.shared_store.stats()
+        return ret
+
+    @command('')
+    def getmetrics(self, prometheus=False):
+        """Return performance metrics: request round trip times, queue sizes,
+        SLP validation and wallet write timings."""
+        from . import metrics
+        if prometheus:
+            return metrics.registry.to_prometheus()
+        return metrics.registry.snapshot()
+
+    @command('')
+    def benchimport(self):
+        """Measure the time a fresh process takes to import this package,
+        the threads running afterwards and the slowest modules to import
+        (times in milliseconds). Only available when running from source."""
+        import os
+        import subprocess
+        if getattr(sys, 'frozen', False):
+            raise RuntimeError('Not available in frozen builds')
+        script = ('import threading, time\n'
+                  't0 = time.time()\n'
+                  'import {}\n'
+                  'print(round((time.time() - t0) * 1e3, 1))\n'
+                  'print(",".join(t.name for t in threading.enumerate()))\n').format(__package__)
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(p for p in sys.path if p))
+        proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', script], env=env,
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                              universal_newlines=True, timeout=60)
+        if proc.returncode:
+            raise RuntimeError(proc.stderr.strip().splitlines()[-1:])
+        modules = []
+        for line in proc.stderr.splitlines():
+            # import time: self [us] | cumulative | imported package
+            parts = line.split('|')
+            if not line.startswith('import time:') or len(parts) != 3:
+                continue
+            try:
+                self_us, cumulative_us = int(parts[0].split(':')[1]), int(parts[1])
+            except ValueError:
+                continue  # the header line
+            modules.append((parts[2].strip(), self_us / 1e3, cumulative_us / 1e3))
+        modules.sort(key=lambda m: m[1], reverse=True)
+        total_ms, threads = proc.stdout.splitlines()[-2:]
+        return {
+            'total_ms': float(total_ms),
+            'modules': len(modules),
+            'threads': threads.split(','),
+            'slowest': [{'module': name, 'self_ms': s, 'cumulative_ms': c}
+                        for name, s, c in modules[:20]],
+        }
+
+    @command('w')
+    def getloadtimings(self):
+        """Return the time (in seconds) spent in each phase of opening the
+        wallet."""
+        return self.wallet.get_load_timings()
+
+    @command('n')
+    def bfpdownload(self, file_id, path, timeout=300):
+        """Download a file stored with the Bitcoin Files Protocol to `path`.
+        Returns its size, sha256 and whether the hash matched the file's
+        metadata."""
+        from .bitcoinfiles import BfpDownloader, BfpDownloadError
+        downloader = BfpDownloader(self.network, file_id, path, wallet=self.wallet)
+        try:
+            return downloader.download(timeout=float(timeout))
+        except BfpDownloadError as e:
+            raise BaseException(str(e))
+
+    @command('wpnu')
+    def bfpupload(self, path, password=None, timeout=300):
+        """Upload a file with the Bitcoin Files Protocol. All transactions are
+        signed first, then broadcast. Returns the file id."""
+        import hashlib
+        import os
+        from . import bitcoinfiles
+        with open(path, 'rb') as f:
+            data = f.read()
+        name = os.path.basename(path).split(os.extsep, 1)
+        metadata = {
+            'filename': name[0],
+            'fileext': name[1] if len(name) > 1 else None,
+            'filesize': len(data),
+            'file_sha256': hashlib.sha256(data).hexdigest(),
+            'prev_file_sha256': None,
+            'uri': None,
+        }
+        try:
+            txs = bitcoinfiles.make_upload_chain(self.wallet, self.config, data, metadata, password)
+            file_id = bitcoinfiles.broadcast_upload_chain(self.network, txs, total_timeout=float(timeout))
+        except bitcoinfiles.BfpUploadError as e:
+            raise BaseException(str(e))
+        return {
+            'file_id': 'bitcoinfile:' + file_id,
+            'sha256': metadata['file_sha256'],
+            'transactions': len(txs),
+        }
+
     @command('')
     def help(self):
         # for the python console
@@ -990,6 +1283,8 @@ param_descriptions = {
     'requested_amount': 'Requested amount (in BCH).',
     'outputs': 'list of ["address", amount]',
     'redeem_script': 'redeem script (hexadecimal)',
+    'file_id': 'BFP file id: the txid of the file\'s metadata transaction, optionally prefixed with \'bitcoinfile:\'',
+    'path': 'File path',
 }
 
 command_options = {
@@ -1009,11 +1304,13 @@ command_options = {
     'index_url':   (None, 'Override the URL where you would like users to be shown the BIP70 Payment Request'),
     'labels':      ("-l", "Show the labels of listed addresses"),
     'language':    ("-L", "Default language for wordlist"),
+    'limit':       (None, "Maximum number of history items to return (0 for all)"),
     'locktime':    (None, "Set locktime block number"),
     'memo':        ("-m", "Description of the request"),
     'nbits':       (None, "Number of bits of entropy"),
     'new_password':(None, "New Password"),
     'nocheck':     (None, "Do not verify aliases"),
+    'offset':      (None, "Number of history items (newest first) to skip"),
     'op_return':   (None, "Specify string data to add to the transaction as an OP_RETURN output"),
     'op_return_raw': (None, 'Specify raw hex data to add to the transaction as an OP_RETURN output (0x6a aka the OP_RETURN byte will be auto-prepended for you so do not include it)'),
     'paid':        (None, "Show only paid requests."),
@@ -1021,10 +1318,11 @@ command_options = {
     'payment_url': (None, 'Optional URL where you would like users to POST the BIP70 Payment message'),
     'pending':     (None, "Show only pending requests."),
     'privkey':     (None, "Private key. Set to '?' to get a prompt."),
+    'prometheus':  (None, "Return metrics in the Prometheus text format"),
     'receiving':   (None, "Show only receiving addresses"),
     'show_addresses': (None, "Show input and output addresses"),
     'show_fiat':   (None, "Show fiat value of transactions"),
-    'timeout':     (None, "Timeout in seconds to wait for the overall operation to complete. Defaults to 30.0."),
+    'timeout':     (None, "Timeout in seconds to wait for the overall operation to complete. Defaults to 30.0 for history, 3.0 for slpvalidate and 300.0 for bfpdownload and bfpupload."),
     'unsigned':    ("-u", "Do not sign transaction"),
     'unused':      (None, "Show only unused addresses"),
     'use_net':     (None, "Go out to network for accurate fiat value and/or fee calculations for history. If not specified only the wallet's cache is used which may lead to inaccurate/missing fees and/or FX rates."),
@@ -1040,8 +1338,11 @@ arg_types = {
     'nbits': int,
     'imax': int,
     'year': int,
+    'offset': int,
+    'limit': int,
     'entropy': int,
     'tx': tx_from_str,
+    'txids': json_loads,
     'pubkeys': json_loads,
     'jsontx': json_loads,
     'inputs': json_loads,
@@ -26,6 +26,7 @@ import ast
 import os
 import time
 import sys
+import threading
 
 # from jsonrpc import JSONRPCResponseManager
 import jsonrpclib
@@ -148,21 +149,28 @@ class Daemon(DaemonThread):
             self.network = Network(config)
             self.network.start()
         self.fx = FxThread(config, self.network)
+        from . import paymentrequest  # slow to import, so only once a daemon starts
+        paymentrequest.set_cache_dir(self.fx.cache_dir)
         if self.network:
             self.network.add_jobs([self.fx])
         self.gui = None
         self.wallets = {}
+        self.wallets_lock = threading.RLock()  # RPC requests may load/stop wallets concurrently
         # Setup JSONRPC server
         self.init_server(config, fd, is_gui)
 
     def init_server(self, config, fd, is_gui):
         host = config.get('rpchost', '127.0.0.1')
         port = config.get('rpcport', 0)
+        # Concurrent RPC handling is opt-in. is_gui: the GUI and its console
+        # expect commands to run one at a time
+        num_workers = 0 if is_gui else int(config.get('rpcworkers', 0))
 
         rpc_user, rpc_password = get_rpc_credentials(config)
         try:
             server = VerifyingJSONRPCServer((host, port), logRequests=False,
-                                            rpc_user=rpc_user, rpc_password=rpc_password)
+                                            rpc_user=rpc_user, rpc_password=rpc_password,
+                                            num_workers=num_workers)
         except Exception as e:
             self.print_error('Warning: cannot initialize RPC server on host', host, e)
             self.server = None
@@ -249,6 +257,10 @@ class Daemon(DaemonThread):
         return response
 
     def load_wallet(self, path, password):
+        with self.wallets_lock:
+            return self._load_wallet(path, password)
+
+    def _load_wallet(self, path, password):
         path = standardize_path(path)
         # wizard will be launched if we return
         if path in self.wallets:
@@ -288,8 +300,9 @@ class Daemon(DaemonThread):
 
     def stop_wallet(self, path):
         # Issue #659 wallet may already be stopped.
-        if path in self.wallets:
-            wallet = self.wallets.pop(path)
+        with self.wallets_lock:
+            wallet = self.wallets.pop(path, None)
+        if wallet is not None:
             wallet.stop_threads()
 
     def run_cmdline(self, config_options):
@@ -325,6 +338,8 @@ class Daemon(DaemonThread):
     def run(self):
         while self.is_running():
             self.server.handle_request() if self.server else time.sleep(0.1)
+        if self.server:
+            self.server.server_close()
         for k, wallet in self.wallets.items():
             wallet.stop_threads()
         if self.network:
@@ -139,4 +139,53 @@ def is_using_fast_ecc():
     return _patched_functions.monkey_patching_active
 
 
+def verify_batch(items):
+    ''' Verify a batch of signatures directly with libsecp256k1, without
+    building any python-ecdsa point or key objects.
+
+    `items` is an iterable of (pubkey, sig, msghash) bytes triples, where
+    `sig` is either a DER-encoded ECDSA signature or a 64-byte Schnorr
+    signature (no sighash byte in either case).
+
+    Returns a list of bools (one per item, in order), or None if
+    libsecp256k1 is not available and the caller should fall back to the
+    slow path. Pubkeys are only parsed once per batch, which helps a lot for
+    consolidation transactions spending many coins from the same address. '''
+    lib = secp256k1.secp256k1
+    if not lib:
+        return None
+    from . import schnorr  # avoid circular import at module level
+    ctx = lib.ctx
+    schnorr_verify = schnorr._secp256k1_schnorr_verify
+    parsed_pubkeys = dict()
+    results = []
+    for pubkey, sig, msghash in items:
+        parsed = parsed_pubkeys.get(pubkey)
+        if parsed is None:
+            parsed = create_string_buffer(64)
+            if not lib.secp256k1_ec_pubkey_parse(ctx, parsed, pubkey, len(pubkey)):
+                parsed = False
+            parsed_pubkeys[pubkey] = parsed
+        if not parsed or len(msghash) != 32:
+            results.append(False)
+        elif len(sig) == 64:
+            # Schnorr signatures are always exactly 64 bytes
+            if schnorr_verify:
+                results.append(1 == schnorr_verify(ctx, sig, msghash, parsed))
+            else:
+                try:
+                    results.append(schnorr.verify(pubkey, sig, msghash))
+                except ValueError:
+                    results.append(False)
+        else:
+            ecdsa_sig = create_string_buffer(64)
+            if not lib.secp256k1_ecdsa_signature_parse_der(ctx, ecdsa_sig, sig, len(sig)):
+                results.append(False)
+                continue
+            # python-ecdsa accepts high-S signatures, so we do too
+            lib.secp256k1_ecdsa_signature_normalize(ctx, ecdsa_sig, ecdsa_sig)
+            results.append(1 == lib.secp256k1_ecdsa_verify(ctx, ecdsa_sig, msghash, parsed))
+    return results
+
+
 _prepare_monkey_patching_of_python_ecdsa_internals_with_libsecp256k1()
@@ -1,11 +1,14 @@
-from datetime import datetime
+from datetime import datetime, date
 import inspect
 import requests
 import sys
 import os
 import json
+import math
+import mmap
 import pkgutil
-from threading import Thread
+import struct
+from threading import Thread, Lock
 import time
 import csv
 import decimal
@@ -30,6 +33,131 @@ CCY_PRECISIONS = {'BHD': 3, 'BIF': 0, 'BYR': 0, 'CLF': 4, 'CLP': 0,
                   'VUV': 0, 'XAF': 0, 'XAU': 4, 'XOF': 0, 'XPF': 0}
 
 
+class RateTable(PrintError):
+    ''' A table of daily historical rates for one (exchange, currency),
+    persisted in a compact binary file which is memory-mapped for lookups.
+
+    Days are date ordinals (see date.toordinal()). The file holds a header
+    (magic, first day, number of days) followed by one little-endian double
+    per day, NaN meaning "no rate for that day". '''
+
+    MAGIC = b'ECR1'
+    HEADER = struct.Struct('<4sII')
+    RATE = struct.Struct('<d')
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = Lock()
+        self.mm = None
+        self.first_day = self.count = 0
+        with self.lock:
+            self._map()
+
+    def diagnostic_name(self):
+        return os.path.basename(self.path)
+
+    def _map(self):
+        # call with lock held
+        self._unmap()
+        try:
+            with open(self.path, 'rb') as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return  # missing or empty file
+        try:
+            magic, first_day, count = self.HEADER.unpack_from(mm, 0)
+            if magic != self.MAGIC or len(mm) < self.HEADER.size + count * self.RATE.size:
+                raise ValueError('bad rate table')
+        except (struct.error, ValueError) as e:
+            self.print_error("ignoring", repr(e))
+            mm.close()
+            return
+        self.mm, self.first_day, self.count = mm, first_day, count
+
+    def _unmap(self):
+        if self.mm:
+            self.mm.close()
+        self.mm = None
+        self.first_day = self.count = 0
+
+    def close(self):
+        with self.lock:
+            self._unmap()
+
+    def __len__(self):
+        return self.count
+
+    def _get(self, day):
+        # call with lock held
+        i = day - self.first_day
+        if self.mm is None or not 0 <= i < self.count:
+            return None
+        rate = self.RATE.unpack_from(self.mm, self.HEADER.size + i * self.RATE.size)[0]
+        return None if math.isnan(rate) else rate
+
+    def get(self, day):
+        ''' Returns the rate (a float) for date ordinal `day`, or None. '''
+        with self.lock:
+            return self._get(day)
+
+    def get_many(self, days):
+        ''' Returns a list with the rate (or None) of each day in `days`. '''
+        with self.lock:
+            return [self._get(day) for day in days]
+
+    def last_day(self):
+        ''' The last day that has a rate, or None if the table is empty. '''
+        with self.lock:
+            for day in range(self.first_day + self.count - 1, self.first_day - 1, -1):
+                if self._get(day) is not None:
+                    return day
+
+    def mtime(self):
+        try:
+            return os.stat(self.path).st_mtime
+        except OSError:
+            return 0.0
+
+    def update(self, rates):
+        ''' Merges `rates`, a dict of date ordinal -> rate, into the table
+        and writes it out. Existing days are overwritten. With no rates, the
+        table's mtime is updated, so that it counts as just refreshed. '''
+        rates = {int(day): float(rate) for day, rate in rates.items() if rate is not None}
+        if not rates:
+            try:
+                os.utime(self.path)
+            except OSError:
+                pass  # no table file yet
+            return
+        with self.lock:
+            lo = min(rates)
+            hi = max(rates)
+            if self.count:
+                lo = min(lo, self.first_day)
+                hi = max(hi, self.first_day + self.count - 1)
+            values = [self._get(day) for day in range(lo, hi + 1)]
+            for day, rate in rates.items():
+                values[day - lo] = rate
+            data = bytearray(self.HEADER.pack(self.MAGIC, lo, len(values)))
+            for rate in values:
+                data += self.RATE.pack(float('nan') if rate is None else rate)
+            # Windows won't replace a file that is mapped
+            self._unmap()
+            tmp = self.path + '.tmp'
+            try:
+                with open(tmp, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp, self.path)
+            except OSError as e:
+                self.print_error("write error:", repr(e))
+            self._map()
+
+
+def date_str_to_day(date_str):
+    ''' '2020-01-31' -> date ordinal '''
+    return datetime.strptime(date_str, '%Y-%m-%d').toordinal()
+
+
 class ExchangeBase(PrintError):
 
     def __init__(self, on_quotes, on_history):
@@ -71,23 +199,26 @@ class ExchangeBase(PrintError):
         t = Thread(target=self.update_safe, args=(ccy,), daemon=True)
         t.start()
 
+    def _get_cache_filename(self, ccy, cache_dir):
+        return os.path.join(cache_dir, self.name() + '_' + ccy)
+
     def read_historical_rates(self, ccy, cache_dir):
+        ''' Returns the RateTable for ccy. Rates from the JSON cache files
+        written by older versions are imported into it. '''
         filename = self._get_cache_filename(ccy, cache_dir)
-        h, timestamp = None, 0.0
-        if os.path.exists(filename):
-            timestamp = os.stat(filename).st_mtime
+        table = RateTable(filename + '.rates')
+        if not len(table) and os.path.exists(filename):
             try:
                 with open(filename, 'r', encoding='utf-8') as f:
                     h = json.loads(f.read())
-                if h:
-                    self.print_error("read_historical_rates: returning cached history from", filename)
+                table.update({date_str_to_day(k): v for k, v in h.items()})
+                # keep the age of the imported rates, so they get refreshed on schedule
+                mtime = os.stat(filename).st_mtime
+                os.utime(table.path, (mtime, mtime))
+                self.print_error("read_historical_rates: imported", len(h), "rates from", filename)
             except Exception as e:
                 self.print_error("read_historical_rates: error", repr(e))
-        h = h or None
-        return h, timestamp
-
-    def _get_cache_filename(self, ccy, cache_dir):
-        return os.path.join(cache_dir, self.name() + '_' + ccy)
+        return table
 
     @staticmethod
     def _is_timestamp_old(timestamp):
@@ -97,38 +228,28 @@ class ExchangeBase(PrintError):
     def is_historical_rate_old(self, ccy):
         return self._is_timestamp_old(self.history_timestamps.get(ccy, 0.0))
 
-    def _cache_historical_rates(self, h, ccy, cache_dir):
-        ''' Writes the history, h, to the cache file. Catches its own exceptions
-        and always returns successfully, even if the write process failed. '''
-        wroteBytes, filename = 0, '(none)'
-        try:
-            filename = self._get_cache_filename(ccy, cache_dir)
-            with open(filename, 'w', encoding='utf-8') as f:
-                f.write(json.dumps(h))
-            wroteBytes = os.stat(filename).st_size
-        except Exception as e:
-            self.print_error("cache_historical_rates error:", repr(e))
-            return False
-        self.print_error(f"cache_historical_rates: wrote {wroteBytes} bytes to file {filename}")
-        return True
-
     def get_historical_rates_safe(self, ccy, cache_dir):
-        h, timestamp = self.read_historical_rates(ccy, cache_dir)
-        if not h or self._is_timestamp_old(timestamp):
+        table = self.history.get(ccy) or self.read_historical_rates(ccy, cache_dir)
+        timestamp = table.mtime()
+        if not len(table) or self._is_timestamp_old(timestamp):
+            # Only ask for the days we don't have. The last day is asked for
+            # again as its rate may have been a partial day.
+            last_day = table.last_day()
+            since = date.fromordinal(last_day) if last_day is not None else None
             try:
-                self.print_error("requesting fx history for", ccy)
-                h = self.request_history(ccy)
+                self.print_error("requesting fx history for", ccy, "since", since)
+                h = self.request_history(ccy, since=since)
                 self.print_error("received fx history for", ccy)
-                if not h:
-                    # Paranoia: No data; abort early rather than write out an
-                    # empty file
+                if not h and not len(table):
                     raise RuntimeWarning(f"received empty history for {ccy}")
-                self._cache_historical_rates(h, ccy, cache_dir)
+                table.update({date_str_to_day(k): v for k, v in h.items()})
+                timestamp = time.time()
             except Exception as e:
                 self.print_error("failed fx history:", repr(e))
-                return
-        self.print_error("received history rates of length", len(h))
-        self.history[ccy] = h
+                if not len(table):
+                    return
+        self.print_error("history rates table has", len(table), "days")
+        self.history[ccy] = table
         self.history_timestamps[ccy] = timestamp
         self.on_history()
 
@@ -143,8 +264,21 @@ class ExchangeBase(PrintError):
     def history_ccys(self):
         return []
 
+    def request_history(self, ccy, since=None):
+        ''' Returns a dict of 'YYYY-MM-DD' -> rate, for (at least) the days
+        from the date `since` onwards, or all days if `since` is None.
+        Exchanges with history_ccys() override this. '''
+        return {}
+
     def historical_rate(self, ccy, d_t):
-        return self.history.get(ccy, {}).get(d_t.strftime('%Y-%m-%d'))
+        table = self.history.get(ccy)
+        return table.get(d_t.toordinal()) if table is not None else None
+
+    def historical_rates(self, ccy, days):
+        ''' Returns a list of the rates (or None) of the date ordinals
+        `days`. '''
+        table = self.history.get(ccy)
+        return table.get_many(days) if table is not None else [None] * len(days)
 
     def get_currencies(self):
         rates = self.get_rates('')
@@ -259,12 +393,17 @@ class CoinCap(ExchangeBase):
     def history_ccys(self):
         return ['USD']
 
-    def request_history(self, ccy):
+    def request_history(self, ccy, since=None):
         from datetime import datetime as dt
         # Currently 2000 days is the maximum in 1 API call which needs to be fixed
         # sometime before the year 2023...
+        if since:
+            start = (since.toordinal() - date(1970, 1, 1).toordinal()) * 86400 * 1000
+            query = "&start=%d&end=%d" % (start, int(time.time()) * 1000)
+        else:
+            query = "&limit=2000"
         history = self.get_json('api.coincap.io',
-                               "/v2/assets/bitcoin-cash/history?interval=d1&limit=2000")
+                               "/v2/assets/bitcoin-cash/history?interval=d1" + query)
         return dict([(dt.utcfromtimestamp(h['time']/1000).strftime('%Y-%m-%d'),
                         h['priceUsd'])
                      for h in history['data']])
@@ -285,8 +424,9 @@ class CoinGecko(ExchangeBase):
                 'PHP', 'PKR', 'PLN', 'RUB', 'SAR', 'SEK', 'SGD', 'THB',
                 'TRY', 'TWD', 'USD', 'VEF', 'XAG', 'XAU', 'XDR', 'ZAR']
 
-    def request_history(self, ccy):
-        history = self.get_json('api.coingecko.com', '/api/v3/coins/bitcoin-cash/market_chart?vs_currency=%s&days=max' % ccy)
+    def request_history(self, ccy, since=None):
+        days = 'max' if since is None else (date.today() - since).days + 1
+        history = self.get_json('api.coingecko.com', '/api/v3/coins/bitcoin-cash/market_chart?vs_currency=%s&days=%s&interval=daily' % (ccy, days))
 
         from datetime import datetime as dt
         return dict([(dt.utcfromtimestamp(h[0]/1000).strftime('%Y-%m-%d'), h[1])
@@ -501,7 +641,25 @@ class FxThread(ThreadJob):
         if rate is None and (datetime.today().date() - d_t.date()).days <= 2:
             rate = self.exchange.quotes.get(self.ccy)
             self.history_used_spot = True
-        return PyDecimal(rate) if rate is not None else None
+        return PyDecimal(str(rate)) if rate is not None else None
+
+    def history_rates(self, timestamps):
+        ''' Like history_rate() for many timestamps at once: returns a list
+        with the rate (a PyDecimal, or None) of each timestamp. '''
+        days = [datetime.fromtimestamp(ts).toordinal() if ts is not None else None
+                for ts in timestamps]
+        uniq = sorted(set(d for d in days if d is not None))
+        rates = dict(zip(uniq, self.exchange.historical_rates(self.ccy, uniq)))
+        spot_since = date.today().toordinal() - 2
+        ret = []
+        for day in days:
+            rate = rates.get(day)
+            if rate is None and day is not None and day >= spot_since:
+                # Frequently there is no rate for today, until tomorrow :)
+                rate = self.exchange.quotes.get(self.ccy)
+                self.history_used_spot = True
+            ret.append(PyDecimal(str(rate)) if rate is not None else None)
+        return ret
 
     def historical_value_str(self, satoshis, d_t):
         rate = self.history_rate(d_t)
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+#
+# Electron Cash - A Bitcoin Cash SPV Wallet
+# License: MIT License
+#
+'''
+An index of a wallet's transaction history, in (height, pos) order, for
+paging through the history without recomputing all of it.
+
+The wallet tells the index which tx's changed (see `HistoryIndex.invalidate`)
+and the index looks just those up again on the next read. The running
+balance is kept as a prefix sum of the tx deltas, which is brought up to date
+from the oldest changed position onwards only.
+'''
+from bisect import bisect_left
+
+
+class HistoryIndex:
+    ''' The wallet's history: tx_hash -> (txpos, delta), kept sorted by
+    txpos, with prefix sums of the deltas.
+
+    `get_entry(tx_hash)` must return (txpos, delta) for a tx in the history,
+    or None if the tx isn't in the history (anymore). `delta` may be None,
+    for a tx whose effect on the wallet isn't known yet (pruned).
+    `get_all()` must return all the tx_hashes in the history.
+
+    Not thread-safe: the wallet calls it with its lock held. '''
+
+    def __init__(self, get_entry, get_all):
+        self.get_entry = get_entry
+        self.get_all = get_all
+        self.keys = []  # sorted list of (txpos, tx_hash)
+        self.entries = {}  # tx_hash -> (txpos, delta)
+        # sums[i] is the sum of the known deltas of keys[:i+1] and nones[i]
+        # the number of unknown ones. Both are only valid below self.valid.
+        self.sums = []
+        self.nones = []
+        self.valid = 0
+        self.dirty = set()
+        self.stale = True  # True: rebuild all of it on the next read
+
+    def invalidate(self, tx_hash):
+        ''' The position or delta of tx_hash may have changed, or it may
+        have been added to or removed from the history. '''
+        self.dirty.add(tx_hash)
+
+    def invalidate_all(self):
+        self.stale = True
+        self.dirty.clear()
+
+    def refresh(self):
+        ''' Brings the index up to date. Called by the read methods. '''
+        if self.stale:
+            self.stale = False
+            self.dirty.clear()
+            self.entries = {}
+            for tx_hash in self.get_all():
+                entry = self.get_entry(tx_hash)
+                if entry is not None:
+                    self.entries[tx_hash] = entry
+            self.keys = sorted((txpos, tx_hash) for tx_hash, (txpos, _) in self.entries.items())
+            self.valid = 0
+        elif self.dirty:
+            dirty, self.dirty = self.dirty, set()
+            keys = self.keys
+            for tx_hash in dirty:
+                old = self.entries.pop(tx_hash, None)
+                new = self.get_entry(tx_hash)
+                if new is not None:
+                    self.entries[tx_hash] = new
+                if old == new:
+                    continue
+                if old is not None:
+                    i = bisect_left(keys, (old[0], tx_hash))
+                    del keys[i]
+                    self.valid = min(self.valid, i)
+                if new is not None:
+                    i = bisect_left(keys, (new[0], tx_hash))
+                    keys.insert(i, (new[0], tx_hash))
+                    self.valid = min(self.valid, i)
+        n = len(self.keys)
+        if self.valid < n or len(self.sums) != n:
+            del self.sums[self.valid:], self.nones[self.valid:]
+            s = self.sums[-1] if self.sums else 0
+            nones = self.nones[-1] if self.nones else 0
+            for _, tx_hash in self.keys[self.valid:]:
+                delta = self.entries[tx_hash][1]
+                if delta is None:
+                    nones += 1
+                else:
+                    s += delta
+                self.sums.append(s)
+                self.nones.append(nones)
+            self.valid = n
+
+    def __len__(self):
+        self.refresh()
+        return len(self.keys)
+
+    def page(self, balance, offset=0, limit=None, *, reverse=True):
+        ''' Returns a list of (tx_hash, delta, balance) for up to `limit`
+        (None: all) items of the history, skipping the first `offset`, newest
+        first if `reverse`.
+
+        `balance` is the wallet's current balance. As in Abstract_Wallet.get_history,
+        the balance after each tx is worked out backwards from it, and is None
+        before a tx whose delta is unknown. '''
+        self.refresh()
+        n = len(self.keys)
+        offset = max(offset, 0)
+        if reverse:
+            stop = n - offset
+            start = max(stop - limit, 0) if limit is not None else 0
+            indices = range(stop - 1, start - 1, -1)
+        else:
+            stop = n if limit is None else min(offset + limit, n)
+            indices = range(offset, stop)
+        total, nones = (self.sums[-1], self.nones[-1]) if n else (0, 0)
+        ret = []
+        for i in indices:
+            tx_hash = self.keys[i][1]
+            if nones - self.nones[i]:
+                b = None
+            else:
+                b = balance - (total - self.sums[i])
+            ret.append((tx_hash, self.entries[tx_hash][1], b))
+        return ret
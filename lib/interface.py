@@ -37,10 +37,16 @@ from .util import print_error
 
 ca_path = requests.certs.where()
 
+from . import metrics
 from . import util
 from . import x509
 from . import pem
 
+REQUESTS = metrics.counter('network_requests_total', 'Requests sent to servers')
+REQUEST_ERRORS = metrics.counter('network_request_errors_total', 'Server responses carrying an error')
+REQUEST_SECONDS = metrics.histogram('network_request_seconds', 'Server request round trip time')
+BATCHES = metrics.counter('network_batches_total', 'JSON-RPC batch arrays sent to servers')
+
 
 def Connection(server, queue, config_path):
     """Makes asynchronous connections to a remote electrum server.
@@ -267,7 +273,18 @@ class Interface(util.PrintError):
     MODE_CATCH_UP = 'catch_up'
     MODE_VERIFICATION = 'verification'
 
-    def __init__(self, server, socket, *, max_message_bytes=0):
+    # Default for max_unanswered, see __init__
+    DEFAULT_MAX_UNANSWERED = 100
+
+    def __init__(self, server, socket, *, max_message_bytes=0,
+                 max_unanswered=DEFAULT_MAX_UNANSWERED, batch_size=0, batch_window=0):
+        ''' At most `max_unanswered` requests are sent to the server without
+        having been answered.
+
+        If `batch_size` is > 1, queued requests are sent in JSON-RPC batch
+        arrays of up to that many requests, once the server has answered its
+        first request (server.version). If `batch_window` is > 0, at most that
+        many batches are in flight at once. '''
         self.server = server
         self.host, self.port, _ = server.rsplit(':', 2)
         self.socket = socket
@@ -278,8 +295,15 @@ class Interface(util.PrintError):
         self.debug = False
         self.unsent_requests = []
         self.unanswered_requests = {}
+        self.send_times = {}  # wire id -> time sent, for the round trip metric
         self.last_send = time.time()
         self.closed_remotely = False
+        self.max_unanswered = max(1, max_unanswered)
+        self.batch_size = max(1, batch_size)
+        self.batch_window = max(0, batch_window)
+        self.batching = False  # batch_size applies once the server has answered a request
+        self.inflight_batches = {}  # batch's first wire id -> set of its unanswered wire ids
+        self.batch_of = {}  # wire id -> batch's first wire id
 
         self.mode = None
 
@@ -317,9 +341,12 @@ class Interface(util.PrintError):
         self.unsent_requests.append(args)
 
     def num_requests(self):
-        '''Keep unanswered requests below 100'''
-        n = 100 - len(self.unanswered_requests)
-        return min(n, len(self.unsent_requests))
+        '''Keep unanswered requests below max_unanswered, and batches in
+        flight within batch_window'''
+        n = self.max_unanswered - len(self.unanswered_requests)
+        if self.batching and self.batch_size > 1 and self.batch_window:
+            n = min(n, (self.batch_window - len(self.inflight_batches)) * self.batch_size)
+        return max(0, min(n, len(self.unsent_requests)))
 
     def send_requests(self):
         '''Sends queued requests.  Returns False on failure.'''
@@ -327,18 +354,43 @@ class Interface(util.PrintError):
         make_dict = lambda m, p, i: {'method': m, 'params': p, 'id': i}
         n = self.num_requests()
         wire_requests = self.unsent_requests[0:n]
+        frames = [make_dict(*r) for r in wire_requests]
+        if self.batching and self.batch_size > 1:
+            frames = [frames[i:i+self.batch_size] for i in range(0, len(frames), self.batch_size)]
+            # a batch of one goes out as a plain request
+            frames = [f if len(f) > 1 else f[0] for f in frames]
         try:
-            self.pipe.send_all([make_dict(*r) for r in wire_requests])
+            self.pipe.send_all(frames)
         except (OSError, ssl.SSLError) as e:
             self.print_error("send_requests: {}: {}".format(type(e).__name__, e))
             return False
         self.unsent_requests = self.unsent_requests[n:]
+        now = time.time()
         for request in wire_requests:
             if self.debug:
                 self.print_error("-->", request)
             self.unanswered_requests[request[2]] = request
+            self.send_times[request[2]] = now
+        for frame in frames:
+            if isinstance(frame, list):
+                ids = [r['id'] for r in frame]
+                self.inflight_batches[ids[0]] = set(ids)
+                for wire_id in ids:
+                    self.batch_of[wire_id] = ids[0]
+                BATCHES.inc()
+        REQUESTS.inc(len(wire_requests))
         return True
 
+    def _answered(self, wire_id):
+        ''' Forget wire_id's batch, if any, once all of it is answered. '''
+        batch = self.batch_of.pop(wire_id, None)
+        if batch is not None:
+            ids = self.inflight_batches.get(batch)
+            if ids is not None:
+                ids.discard(wire_id)
+                if not ids:
+                    del self.inflight_batches[batch]
+
     def ping_required(self):
         '''Returns True if a ping should be sent.'''
         return time.time() - self.last_send > 300
@@ -362,15 +414,23 @@ class Interface(util.PrintError):
         or the remote server is misbehaving, a (None, None) will appear.
         '''
         responses = []
+        batch = []  # the rest of a batch response being processed, reversed
         while True:
-            try:
-                response = self.pipe.get()
-            except util.timeout:
-                break
-            except self.pipe.MessageSizeExceeded as e:
-                self.print_error(repr(e))
-                responses.append((None, None))  # signals Network class to close this connection
-                break
+            if batch:
+                response = batch.pop()
+            else:
+                try:
+                    response = self.pipe.get()
+                except util.timeout:
+                    break
+                except self.pipe.MessageSizeExceeded as e:
+                    self.print_error(repr(e))
+                    responses.append((None, None))  # signals Network class to close this connection
+                    break
+                if type(response) is list and response and self.inflight_batches:
+                    # The response to a batch: handle its items one by one
+                    batch = response[::-1]
+                    continue
             if not type(response) is dict:
                 responses.append((None, None))
                 if response is None:
@@ -404,7 +464,14 @@ class Interface(util.PrintError):
                 responses.append((None, response))
             else:
                 request = self.unanswered_requests.pop(wire_id, None)
+                sent = self.send_times.pop(wire_id, None)
+                self._answered(wire_id)
                 if request:
+                    self.batching = True
+                    if sent is not None:
+                        REQUEST_SECONDS.observe(time.time() - sent)
+                    if response.get('error'):
+                        REQUEST_ERRORS.inc()
                     responses.append((request, response))
                 else:
                     self.print_error("unknown wire ID", wire_id)
@@ -25,6 +25,7 @@
 
 from jsonrpclib.SimpleJSONRPCServer import SimpleJSONRPCServer, SimpleJSONRPCRequestHandler
 from base64 import b64decode
+from concurrent.futures import ThreadPoolExecutor
 import time
 
 from . import util
@@ -47,11 +48,18 @@ class RPCAuthUnsupportedType(Exception):
 
 # based on http://acooke.org/cute/BasicHTTPA0.html by andrew cooke
 class VerifyingJSONRPCServer(SimpleJSONRPCServer):
+    ''' If num_workers > 1, requests are handled concurrently by a pool of
+    that many worker threads, otherwise they are handled one at a time in the
+    thread calling handle_request(). JSON-RPC batch requests (a list of calls
+    in one request) are handled by the jsonrpclib dispatcher. '''
 
-    def __init__(self, *args, rpc_user, rpc_password, **kargs):
+    def __init__(self, *args, rpc_user, rpc_password, num_workers=0, **kargs):
 
         self.rpc_user = rpc_user
         self.rpc_password = rpc_password
+        self.executor = None
+        if num_workers > 1:
+            self.executor = ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix='RPCWorker')
 
         class VerifyingRequestHandler(SimpleJSONRPCRequestHandler):
             def parse_request(myself):
@@ -73,6 +81,25 @@ class VerifyingJSONRPCServer(SimpleJSONRPCServer):
         SimpleJSONRPCServer.__init__(
             self, requestHandler=VerifyingRequestHandler, *args, **kargs)
 
+    def process_request(self, request, client_address):
+        if not self.executor:
+            return super().process_request(request, client_address)
+        self.executor.submit(self._process_request_in_worker, request, client_address)
+
+    def _process_request_in_worker(self, request, client_address):
+        # Same as socketserver.ThreadingMixIn.process_request_thread
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        if self.executor:
+            self.executor.shutdown(wait=False)
+
     def authenticate(self, headers):
         if self.rpc_password == '':
             # RPC authentication is disabled
@@ -33,6 +33,7 @@ from .address import Address, PublicKey
 from . import networks
 from .mnemonic import Mnemonic, load_wordlist
 from .plugins import run_hook
+from . import util
 from .util import PrintError, InvalidPassword, hfu
 
 
@@ -108,18 +109,26 @@ class Software_KeyStore(KeyStore):
         decrypted = ec.decrypt_message(message)
         return decrypted
 
-    def sign_transaction(self, tx, password, *, use_cache=False):
+    def sign_transaction(self, tx, password, *, use_cache=False, num_workers=0):
+        ''' If `num_workers` > 1, large transactions have their keys derived
+        and their inputs signed in that many worker processes. '''
         if self.is_watching_only():
             return
         # Raise if password is not correct.
         self.check_password(password)
         # Add private keys
-        keypairs = self.get_tx_derivations(tx)
-        for k, v in keypairs.items():
-            keypairs[k] = self.get_private_key(v, password)
+        keypairs = self.get_private_keys(self.get_tx_derivations(tx), password,
+                                         num_workers=num_workers)
         # Sign
         if keypairs:
-            tx.sign(keypairs, use_cache=use_cache)
+            tx.sign(keypairs, use_cache=use_cache, num_workers=num_workers)
+
+    def get_private_keys(self, derivations, password, *, num_workers=0):
+        ''' Given a dict of key -> derivation (as returned by
+        get_tx_derivations), returns a dict of key -> (privkey, compressed).
+        Subclasses may override this to derive keys in parallel. '''
+        return {k: self.get_private_key(v, password)
+                for k, v in derivations.items()}
 
 
 class Imported_KeyStore(Software_KeyStore):
@@ -411,10 +420,31 @@ class BIP32_KeyStore(Deterministic_KeyStore, Xpub):
         pk = bip32_private_key(sequence, k, c)
         return pk, True
 
+    # Only use worker processes for key derivation above this many keys.
+    PARALLEL_DERIVE_MIN_KEYS = 64
+
+    def get_private_keys(self, derivations, password, *, num_workers=0):
+        # Decrypt the master key once, rather than once per key.
+        xprv = self.get_master_private_key(password)
+        _, _, _, _, c, k = deserialize_xprv(xprv)
+        keys = list(derivations.keys())
+        sequences = [derivations[key] for key in keys]
+        if num_workers > 1 and len(keys) >= self.PARALLEL_DERIVE_MIN_KEYS:
+            privkeys = util.process_pool_map(_bip32_private_keys, (k, c), sequences, num_workers)
+        else:
+            privkeys = _bip32_private_keys(k, c, sequences)
+        return {key: (pk, True) for key, pk in zip(keys, privkeys)}
+
     def set_wallet_advice(self, addr, advice): #overrides KeyStore.set_wallet_advice
         self.wallet_advice[addr] = advice
 
 
+def _bip32_private_keys(k, c, sequences):
+    ''' Module-level so that it may be run in a worker process, see
+    BIP32_KeyStore.get_private_keys. '''
+    return [bip32_private_key(sequence, k, c) for sequence in sequences]
+
+
 class Old_KeyStore(Deterministic_KeyStore):
 
     def __init__(self, d):
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+#
+# Electron Cash - A Bitcoin Cash SPV Wallet
+# License: MIT License
+#
+'''
+A lightweight, app-wide registry of performance metrics.
+
+Subsystems create their metrics at import time, eg:
+
+    REQUEST_SECONDS = metrics.histogram('network_request_seconds', 'Server request round trip time')
+    ...
+    REQUEST_SECONDS.observe(time.time() - t0)
+
+All metrics may be read with `registry.snapshot()` (see the `getmetrics`
+command) or `registry.to_prometheus()`, which renders them in the Prometheus
+text exposition format.
+'''
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+PREFIX = 'electroncash_'
+
+# Default histogram buckets, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Counter:
+    ''' A value that only goes up. '''
+    kind = 'counter'
+
+    def __init__(self, name, help):
+        self.name, self.help = name, help
+        self.lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def snapshot(self):
+        return self.value
+
+    def prometheus_lines(self, name):
+        return ['{} {}'.format(name, self.value)]
+
+
+class Gauge(Counter):
+    ''' A value that may go up and down. If `fn` is given, it is called to
+    get the current value whenever the gauge is read. '''
+    kind = 'gauge'
+
+    def __init__(self, name, help, fn=None):
+        super().__init__(name, help)
+        self.fn = fn
+
+    def set(self, value):
+        self.value = value
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def snapshot(self):
+        if self.fn:
+            try:
+                return self.fn()
+            except Exception:
+                return None
+        return self.value
+
+    def prometheus_lines(self, name):
+        value = self.snapshot()
+        return ['{} {}'.format(name, 'NaN' if value is None else value)]
+
+
+class Histogram:
+    ''' Counts observations (usually durations, in seconds) into buckets. '''
+    kind = 'histogram'
+
+    def __init__(self, name, help, buckets=DEFAULT_BUCKETS):
+        self.name, self.help = name, help
+        self.buckets = tuple(sorted(buckets))
+        self.lock = threading.Lock()
+        self.counts = [0] * (len(self.buckets) + 1)  # the last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    @contextmanager
+    def time(self):
+        ''' Observes the time spent in a with block. '''
+        t0 = time.time()
+        try:
+            yield
+        finally:
+            self.observe(time.time() - t0)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'count': self.count,
+                'sum': round(self.sum, 6),
+                'avg': round(self.sum / self.count, 6) if self.count else None,
+                'buckets': {str(b): c for b, c in zip(self.buckets + ('+Inf',), self._cumulative())},
+            }
+
+    def _cumulative(self):
+        ret, total = [], 0
+        for c in self.counts:
+            total += c
+            ret.append(total)
+        return ret
+
+    def prometheus_lines(self, name):
+        with self.lock:
+            lines = ['{}_bucket{{le="{}"}} {}'.format(name, b, c)
+                     for b, c in zip(self.buckets + ('+Inf',), self._cumulative())]
+            lines.append('{}_sum {}'.format(name, self.sum))
+            lines.append('{}_count {}'.format(name, self.count))
+        return lines
+
+
+class Registry:
+    ''' Holds metrics by name. Asking for an existing name returns the
+    existing metric, so modules may share metrics. '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = dict()  # name -> metric
+
+    def _get_or_make(self, cls, name, *args, **kwargs):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, *args, **kwargs)
+            elif type(metric) is not cls:
+                raise ValueError('Metric {} already registered as a {}'.format(name, metric.kind))
+            return metric
+
+    def counter(self, name, help=''):
+        return self._get_or_make(Counter, name, help)
+
+    def gauge(self, name, help='', fn=None):
+        return self._get_or_make(Gauge, name, help, fn=fn)
+
+    def histogram(self, name, help='', buckets=DEFAULT_BUCKETS):
+        return self._get_or_make(Histogram, name, help, buckets=buckets)
+
+    def snapshot(self):
+        ''' Returns a dict of name -> current value (for histograms, a dict
+        with count, sum, avg and cumulative bucket counts). '''
+        with self.lock:
+            metrics = sorted(self.metrics.items())
+        return {name: metric.snapshot() for name, metric in metrics}
+
+    def to_prometheus(self):
+        ''' Returns all metrics in the Prometheus text exposition format. '''
+        with self.lock:
+            metrics = sorted(self.metrics.items())
+        lines = []
+        for name, metric in metrics:
+            name = PREFIX + name
+            if metric.help:
+                lines.append('# HELP {} {}'.format(name, metric.help))
+            lines.append('# TYPE {} {}'.format(name, metric.kind))
+            lines += metric.prometheus_lines(name)
+        return '\n'.join(lines) + '\n'
+
+
+# App-wide instance
+registry = Registry()
+counter = registry.counter
+gauge = registry.gauge
+histogram = registry.histogram
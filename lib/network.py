@@ -42,6 +42,7 @@ from . import networks
 from .i18n import _
 from .interface import Connection, Interface
 from . import blockchain
+from . import tx_store
 from . import version
 
 
@@ -259,10 +260,20 @@ class Network(util.DaemonThread):
             os.mkdir(dir_path)
             os.chmod(dir_path, stat.S_IRUSR | stat.S_IWUSR | stat.S_IXUSR)
 
+        # Optionally persist the app-wide tx store across runs
+        if self.config.get('tx_store_on_disk', False):
+            tx_store.shared_store.set_directory(os.path.join(self.config.path, 'tx_store'))
+        tx_store.shared_store.max_bytes = int(self.config.get('tx_store_mem_mb', 32)) * 1024 * 1024
+
         # subscriptions and requests
         self.subscribed_addresses = set()
         # Requests from client we've not seen a response to
+        # message_id -> [method, params, callback, interface it was sent on]
         self.unanswered_requests = {}
+        # Identical client requests made while one is in flight (eg by
+        # several wallets) are sent once, and the response is fanned out.
+        # (method, params) -> [message_id, [extra callbacks], time sent]
+        self.coalesced_requests = {}
         # retry times
         self.server_retry_time = time.time()
         self.nodes_retry_time = time.time()
@@ -427,7 +438,7 @@ class Network(util.DaemonThread):
             if max_qlen and len(self.unanswered_requests) >= max_qlen:
                 # Indicate to client code we are busy
                 return None
-            self.unanswered_requests[message_id] = [method, params, callback]
+            self.unanswered_requests[message_id] = [method, params, callback, interface]
             if not interface:
                 # Request was queued -- it should get sent if/when we get
                 # an interface in the future
@@ -447,8 +458,7 @@ class Network(util.DaemonThread):
         old_reqs = self.unanswered_requests
         self.unanswered_requests = {}
         for m_id, request in old_reqs.items():
-            message_id = self.queue_request(request[0], request[1], callback = request[2])
-            assert message_id is not None
+            self._resend_request(m_id, request)
         self.queue_request('server.banner', [])
         self.queue_request('server.donation_address', [])
         self.queue_request('server.peers.subscribe', [])
@@ -732,6 +742,25 @@ class Network(util.DaemonThread):
                 if interface.server == self.default_server:
                     self.interface = None
                 interface.close()
+            # Client requests sent to this interface (eg merkle proofs spread
+            # over several servers) would otherwise never be answered.
+            # Send them again on the main interface, or keep them queued
+            # for send_subscriptions() if it just went down too.
+            for m_id, request in list(self.unanswered_requests.items()):
+                if request[3] is interface:
+                    del self.unanswered_requests[m_id]
+                    self._resend_request(m_id, request)
+
+    def _resend_request(self, m_id, request):
+        ''' Queues the client request formerly known as `m_id` again, on the
+        main interface. '''
+        method, params, callback = request[:3]
+        message_id = self.queue_request(method, params, callback=callback)
+        assert message_id is not None
+        coalesced = self.coalesced_requests.get(self._coalesce_key(method, params))
+        if coalesced and coalesced[0] == m_id:
+            coalesced[0] = message_id
+            coalesced[2] = time.time()
 
     def add_recent_server(self, server):
         # list is ordered
@@ -828,7 +857,7 @@ class Network(util.DaemonThread):
                 if client_req:
                     if interface != self.interface:
                         self.print_error("advisory: response from non-primary {}".format(interface))
-                    callbacks = [client_req[2]]
+                    callbacks = [client_req[2]] + self._pop_coalesced(method, params, message_id)
                 else:
                     # fixme: will only work for subscriptions
                     k = self.get_index(method, params)
@@ -903,8 +932,76 @@ class Network(util.DaemonThread):
                 if r is not None:
                     util.print_error("cache hit", k)
                     callback(r)
-                else:
-                    self.queue_request(method, params, callback = callback)
+                elif self._coalesce(method, params, callback) is None:
+                    message_id = self.queue_request(method, params, callback = callback)
+                    if method in self.COALESCED_METHODS:
+                        self._add_coalesced(method, params, message_id, callback)
+
+    # Requests whose responses depend only on their params, and which many
+    # wallets may make at once
+    COALESCED_METHODS = frozenset((
+        'blockchain.scripthash.subscribe',
+        'blockchain.scripthash.get_history',
+        'blockchain.transaction.get',
+        'blockchain.transaction.get_merkle',
+    ))
+    # Seconds after which an in-flight request stops taking on identical
+    # requests, in case its response never comes
+    COALESCE_MAX_AGE = 30
+
+    @staticmethod
+    def _coalesce_key(method, params):
+        return method, tuple(params)
+
+    def _coalesce(self, method, params, callback):
+        ''' If an identical request is in flight, arranges for `callback` to
+        also get its response and returns its message id. Otherwise returns
+        None. '''
+        if method not in self.COALESCED_METHODS:
+            return None
+        coalesced = self.coalesced_requests.get(self._coalesce_key(method, params))
+        if not coalesced:
+            return None
+        message_id, extra_callbacks, sent = coalesced
+        client_req = self.unanswered_requests.get(message_id)
+        if not client_req:
+            return None
+        interface = client_req[3]
+        if (time.time() - sent > self.COALESCE_MAX_AGE
+                or interface is not None and interface not in self.interfaces.values()):
+            # Stale; the caller sends a fresh request (see _add_coalesced)
+            return None
+        if callback != client_req[2] and callback not in extra_callbacks:
+            extra_callbacks.append(callback)
+        return message_id
+
+    def _add_coalesced(self, method, params, message_id, callback):
+        ''' Records the just sent request message_id so that identical
+        requests get its response. Callbacks still waiting on a stale request
+        for the same thing are moved over to it. '''
+        key = self._coalesce_key(method, params)
+        stale = self.coalesced_requests.get(key)
+        extra_callbacks = [cb for cb in stale[1] if cb != callback] if stale else []
+        self.coalesced_requests[key] = [message_id, extra_callbacks, time.time()]
+
+    def _pop_coalesced(self, method, params, message_id):
+        ''' Returns the extra callbacks for the response to message_id. '''
+        key = self._coalesce_key(method, params)
+        coalesced = self.coalesced_requests.get(key)
+        if coalesced and coalesced[0] == message_id:
+            del self.coalesced_requests[key]
+            return coalesced[1]
+        return []
+
+    def _discard_coalesced_callback(self, callback):
+        ''' Removes callback from the extra callbacks of coalesced requests.
+        Returns the number removed. '''
+        ct = 0
+        for message_id, extra_callbacks, sent in self.coalesced_requests.values():
+            if callback in extra_callbacks:
+                extra_callbacks.remove(callback)
+                ct += 1
+        return ct
 
     def _cancel_pending_sends(self, callback):
         ct = 0
@@ -946,10 +1043,18 @@ class Network(util.DaemonThread):
         # If the interface ends up answering these requests, they will just
         # be safely ignored. This is better than the alternative which is to
         # keep references to an object that declared itself defunct.
-        ct = 0
+        ct = self._discard_coalesced_callback(callback)
         for message_id, client_req in self.unanswered_requests.copy().items():
             if callback == client_req[2]:
-                self.unanswered_requests.pop(message_id, None) # guard against race conditions here. Note: this usually is called from the network thread but who knows what future programmers may do. :)
+                key = self._coalesce_key(client_req[0], client_req[1])
+                coalesced = self.coalesced_requests.get(key)
+                if coalesced and coalesced[0] == message_id and coalesced[1]:
+                    # others are waiting on this response, hand it over to them
+                    client_req[2] = coalesced[1].pop(0)
+                else:
+                    if coalesced and coalesced[0] == message_id:
+                        del self.coalesced_requests[key]
+                    self.unanswered_requests.pop(message_id, None) # guard against race conditions here. Note: this usually is called from the network thread but who knows what future programmers may do. :)
                 ct += 1
         ct2 = self._cancel_pending_sends(callback)
         if ct or ct2:
@@ -975,7 +1080,11 @@ class Network(util.DaemonThread):
     def new_interface(self, server_key, socket):
         self.add_recent_server(server_key)
 
-        interface = Interface(server_key, socket, max_message_bytes=self.MAX_MESSAGE_BYTES)
+        config = self.config
+        interface = Interface(server_key, socket, max_message_bytes=self.MAX_MESSAGE_BYTES,
+                              max_unanswered=int(config.get('interface_max_unanswered', Interface.DEFAULT_MAX_UNANSWERED)),
+                              batch_size=int(config.get('interface_batch_size', 0)),
+                              batch_window=int(config.get('interface_batch_window', 0)))
         interface.blockchain = None
         interface.tip_header = None
         interface.tip = 0
@@ -1847,15 +1956,22 @@ class Network(util.DaemonThread):
         return _("An error occurred broadcasting the transaction")
 
     # Used by the verifier job.
-    def get_merkle_for_transaction(self, tx_hash, tx_height, callback, max_qlen=10):
+    def get_merkle_for_transaction(self, tx_hash, tx_height, callback, max_qlen=10, interface=None):
         ''' Asynchronously enqueue a request for a merkle proof for a tx.
             Note that the callback param is required.
             May return None if too many requests were enqueued (max_qlen) or
             if there is no interface.
+            `interface` may be 'random' to send the request to any connected
+            server (proofs are checked against our own headers anyway).
             Client code should handle the None return case appropriately. '''
-        return self.queue_request('blockchain.transaction.get_merkle',
-                                  [tx_hash, tx_height],
-                                  callback=callback, max_qlen=max_qlen)
+        method, params = 'blockchain.transaction.get_merkle', [tx_hash, tx_height]
+        message_id = self._coalesce(method, params, callback)
+        if message_id is None:
+            message_id = self.queue_request(method, params, interface,
+                                            callback=callback, max_qlen=max_qlen)
+            if message_id is not None:
+                self._add_coalesced(method, params, message_id, callback)
+        return message_id
 
     def get_proxies(self):
         ''' Returns a proxies dictionary suitable to be passed to the requests
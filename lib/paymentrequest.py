@@ -24,6 +24,7 @@
 # CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 import hashlib
+import os
 import sys
 import time
 import traceback
@@ -49,6 +50,7 @@ from . import rsakey
 
 from .address import Address, PublicKey
 from .bitcoin import TYPE_ADDRESS
+from .caches import ExpiringCache
 from .util import print_error, bh2u, bfh, PrintError
 from .util import FileImportFailed, FileImportFailedEncrypted
 from .transaction import Transaction
@@ -60,21 +62,31 @@ ACK_HEADERS = {'Content-Type':'application/bitcoincash-payment','Accept':'applic
 ACK_HEADERS_SLP = {'Content-Type':'application/simpleledger-payment','Accept':'application/simpleledger-paymentack','User-Agent':'Electron-Cash'}
 
 ca_path = requests.certs.where()
-ca_list = None
-ca_keyID = None
+ca_list = None  # an x509.CAIndex
+ca_index_path = None  # where the CA index is saved, see set_cache_dir
+_ca_list_lock = threading.Lock()
+
+# Merchants send the same certificate chain with every request, so parsed
+# certificates and chains whose signatures checked out are kept for a while.
+_parsed_certs = ExpiringCache(maxlen=1000, name="BIP70 certificate cache", timeout=3600)
+_verified_chains = ExpiringCache(maxlen=1000, name="BIP70 verified chain cache", timeout=3600)
+
+def set_cache_dir(cache_dir):
+    ''' Save the index of trusted CAs in cache_dir, so that later runs needn't
+    parse the whole CA bundle. '''
+    global ca_index_path
+    ca_index_path = os.path.join(cache_dir, 'ca_index.json') if cache_dir else None
 
 def load_ca_list():
-    global ca_list, ca_keyID
-    if ca_list is None:
-        ca_list, ca_keyID = x509.load_certificates(ca_path)
+    global ca_list
+    with _ca_list_lock:
+        if ca_list is None:
+            ca_list = x509.CAIndex(ca_path, ca_index_path)
 
 
 
 # status of payment requests
-PR_UNPAID  = 0
-PR_EXPIRED = 1
-PR_UNKNOWN = 2     # sent but not propagated
-PR_PAID    = 3     # send and propagated
+from .util import PR_UNPAID, PR_EXPIRED, PR_UNKNOWN, PR_PAID
 
 
 
@@ -398,7 +410,11 @@ def verify_cert_chain(chain):
     cert_num = len(chain)
     x509_chain = []
     for i in range(cert_num):
-        x = x509.X509(bytearray(chain[i]))
+        der = bytes(chain[i])
+        x = _parsed_certs.get(der)
+        if x is None:
+            x = x509.X509(bytearray(der))
+            _parsed_certs.put(der, x)
         x509_chain.append(x)
         if i == 0:
             x.check_date()
@@ -411,13 +427,18 @@ def verify_cert_chain(chain):
     ca = x509_chain[cert_num-1]
     if ca.getFingerprint() not in ca_list:
         keyID = ca.get_issuer_keyID()
-        f = ca_keyID.get(keyID)
+        f = ca_list.get_by_keyID(keyID)
         if f:
             root = ca_list[f]
             x509_chain.append(root)
         else:
             raise BaseException("Supplied CA Not Found in Trusted CA Store.")
-    # verify the chain of signatures
+    # verify the chain of signatures, unless this chain was recently verified
+    # (keyed on SHA-256 of each whole certificate, since SHA-1 fingerprints
+    # can be made to collide)
+    chain_key = tuple(hashlib.sha256(x.bytes).digest() for x in x509_chain)
+    if _verified_chains.get(chain_key):
+        return x509_chain[0], ca
     cert_num = len(x509_chain)
     for i in range(1, cert_num):
         x = x509_chain[i]
@@ -442,6 +463,7 @@ def verify_cert_chain(chain):
         if not verify:
             raise BaseException("Certificate not Signed by Provided CA Certificate Chain")
 
+    _verified_chains.put(chain_key, True)
     return x509_chain[0], ca
 
 
@@ -66,13 +66,7 @@ prngName = "os.urandom"
 # **************************************************************************
 
 def bytesToNumber(b):
-    total = 0
-    multiplier = 1
-    for count in range(len(b)-1, -1, -1):
-        byte = b[count]
-        total += multiplier * byte
-        multiplier *= 256
-    return total
+    return int.from_bytes(b, 'big')
 
 def numberToByteArray(n, howManyBytes=None):
     """Convert an integer into a bytearray, zero-pad to howManyBytes.
@@ -83,11 +77,9 @@ def numberToByteArray(n, howManyBytes=None):
     """    
     if howManyBytes == None:
         howManyBytes = numBytes(n)
-    b = bytearray(howManyBytes)
-    for count in range(howManyBytes-1, -1, -1):
-        b[count] = int(n % 256)
-        n >>= 8
-    return b
+    # Excess high-order bytes are dropped, as documented above
+    n &= (1 << (8 * howManyBytes)) - 1
+    return bytearray(n.to_bytes(howManyBytes, 'big'))
 
 def mpiToNumber(mpi): #mpi is an openssl-format bignum string
     if (ord(mpi[4]) & 0x80) !=0: #Make sure this is a positive number
@@ -116,22 +108,10 @@ def numberToMPI(n):
 # **************************************************************************
 
 def numBits(n):
-    if n==0:
-        return 0
-    s = "%x" % n
-    return ((len(s)-1)*4) + \
-    {'0':0, '1':1, '2':2, '3':2,
-     '4':3, '5':3, '6':3, '7':3,
-     '8':4, '9':4, 'a':4, 'b':4,
-     'c':4, 'd':4, 'e':4, 'f':4,
-     }[s[0]]
-    return int(math.floor(math.log(n, 2))+1)
+    return n.bit_length()
 
 def numBytes(n):
-    if n==0:
-        return 0
-    bits = numBits(n)
-    return int(math.ceil(bits / 8.0))
+    return (n.bit_length() + 7) // 8
 
 # **************************************************************************
 # Big Number Math
@@ -331,13 +311,13 @@ class RSAKey(object):
         @return: Whether the signature matches the passed-in data.
         """
         hashBytes = SHA1(bytearray(bytes))
-        
-        # Try it with/without the embedded NULL
-        prefixedHashBytes1 = self._addPKCS1SHA1Prefix(hashBytes, False)
-        prefixedHashBytes2 = self._addPKCS1SHA1Prefix(hashBytes, True)
-        result1 = self.verify(sigBytes, prefixedHashBytes1)
-        result2 = self.verify(sigBytes, prefixedHashBytes2)
-        return (result1 or result2)
+
+        # Try it with/without the embedded NULL, with a single RSA operation
+        checkBytes = self._recoverPaddedBytes(sigBytes)
+        if checkBytes is None:
+            return False
+        return any(checkBytes == self._addPKCS1Padding(self._addPKCS1SHA1Prefix(hashBytes, withNULL), 1)
+                   for withNULL in (False, True))
 
     def sign(self, bytes):
         """Sign the passed-in bytes.
@@ -375,15 +355,19 @@ class RSAKey(object):
         @rtype: bool
         @return: Whether the signature matches the passed-in data.
         """
+        checkBytes = self._recoverPaddedBytes(sigBytes)
+        return checkBytes is not None and checkBytes == self._addPKCS1Padding(bytes, 1)
+
+    def _recoverPaddedBytes(self, sigBytes):
+        """Returns the padded message the signature was made over, or None
+        if it is malformed."""
         if len(sigBytes) != numBytes(self.n):
-            return False
-        paddedBytes = self._addPKCS1Padding(bytes, 1)
+            return None
         c = bytesToNumber(sigBytes)
         if c >= self.n:
-            return False
+            return None
         m = self._rawPublicKeyOp(c)
-        checkBytes = numberToByteArray(m, numBytes(self.n))
-        return checkBytes == paddedBytes
+        return numberToByteArray(m, numBytes(self.n))
 
     def encrypt(self, bytes):
         """Encrypt the passed-in bytes.
@@ -466,7 +450,7 @@ class RSAKey(object):
     def _addPKCS1Padding(self, bytes, blockType):
         padLength = (numBytes(self.n) - (len(bytes)+3))
         if blockType == 1: #Signature padding
-            pad = [0xFF] * padLength
+            return bytearray(b'\x00\x01' + b'\xff' * padLength + b'\x00') + bytes
         elif blockType == 2: #Encryption padding
             pad = bytearray(0)
             while len(pad) < padLength:
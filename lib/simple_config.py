@@ -238,6 +238,11 @@ class SimpleConfig(PrintError):
     def get_session_timeout(self):
         return self.get('session_timeout', 300)
 
+    def get_sign_workers(self):
+        ''' Number of processes to sign large transactions with; 0 or 1 signs
+        in the calling thread. '''
+        return int(self.get('sign_workers', 0))
+
     def open_last_wallet(self):
         if self.get('wallet_path') is None:
             last_wallet = self.get('gui_last_wallet_slp')
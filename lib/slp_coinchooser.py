@@ -3,6 +3,14 @@ from . import slp
 
 class SlpCoinChooser:
 
+    # Selection strategies, picked with the 'slp_coin_selection' config key.
+    #  'min_inputs'    - largest coins first, to use as few inputs as possible
+    #  'min_fragments' - smallest coins first, to consolidate token dust
+    # Either way, a single coin that exactly matches the amount is preferred
+    # since it needs no token change output.
+    STRATEGIES = ('min_inputs', 'min_fragments')
+    DEFAULT_STRATEGY = 'min_inputs'
+
     @staticmethod
     def select_coins(wallet, token_id, amount, config, isInvoice=False, *, domain=None):
         token_outputs_amts = []
@@ -13,24 +21,18 @@ class SlpCoinChooser:
             amt = amount or 0
             token_outputs_amts.append(amt)
 
-        valid_bal, _, _, unfrozen_bal, _ = wallet.get_slp_token_balance(token_id, config)
+        # Balance check and candidate coins in one pass over the token's outputs
+        balance, slp_coins = wallet.get_slp_token_coins_sorted(token_id, config, domain=domain)
+        valid_bal, _, _, unfrozen_bal, _ = balance
 
         if amt > valid_bal:
             raise NotEnoughFundsSlp("Not enough token funds.")
         if valid_bal >= amt > unfrozen_bal:
             raise NotEnoughUnfrozenFundsSlp("Not enough unfrozen token funds.")
 
-        slp_coins = wallet.get_slp_spendable_coins(token_id, domain, config, isInvoice)
-        slp_coins = sorted(slp_coins, key=lambda k: -k['token_value'])
-
-        selected_slp_coins = []
-        total_amt_added = 0
-        for coin in slp_coins:
-            if total_amt_added < amt:
-                selected_slp_coins.append(coin)
-                total_amt_added += coin['token_value']
-            else:
-                break
+        strategy = config.get('slp_coin_selection', SlpCoinChooser.DEFAULT_STRATEGY)
+        selected_slp_coins = SlpCoinChooser.pick(slp_coins, amt, strategy)
+        total_amt_added = sum(coin['token_value'] for coin in selected_slp_coins)
 
         slp_op_return_msg = None
         if total_amt_added > 0:
@@ -44,3 +46,29 @@ class SlpCoinChooser:
             assert slp_op_return_msg
 
         return (selected_slp_coins, slp_op_return_msg)
+
+    @staticmethod
+    def pick(slp_coins, amt, strategy=DEFAULT_STRATEGY):
+        ''' Given `slp_coins` sorted by token_value (largest first), returns
+        the coins to spend to cover `amt` tokens. '''
+        if amt <= 0 or not slp_coins:
+            return []
+        # Look for an exact match, stopping once coins get smaller than amt
+        for coin in slp_coins:
+            if coin['token_value'] <= amt:
+                if coin['token_value'] == amt:
+                    return [coin]
+                break
+        if strategy == 'min_fragments':
+            ordered = reversed(slp_coins)
+        else:
+            ordered = slp_coins
+        selected_slp_coins = []
+        total_amt_added = 0
+        for coin in ordered:
+            if total_amt_added < amt:
+                selected_slp_coins.append(coin)
+                total_amt_added += coin['token_value']
+            else:
+                break
+        return selected_slp_coins
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+#
+# Electron Cash - A Bitcoin Cash SPV Wallet
+# License: MIT License
+#
+'''
+A columnar view of a wallet's SLP token outputs, for working out the
+balances and histories of all of the wallet's tokens at once.
+
+The group-by sums are vectorized with NumPy if it is installed. NumPy is
+optional: without it, the same sums are done in pure Python over the same
+columns.
+'''
+from collections import defaultdict
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Values of the validity column for a tx with no tx_tokinfo, and for one
+# whose tx_tokinfo validity is None.
+NO_TOKINFO = -2
+VALIDITY_NONE = -1
+
+# The group-by sums are done in int64 with NumPy. Token quantities are
+# uint64, so we only use NumPy if all the quantities added up fit.
+_INT64_MAX = (1 << 63) - 1
+
+
+class TokenColumns:
+    ''' The wallet's token outputs, one row per output, as columns:
+
+    - token:    index into self.token_ids
+    - tx:       index into self.tx_hashes of the tx creating the output
+    - qty:      token quantity (0 for a minting baton)
+    - validity: validity of the tx (see tx_tokinfo, NO_TOKINFO and VALIDITY_NONE)
+    - spender:  index into self.tx_hashes of the wallet tx spending the
+                output, or -1
+    - credited: the creating tx is in the address' history and not pruned
+    - debited:  the spending tx is not pruned
+    - unspent:  the output is a wallet UTXO
+    - height:   height of the creating tx in the address' history
+    - frozen:   the coin or its address is frozen
+    - baton:    the output is a minting baton
+
+    Build it with the wallet's lock held (see Abstract_Wallet.get_slp_token_columns). '''
+
+    def __init__(self, wallet, use_numpy=True):
+        self.token_ids, self.tx_hashes = [], []
+        token_index, tx_index = {}, {}
+        def token_of(token_id):
+            i = token_index.get(token_id)
+            if i is None:
+                i = token_index[token_id] = len(self.token_ids)
+                self.token_ids.append(token_id)
+            return i
+        def tx_of(tx_hash):
+            i = tx_index.get(tx_hash)
+            if i is None:
+                i = tx_index[tx_hash] = len(self.tx_hashes)
+                self.tx_hashes.append(tx_hash)
+            return i
+        cols = self.token, self.tx, self.qty, self.validity, self.spender, self.credited, \
+            self.debited, self.unspent, self.height, self.frozen, self.baton = [[] for _ in range(11)]
+        pruned = set(wallet.pruned_txo.values())
+        total = 0
+        for addr, addrdict in wallet._slp_txo.items():
+            hist = dict(wallet.get_address_history(addr))
+            spent_by = {}
+            for tx_hash in hist:
+                for ser, v in wallet.txi.get(tx_hash, {}).get(addr, ()):
+                    spent_by[ser] = tx_hash
+            addr_frozen = addr in wallet.frozen_addresses
+            for txid, txdict in addrdict.items():
+                if not txdict:
+                    continue
+                tti = wallet.tx_tokinfo.get(txid)
+                validity = tti.get('validity') if tti else NO_TOKINFO
+                if validity is None:
+                    validity = VALIDITY_NONE
+                height = hist.get(txid)
+                received = {n for n, v, is_cb in wallet.txo.get(txid, {}).get(addr, ())} if height is not None else ()
+                for n, d in txdict.items():
+                    qty = d['qty']
+                    baton = not isinstance(qty, int)
+                    if baton:
+                        qty = 0
+                    total += qty
+                    ser = txid + ':%d'%n
+                    spender = spent_by.get(ser)
+                    self.token.append(token_of(d['token_id']))
+                    self.tx.append(tx_of(txid))
+                    self.qty.append(qty)
+                    self.validity.append(validity)
+                    self.spender.append(-1 if spender is None else tx_of(spender))
+                    self.credited.append(height is not None and txid not in pruned)
+                    self.debited.append(spender is not None and spender not in pruned)
+                    self.unspent.append(n in received and spender is None)
+                    self.height.append(height or 0)
+                    self.frozen.append(addr_frozen or ser in wallet.frozen_coins)
+                    self.baton.append(baton)
+        self.numpy = bool(use_numpy and np is not None and total <= _INT64_MAX)
+        if self.numpy:
+            (self.token, self.tx, self.qty, self.validity, self.spender,
+             self.credited, self.debited, self.unspent, self.height,
+             self.frozen, self.baton) = (np.array(c, dtype=t) for c, t in zip(cols, (
+                np.int64, np.int64, np.int64, np.int8, np.int64,
+                bool, bool, bool, np.int64, bool, bool)))
+
+    def __len__(self):
+        return len(self.token)
+
+    def balances(self, confirmed_only=False):
+        ''' Returns a dict of token_id -> (valid, unvalidated, invalid,
+        unfrozen valid, frozen valid) balances, as from
+        Abstract_Wallet.get_slp_token_balance, for the tokens that have
+        spendable outputs in the wallet. '''
+        if self.numpy:
+            ntokens = len(self.token_ids)
+            mask = self.unspent & ~self.baton & (self.validity == 1)
+            if confirmed_only:
+                mask &= self.height > 0
+            present = np.bincount(self.token[mask], minlength=ntokens)
+            valid = np.zeros(ntokens, dtype=np.int64)
+            np.add.at(valid, self.token[mask], self.qty[mask])
+            mask &= ~self.frozen
+            unfrozen = np.zeros(ntokens, dtype=np.int64)
+            np.add.at(unfrozen, self.token[mask], self.qty[mask])
+            return {self.token_ids[i]: (int(valid[i]), 0, 0, int(unfrozen[i]), int(valid[i] - unfrozen[i]))
+                    for i in np.flatnonzero(present).tolist()}
+        valid, unfrozen = defaultdict(int), defaultdict(int)
+        for i in range(len(self.token)):
+            if (not self.unspent[i] or self.baton[i] or self.validity[i] != 1
+                    or (confirmed_only and self.height[i] <= 0)):
+                continue
+            token = self.token[i]
+            valid[token] += self.qty[i]
+            if not self.frozen[i]:
+                unfrozen[token] += self.qty[i]
+        return {self.token_ids[token]: (v, 0, 0, unfrozen[token], v - unfrozen[token])
+                for token, v in valid.items()}
+
+    def deltas(self, validities_considered=(0, 1)):
+        ''' Returns a dict of token_id -> {tx_hash: delta}, the net effect of
+        each wallet tx on the wallet's balance of each token, as computed by
+        Abstract_Wallet.get_slp_histories, counting only outputs of tx's
+        whose validity is in `validities_considered`. '''
+        considered = [VALIDITY_NONE if v is None else v for v in validities_considered]
+        ret = defaultdict(dict)
+        if self.numpy:
+            ok = np.isin(self.validity, considered) & ~self.baton
+            credit = ok & self.credited
+            debit = ok & self.debited
+            ntx = max(len(self.tx_hashes), 1)
+            keys = np.concatenate((self.token[credit] * ntx + self.tx[credit],
+                                   self.token[debit] * ntx + self.spender[debit]))
+            values = np.concatenate((self.qty[credit], -self.qty[debit]))
+            uniq, inverse = np.unique(keys, return_inverse=True)
+            sums = np.zeros(len(uniq), dtype=np.int64)
+            np.add.at(sums, inverse, values)
+            for key, delta in zip(uniq.tolist(), sums.tolist()):
+                token, tx = divmod(key, ntx)
+                ret[self.token_ids[token]][self.tx_hashes[tx]] = delta
+            return ret
+        for i in range(len(self.token)):
+            if (self.baton[i] or self.validity[i] not in considered
+                    or not (self.credited[i] or self.debited[i])):
+                continue
+            d = ret[self.token_ids[self.token[i]]]
+            if self.credited[i]:
+                tx_hash = self.tx_hashes[self.tx[i]]
+                d[tx_hash] = d.get(tx_hash, 0) + self.qty[i]
+            if self.debited[i]:
+                tx_hash = self.tx_hashes[self.spender[i]]
+                d[tx_hash] = d.get(tx_hash, 0) - self.qty[i]
+        return ret
@@ -21,6 +21,7 @@ slp_validator_0x01).
 
 import sys
 import threading
+import time
 import queue
 import traceback
 import weakref
@@ -28,9 +29,15 @@ import collections
 from abc import ABC, abstractmethod
 from .transaction import Transaction
 from .util import PrintError
+from . import metrics
 
 INF_DEPTH=2147483646  # 'infinity' value for node depths. 2**31 - 2
 
+JOB_DOWNLOADS = metrics.counter('slp_validation_downloads_total', 'Transactions downloaded by SLP validation jobs')
+JOB_SECONDS = metrics.histogram('slp_validation_job_seconds', 'Duration of SLP validation job runs')
+JOB_DEPTH = metrics.histogram('slp_validation_job_depth', 'Graph depth reached by SLP validation job runs',
+                              buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000))
+
 
 class hardref:
     # a proper reference that mimics weakref interface
@@ -244,6 +251,7 @@ class ValidationJob:
             self.running = True
             self.stop_reason = None
             self.has_never_run = False
+        t0 = time.time()
         try:
             retval = self.mainloop()
             try:
@@ -269,6 +277,8 @@ class ValidationJob:
             retval = 'crashed'
             raise
         finally:
+            JOB_SECONDS.observe(time.time() - t0)
+            JOB_DEPTH.observe(self.currentdepth)
             self.exited.set()
             with self._statelock:
                 self.stop_reason = retval
@@ -504,11 +514,23 @@ class ValidationJob:
         if self.graph_search_job and self.graph_search_job.search_success:
             for tx in cached:
                 dl_callback(tx)
-            for txid in txid_set:
+            # txids in the search results may have been evicted from its
+            # cache; those still need to be fetched below.
+            for txid in [t for t in txid_set if not self.graph_search_job.has_tx(t)]:
                 skip_callback(txid)
-            txid_set.clear()
-            return txid_set
+                txid_set.remove(txid)
+            if not txid_set:
+                return txid_set
+            cached = []
         
+        # next try the app-wide tx store, which may have them from other
+        # jobs or wallets
+        for txid in list(txid_set):
+            tx = Transaction.tx_cache_get(txid)
+            if tx:
+                cached.append(tx)
+                txid_set.remove(txid)
+
         # build requests list from remaining txids.
         requests = []
         if self.network:
@@ -539,6 +561,7 @@ class ValidationJob:
                 continue
             raw = resp.get('result')
             self.downloads += 1
+            JOB_DOWNLOADS.inc()
             tx = Transaction(raw)
             txid = tx.txid_fast()
             try:
@@ -551,6 +574,7 @@ class ValidationJob:
                 else:
                     raise ValueError(errors)
             else:
+                Transaction.tx_cache_put(tx, txid)
                 dl_callback(tx)
 
         return txid_set
@@ -578,9 +602,10 @@ class ValidationJobManager(PrintError):
 
         self._killing = False  # set by .kill()
 
-        # Kick off the thread
+        # The thread is started by the first job added (see add_job), so that
+        # job managers that never get used cost no thread.
         self.thread = threading.Thread(target=self.mainloop, name=threadname, daemon=True)
-        self.thread.start()
+        self._thread_started = False
 
     @property
     def threadname(self):
@@ -595,6 +620,9 @@ class ValidationJobManager(PrintError):
                 raise ValueError
             self.all_jobs.add(job)
             self.jobs_pending.append(job)
+            if not self._thread_started and not self._killing:
+                self._thread_started = True
+                self.thread.start()
         self.wakeup.set()
 
     def _stop_all_common(self, job):
@@ -677,6 +705,9 @@ class ValidationJobManager(PrintError):
         except:
             pass
         self.graph_context = None
+        with self.jobs_lock:
+            if not self._thread_started:
+                self.exited.set()  # there's no thread to wait for
 
     def mainloop(self,):
         ran_ctr = 0
@@ -57,7 +57,9 @@ class GraphSearchJob:
         self.host = self.valjob.network.slp_gs_host
 
         # gs job results cache - clears data after 30 minutes
-        self._txdata = ExpiringCache(maxlen=10000000, name="GraphSearchTxnFetchCache", timeout=1800)
+        self._txdata = ExpiringCache(maxlen=10000000, name="GraphSearchTxnFetchCache", timeout=1800,
+                                     max_bytes=128*1024*1024, sizeof=lambda tx: len(tx.raw))
+        self._txids = set()  # every txid in the search results, even if evicted from _txdata
 
     def sched_cancel(self, callback=None, reason='job canceled'):
         self.exit_msg = reason
@@ -101,6 +103,13 @@ class GraphSearchJob:
         ''' Puts a non-deserialized copy of tx into the tx_cache. '''
         txid = txid or Transaction._txid(tx.raw)  # optionally, caller can pass-in txid to save CPU time for hashing
         self._txdata.put(txid, tx)
+        self._txids.add(txid)
+        Transaction.tx_cache_put(tx, txid)  # share it with the rest of the app
+
+    def has_tx(self, txid: str) -> bool:
+        ''' True if txid was in the search results (even if get_tx can no
+        longer return it because it was evicted from the cache). '''
+        return txid in self._txids
 
 class SlpGraphSearchManager:
     """
@@ -115,8 +124,8 @@ class SlpGraphSearchManager:
         self.search_queue = queue.Queue()  # TODO: make this a PriorityQueue based on dag size
 
         self.threadname = threadname
+        # started by the first search, so creating a manager costs no thread
         self.search_thread = threading.Thread(target=self.mainloop, name=self.threadname+'/search', daemon=True)
-        self.search_thread.start()
         
         self.data_totalizer = 0
         self.emit_ui_update = None # valjob_ref.network.slp_validation_fetch_signal.emit
@@ -138,6 +147,8 @@ class SlpGraphSearchManager:
                 job = GraphSearchJob(txid, valjob_ref)
                 self.search_jobs[txid] = job
                 self.search_queue.put(job)
+                if self.search_thread.ident is None:  # not started yet
+                    self.search_thread.start()
             else:
                 job = self.search_jobs[txid]
             return job
@@ -36,9 +36,10 @@ class ProxyQuerier:
 
         self.pastresults = dict()
 
-        # Kick off the thread
+        # The thread is started by the first job, so merely importing this
+        # module doesn't start a thread.
         self.thread = threading.Thread(target=self.mainloop, name=threadname, daemon=True)
-        self.thread.start()
+        self.thread_lock = threading.Lock()
 
     def mainloop(self,):
         try:
@@ -82,6 +83,9 @@ class ProxyQuerier:
         where txids is set and results is txid-keyed dict. """
         txids = frozenset(txids)
         self.queue.put((txids, callback))
+        with self.thread_lock:
+            if self.thread.ident is None:  # not started yet
+                self.thread.start()
         return txids
 
     def query(self,txids):
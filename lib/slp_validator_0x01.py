@@ -6,6 +6,7 @@ This uses the graph searching mechanism from slp_dagging.py
 
 import threading
 import queue
+from collections import OrderedDict
 from typing import Tuple, List
 import weakref
 
@@ -17,8 +18,8 @@ from .slp_dagging import TokenGraph, ValidationJob, ValidationJobManager, Valida
 from .bitcoin import TYPE_SCRIPT
 from .util import print_error, PrintError
 
-from . import slp_proxying # loading this module starts a thread.
-from .slp_graph_search import SlpGraphSearchManager # thread is started upon instantiation
+from . import slp_proxying # the proxy thread is started by its first job
+from .slp_graph_search import SlpGraphSearchManager # thread is started by the first search
 
 class GraphContext(PrintError):
     ''' Instance of the DAG cache. Uses a single per-instance
@@ -303,6 +304,68 @@ class GraphContext(PrintError):
 # token is opened, however, the validation continues where it left off.
 shared_context = GraphContext(is_parallel=False)  # <-- Set is_parallel=True if you want 1 thread per token (tokens validate in parallel). Otherwise there is 1 validator thread app-wide and tokens validate in series.
 
+
+class ValidationRequests(PrintError):
+    ''' Keeps track of validation jobs started on behalf of callers that want
+    to come back later for the result (e.g. the `slpvalidate` RPC command when
+    run by a validation proxy daemon). Jobs are keyed by the txid being
+    validated, so concurrent requests for the same txid share one job.
+
+    At most `max_pending` jobs may be outstanding at once so that a flood of
+    requests can't queue up unbounded work on the shared job managers. The
+    results of up to `max_finished` concluded jobs are remembered for polling,
+    oldest forgotten first. '''
+
+    def __init__(self, max_pending=250, max_finished=5000):
+        self.lock = threading.Lock()
+        self.max_pending = max_pending
+        self.max_finished = max_finished
+        self.pending = dict()  # txid -> ValidationJob
+        self.finished = OrderedDict()  # txid -> validity name (str)
+
+    def diagnostic_name(self):
+        return "ValidationRequests"
+
+    def get_job(self, txid):
+        with self.lock:
+            return self.pending.get(txid)
+
+    def can_add(self):
+        with self.lock:
+            return len(self.pending) < self.max_pending
+
+    def add(self, txid, job):
+        ''' Start tracking `job` (which validates `txid`). Should be called
+        right after the job was created by GraphContext.make_job. '''
+        with self.lock:
+            self.pending[txid] = job
+            self.finished.pop(txid, None)
+        job.add_callback(lambda j: self._on_done(txid, j))
+
+    def _on_done(self, txid, job):
+        validity = job.nodes[txid].validity
+        with self.lock:
+            if self.pending.get(txid) is job:
+                del self.pending[txid]
+            if validity:
+                self.finished[txid] = job.graph.validator.validity_states[validity]
+                while len(self.finished) > self.max_finished:
+                    self.finished.popitem(last=False)
+
+    def get_result(self, txid):
+        ''' Returns the validity name of a concluded job, or None if there is
+        no result for `txid` (yet). '''
+        with self.lock:
+            return self.finished.get(txid)
+
+    def clear(self):
+        with self.lock:
+            self.pending.clear()
+            self.finished.clear()
+
+# App-wide instance used by the RPC commands.
+shared_requests = ValidationRequests()
+
 class Validator_SLP1(ValidatorGeneric):
     prevalidation = True # indicate we want to check validation when some inputs still active.
 
@@ -18,7 +18,7 @@ from .bitcoin import TYPE_SCRIPT
 from .util import print_error
 from .slp_validator_0x01 import Validator_SLP1, GraphContext
 
-from . import slp_proxying # loading this module starts a thread.
+from . import slp_proxying # the proxy thread is started by its first job
 from . import slp_graph_search # thread doesn't start until instantiation, one thread per search job, w/ shared txn cache
 
 class GraphContext_NFT1(GraphContext):
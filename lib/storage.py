@@ -29,6 +29,7 @@ import json
 import copy
 import re
 import stat
+import time
 import hmac, hashlib
 import base64
 import zlib
@@ -38,6 +39,7 @@ from .util import PrintError, profiler, standardize_path
 from .plugins import run_hook, plugin_loaders
 from .keystore import bip44_derivation
 from . import bitcoin
+from . import metrics
 
 
 # seed_version is now used for the version of the wallet file
@@ -49,6 +51,8 @@ FINAL_SEED_VERSION = 17     # electrum >= 2.7 will set this to prevent
 
 TMP_SUFFIX = ".tmp.{}".format(os.getpid())
 
+WRITE_SECONDS = metrics.histogram('storage_write_seconds', 'Time taken to write wallet files')
+
 
 def multisig_type(wallet_type):
     '''If wallet_type is mofn multi-sig, return [m, n],
@@ -65,30 +69,57 @@ def multisig_type(wallet_type):
 
 class WalletStorage(PrintError):
 
+    # Seconds write_soon() waits before writing, so that the saves requested
+    # meanwhile go to disk in a single write.
+    WRITE_DELAY = 2.0
+
     def __init__(self, path, manual_upgrades=False, *, in_memory_only=False):
         self.path = path = standardize_path(path)
         self.print_error("wallet path", path)
         self.manual_upgrades = manual_upgrades
         self.lock = threading.RLock()
+        # The JSON text of each key of self.data in the wallet file, and the
+        # keys put since it was last made. write() re-serializes just those.
+        self._json = {}
+        self._dirty = set()
         self.data = {}
+        self._write_lock = threading.Lock()  # taken (before self.lock) by write()
+        self._write_timer = None
         self._file_exists = in_memory_only or (self.path and os.path.exists(self.path))
         self.modified = False
         self.pubkey = None
         self.raw = None
         self._in_memory_only=in_memory_only
+        self.load_time = 0.0  # seconds spent reading and parsing the file
         if self.file_exists() and not self._in_memory_only:
+            t0 = time.time()
             try:
                 with open(self.path, "r", encoding='utf-8') as f:
                     self.raw = f.read()
             except UnicodeDecodeError as e:
                 raise IOError("Error reading file: "+ str(e))
+            self.load_time += time.time() - t0
             if not self.is_encrypted():
                 self.load_data(self.raw)
         else:
             # avoid new wallets getting 'upgraded'
             self.put('seed_version', FINAL_SEED_VERSION)
 
+    @property
+    def data(self):
+        return self._data
+
+    @data.setter
+    def data(self, data):
+        ''' Replacing the whole dict (as load_data and split_accounts do)
+        makes the next write() serialize all of it. '''
+        with self.lock:
+            self._data = data
+            self._json = {}
+            self._dirty = set(data)
+
     def load_data(self, s):
+        t0 = time.time()
         try:
             self.data = json.loads(s)
 
@@ -109,6 +140,7 @@ class WalletStorage(PrintError):
                     self.print_error('Failed to convert label to json format', key)
                     continue
                 self.data[key] = value
+            self._dirty = set(self.data)
 
         # check here if I need to load a plugin
         t = self.get('wallet_type')
@@ -120,6 +152,7 @@ class WalletStorage(PrintError):
                 raise BaseException("This wallet has multiple accounts and must be split")
             if self.requires_upgrade():
                 self.upgrade()
+        self.load_time += time.time() - t0
 
     def is_encrypted(self):
         try:
@@ -159,36 +192,124 @@ class WalletStorage(PrintError):
                 v = copy.deepcopy(v)
         return v
 
-    def put(self, key, value):
-        try:
-            json.dumps(key)
-            json.dumps(value)
-        except:
+    def put(self, key, value, *, copy_value=True):
+        ''' Unchanged values are a cheap no-op. Changed ones are copied, and
+        serialized by the next write(), without holding the lock. A value
+        that turns out not to be JSON serializable is rejected then, and the
+        key goes back to the value it has in the wallet file.
+
+        With copy_value=False the value is stored as is, rather than a deep
+        copy of it. The caller must not modify it (or anything in it)
+        afterwards. '''
+        if not isinstance(key, str):
             self.print_error("json error: cannot save", key)
             return
         with self.lock:
             if value is not None:
                 if self.data.get(key) != value:
                     self.modified = True
-                    self.data[key] = copy.deepcopy(value)
+                    self.data[key] = copy.deepcopy(value) if copy_value else value
+                    self._dirty.add(key)
             elif key in self.data:
                 self.modified = True
                 self.data.pop(key)
+                self._json.pop(key, None)
+                self._dirty.discard(key)
 
     @profiler
     def write(self):
+        ''' Writes the wallet file now, if it was modified. Any write pending
+        from write_soon() is done by this call. '''
         if self._in_memory_only:
             return
-        with self.lock:
-            self._write()
-
-    def _write(self):
         if threading.currentThread().isDaemon():
             self.print_error('warning: daemon thread cannot write wallet')
             return
-        if not self.modified:
+        with self.lock:
+            if self._write_timer:
+                self._write_timer.cancel()
+                self._write_timer = None
+        with self._write_lock:
+            self._write()
+
+    def write_soon(self):
+        ''' Schedules a write() in WRITE_DELAY seconds, on a thread of its
+        own, unless one is already pending. Safe to call from any thread,
+        including daemon threads. '''
+        if self._in_memory_only:
             return
-        s = json.dumps(self.data, indent=4, sort_keys=True)
+        with self.lock:
+            if self._write_timer:
+                return
+            self._write_timer = t = threading.Timer(self.WRITE_DELAY, self._timed_write)
+            # Not a daemon, so that the write isn't cut short if the app exits
+            t.daemon = False
+            t.name = 'WalletStorage write'
+            t.start()
+
+    def _timed_write(self):
+        with self.lock:
+            if self._write_timer is not threading.current_thread():
+                return  # cancelled meanwhile
+            self._write_timer = None
+        with self._write_lock:
+            self._write()
+
+    def _serialize(self):
+        ''' Returns the wallet file's JSON text, as json.dumps(self.data,
+        indent=4, sort_keys=True) would, serializing only the keys put since
+        the last call. Call with self._write_lock held. '''
+        with self.lock:
+            data = self.data
+            dirty, self._dirty = self._dirty, set()
+            # put() replaces values rather than mutating them, so these can
+            # be serialized without holding the lock.
+            values = {key: data[key] for key in dirty if key in data}
+        texts = {}
+        for key, value in values.items():
+            try:
+                # drop the outer braces, leaving the key's lines at indent 4
+                texts[key] = json.dumps({key: value}, indent=4, sort_keys=True)[2:-2]
+            except (TypeError, ValueError):
+                self.print_error("json error: cannot save", key)
+                texts[key] = None
+        with self.lock:
+            if self.data is not data:
+                # replaced meanwhile: everything is dirty again
+                return self._serialize()
+            for key, text in texts.items():
+                # (If the key was put again meanwhile, this writes the
+                # previous value, and the next write the new one.)
+                if text is not None:
+                    self._json[key] = text
+                elif self.data.get(key) is values[key]:
+                    # Back to the last value written, as if put() had
+                    # never accepted this one.
+                    old = self._json.get(key)
+                    if old is None:
+                        self.data.pop(key)
+                    else:
+                        self.data[key] = json.loads('{' + old + '}')[key]
+            keys = sorted(k for k in self._json if k in self.data)
+            if not keys:
+                return '{}'
+            return '{\n' + ',\n'.join(self._json[k] for k in keys) + '\n}'
+
+    def _write(self):
+        with self.lock:
+            if not self.modified:
+                return
+            self.modified = False
+        t0 = time.time()
+        try:
+            self._write_file(self._serialize())
+        except:
+            with self.lock:
+                self.modified = True
+            raise
+        WRITE_SECONDS.observe(time.time() - t0)
+
+    def _write_file(self, s):
         if self.pubkey:
             s = bytes(s, 'utf8')
             c = zlib.compress(s)
@@ -216,7 +337,6 @@ class WalletStorage(PrintError):
         self.raw = s
         self._file_exists = True
         self.print_error("saved", self.path)
-        self.modified = False
 
     def requires_split(self):
         d = self.get('accounts', {})
@@ -26,12 +26,23 @@
 from threading import Lock
 import hashlib
 import traceback
+import weakref
 
 from .transaction import Transaction
 from .util import ThreadJob, bh2u
+from . import metrics
 from . import networks
 from .bitcoin import InvalidXKeyFormat
 
+# Each open wallet's Synchronizer, held weakly, so that the gauges below can
+# report the requests outstanding for all wallets together.
+_synchronizers = weakref.WeakSet()
+
+metrics.gauge('synchronizer_pending_txs', 'Transactions requested by synchronizers and not yet received',
+              fn=lambda: sum(len(s.requested_tx) for s in list(_synchronizers)))
+metrics.gauge('synchronizer_pending_histories', 'Address histories requested by synchronizers and not yet received',
+              fn=lambda: sum(len(s.requested_histories) for s in list(_synchronizers)))
+
 
 class Synchronizer(ThreadJob):
     '''The synchronizer keeps the wallet up-to-date with its set of
@@ -56,6 +67,7 @@ class Synchronizer(ThreadJob):
         self.requested_hashes = set()
         self.h2addr = {}
         self.lock = Lock()
+        _synchronizers.add(self)
         self.initialize()
 
     def parse_response(self, response):
@@ -195,26 +207,40 @@ class Synchronizer(ThreadJob):
             return
         del chk_txid
         # /Paranoia
+        Transaction.tx_cache_put(tx, tx_hash)  # other wallets may need it too
+        self.receive_tx(tx_hash, tx, tx_height)
+        if not self.requested_tx:
+            self.network.trigger_callback('wallet_updated', self.wallet)
+
+    def receive_tx(self, tx_hash, tx, tx_height):
         self.wallet.receive_tx_callback(tx_hash, tx, tx_height)
         self.print_error("received tx %s height: %d bytes: %d" %
                          (tx_hash, tx_height, len(tx.raw)))
         # callbacks
         self.network.trigger_callback('new_transaction', tx, self.wallet)
-        if not self.requested_tx:
-            self.network.trigger_callback('wallet_updated', self.wallet)
-
 
     def request_missing_txs(self, hist):
         # "hist" is a list of [tx_hash, tx_height] lists
         requests = []
+        from_cache = False
         for tx_hash, tx_height in hist:
             if tx_hash in self.requested_tx:
                 continue
             if tx_hash in self.wallet.transactions:
                 continue
+            # Another wallet (or the SLP validator, etc) may have already
+            # downloaded it. The tx store only holds tx's matching their txid.
+            tx = Transaction.tx_cache_get(tx_hash)
+            if tx:
+                tx.deserialize()
+                self.receive_tx(tx_hash, tx, tx_height)
+                from_cache = True
+                continue
             requests.append(('blockchain.transaction.get', [tx_hash]))
             self.requested_tx[tx_hash] = tx_height
         self.network.send(requests, self.tx_response)
+        if from_cache and not self.requested_tx:
+            self.network.trigger_callback('wallet_updated', self.wallet)
 
 
     def initialize(self):
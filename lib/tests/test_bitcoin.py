@@ -3,7 +3,7 @@ import unittest
 import sys
 from ecdsa.util import number_to_string
 
-from ..address import Address
+from ..address import Address, AddressError
 from ..bitcoin import (
     generator_secp256k1, point_to_ser, public_key_to_p2pkh, EC_KEY,
     bip32_root, bip32_public_derivation, bip32_private_derivation, pw_encode,
@@ -162,6 +162,27 @@ class Test_bitcoin_testnet(unittest.TestCase):
         set_mainnet()
 
 
+class Test_Address(unittest.TestCase):
+
+    def test_interned(self):
+        addr = Address.from_string('1BpEi6DfDAUFd7GtittLSdBeYJvcoaVggu')
+        self.assertIs(Address(bytearray(addr.hash160), addr.kind), addr)
+        self.assertIs(Address.from_string(addr.to_cashaddr()), addr)
+        self.assertIsNot(Address(addr.hash160, Address.ADDR_P2SH), addr)
+
+    def test_string_cache_follows_network(self):
+        addr = Address.from_string('1BpEi6DfDAUFd7GtittLSdBeYJvcoaVggu')
+        self.assertEqual(addr.to_storage_string(), '1BpEi6DfDAUFd7GtittLSdBeYJvcoaVggu')
+        set_testnet()
+        try:
+            self.assertEqual(addr.to_storage_string(), 'mrLC19Je2BuWQDkWSTriGYPyQJXKkkBmCx')
+            with self.assertRaises(AddressError):
+                addr.to_string(Address._NUM_FMTS)
+        finally:
+            set_mainnet()
+        self.assertEqual(addr.to_storage_string(), '1BpEi6DfDAUFd7GtittLSdBeYJvcoaVggu')
+
+
 class Test_xprv_xpub(unittest.TestCase):
 
     xprv_xpub = (
@@ -0,0 +1,231 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from ..address import Address
+from ..bitcoin import int_to_hex, serialize_privkey, var_int
+from ..bitcoinfiles import (BfpDownloader, BfpDownloadError, BfpUploadError, broadcast_upload_chain,
+                            chunk_can_fit_in_final_opreturn, make_bitcoinfile_chunk_opreturn,
+                            make_bitcoinfile_metadata_opreturn, make_upload_chain)
+from ..simple_config import SimpleConfig
+from ..storage import WalletStorage
+from ..transaction import Transaction
+from ..wallet import ImportedPrivkeyWallet
+
+DUST_SCRIPT = Address.from_string('1BpEi6DfDAUFd7GtittLSdBeYJvcoaVggu').to_script()
+
+
+def make_raw_tx(prevout_hash, prevout_n, op_return):
+    ''' An unsigned tx spending prevout, with the OP_RETURN at vout 0 and a
+    dust output at vout 1, as the uploader makes them. '''
+    script = op_return[1].to_script()
+    return ('01000000' + '01' + bytes.fromhex(prevout_hash)[::-1].hex() + int_to_hex(prevout_n, 4)
+            + '00' + 'ffffffff' + '02'
+            + int_to_hex(0, 8) + var_int(len(script)) + script.hex()
+            + int_to_hex(546, 8) + var_int(len(DUST_SCRIPT)) + DUST_SCRIPT.hex()
+            + '00000000')
+
+
+def make_file_chain(data, *, with_size=True, file_hash=None):
+    ''' Returns (metadata txid, {txid: raw}) for data split into 220 byte
+    chunks. The last chunk goes into the metadata tx if it fits. '''
+    chunks = [data[i:i+220] for i in range(0, len(data), 220)]
+    size = len(data) if with_size else None
+    file_hash = file_hash or hashlib.sha256(data).hexdigest()
+    metadata = lambda chunk, count: make_bitcoinfile_metadata_opreturn(1, count, chunk, 'test', '.bin', size, file_hash)
+    last = chunks.pop()
+    if chunk_can_fit_in_final_opreturn(metadata(None, 1), len(last)):
+        op_return = metadata(last, len(chunks) + 1)
+    else:
+        chunks.append(last)
+        op_return = metadata(None, len(chunks))
+    txs = {}
+    prev, n = 'ab' * 32, 0
+    for chunk in chunks:
+        raw = make_raw_tx(prev, n, make_bitcoinfile_chunk_opreturn(chunk))
+        prev, n = Transaction(raw).txid(), 1
+        txs[prev] = raw
+    raw = make_raw_tx(prev, n, op_return)
+    txid = Transaction(raw).txid()
+    txs[txid] = raw
+    return txid, txs
+
+
+class FakeNetwork:
+    def __init__(self, txs):
+        self.txs = txs
+        self.requests = 0
+
+    def send(self, messages, callback):
+        for method, params in messages:
+            self.requests += 1
+            raw = self.txs.get(params[0])
+            if raw is None:
+                callback({'error': {'message': 'no such transaction'}})
+            else:
+                callback({'result': raw, 'params': params})
+
+
+class TestBfpDownloader(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'file.bin')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _download(self, data, **kwargs):
+        txid, txs = make_file_chain(data, **kwargs)
+        network = FakeNetwork(txs)
+        progress = []
+        result = BfpDownloader(network, 'bitcoinfile:' + txid, self.path,
+                               on_progress=lambda done, count: progress.append(done)).download(timeout=5)
+        return result, network, progress
+
+    def test_download(self):
+        data = bytes(range(256)) * 2
+        result, network, progress = self._download(data)
+        with open(self.path, 'rb') as f:
+            self.assertEqual(data, f.read())
+        self.assertEqual(result['size'], len(data))
+        self.assertTrue(result['hash_verified'])
+        self.assertEqual(progress, [1, 2, 3])
+        self.assertEqual(network.requests, 3)
+        self.assertFalse(os.path.exists(self.path + '.part'))
+        # the chain is now in the app-wide tx store
+        result, network, progress = self._download(data)
+        self.assertEqual(network.requests, 0)
+
+    def test_download_without_size(self):
+        data = b'no size' * 100
+        result, network, progress = self._download(data, with_size=False)
+        with open(self.path, 'rb') as f:
+            self.assertEqual(data, f.read())
+        self.assertEqual(result['sha256'], hashlib.sha256(data).hexdigest())
+
+    def test_bad_hash(self):
+        data = b'tampered' * 50
+        txid, txs = make_file_chain(data, file_hash='00' * 32)
+        downloader = BfpDownloader(FakeNetwork(txs), txid, self.path)
+        with self.assertRaises(BfpDownloadError):
+            downloader.download(timeout=5)
+        self.assertFalse(os.path.exists(self.path))
+        self.assertFalse(os.path.exists(self.path + '.part'))
+
+    def test_long_cached_chain(self):
+        # 255 chunks, the most the protocol allows, all in the wallet
+        data = os.urandom(255 * 220)
+        txid, txs = make_file_chain(data)
+        self.assertEqual(len(txs), 256)
+        class Wallet:
+            transactions = {h: Transaction(raw) for h, raw in txs.items()}
+        network = FakeNetwork({})
+        result = BfpDownloader(network, txid, self.path, wallet=Wallet()).download(timeout=5)
+        with open(self.path, 'rb') as f:
+            self.assertEqual(data, f.read())
+        self.assertEqual(result['chunks'], 255)
+        self.assertEqual(network.requests, 0)
+
+
+class TestMakeUploadChain(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        wif = serialize_privkey(bytes([1] * 32), True, 'p2pkh')
+        self.wallet = ImportedPrivkeyWallet.from_text(WalletStorage(os.path.join(self.tmpdir, 'wallet')), wif)
+        self.config = SimpleConfig({'electron_cash_path': self.tmpdir})
+        # a confirmed coin to pay for the upload
+        addr = self.wallet.get_addresses()[0]
+        script = addr.to_script()
+        fund = Transaction('01000000' + '01' + 'ab' * 32 + int_to_hex(0, 4) + '00' + 'ffffffff' + '01'
+                           + int_to_hex(100000, 8) + var_int(len(script)) + script.hex() + '00000000')
+        self.wallet.receive_history_callback(addr, [(fund.txid(), 100)], {})
+        self.wallet.receive_tx_callback(fund.txid(), fund, 100)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_make_upload_chain(self):
+        data = bytes(range(256)) * 3
+        metadata = {'filename': 'test', 'fileext': 'bin', 'filesize': len(data),
+                    'file_sha256': hashlib.sha256(data).hexdigest(), 'prev_file_sha256': None, 'uri': None}
+        progress, hooked = [], []
+        txs = make_upload_chain(self.wallet, self.config, data, metadata, None,
+                                on_progress=lambda done, total: progress.append(done),
+                                before_sign=hooked.append)
+        self.assertEqual(hooked, txs)
+        self.assertTrue(all(tx.is_complete() for tx in txs))
+        self.assertEqual(progress[-1], len(txs))
+        # each tx spends the one before it
+        for prev, tx in zip(txs, txs[1:]):
+            self.assertEqual(tx.inputs()[0]['prevout_hash'], prev.txid())
+        # and the chain downloads as the file
+        network = FakeNetwork({tx.txid(): str(tx) for tx in txs})
+        path = os.path.join(self.tmpdir, 'file.bin')
+        result = BfpDownloader(network, txs[-1].txid(), path).download(timeout=5)
+        self.assertTrue(result['hash_verified'])
+        with open(path, 'rb') as f:
+            self.assertEqual(data, f.read())
+
+
+class FakeBroadcastNetwork:
+    ''' Rejects each tx in `errors` the first time it is broadcast. '''
+    def __init__(self, errors=None):
+        self.errors = dict(errors or {})
+        self.broadcasts = []
+
+    def broadcast_transaction(self, tx, callback):
+        self.broadcasts.append(tx.txid())
+        error = self.errors.pop(tx.txid(), None)
+        if error:
+            callback({'error': {'code': 1, 'message': error}})
+        else:
+            callback({'result': tx.txid()})
+
+
+class TestBroadcastUploadChain(unittest.TestCase):
+
+    def setUp(self):
+        txid, txs = make_file_chain(bytes(range(200)) * 5)
+        self.txs = [Transaction(raw) for raw in txs.values()]
+        self.txids = [tx.txid() for tx in self.txs]
+
+    def test_broadcast(self):
+        network = FakeBroadcastNetwork()
+        progress = []
+        txid = broadcast_upload_chain(network, self.txs, window=2,
+                                      on_progress=lambda done, total: progress.append((done, total)))
+        self.assertEqual(txid, self.txids[-1])
+        self.assertEqual(network.broadcasts, self.txids)
+        self.assertEqual(progress[-1], (len(self.txs), len(self.txs)))
+
+    def test_retry(self):
+        network = FakeBroadcastNetwork({self.txids[1]: 'Missing inputs',
+                                        self.txids[2]: 'txn-already-in-mempool'})
+        self.assertEqual(broadcast_upload_chain(network, self.txs), self.txids[-1])
+        self.assertEqual(network.broadcasts.count(self.txids[1]), 2)
+        self.assertEqual(network.broadcasts.count(self.txids[2]), 1)
+
+    def test_gives_up(self):
+        network = FakeBroadcastNetwork({self.txids[0]: 'Missing inputs'})
+        with self.assertRaises(BfpUploadError):
+            broadcast_upload_chain(network, self.txs, retries=0)
+
+    def test_total_timeout(self):
+        network = FakeBroadcastNetwork()
+        broadcast = network.broadcast_transaction
+        # only the first tx is ever answered
+        network.broadcast_transaction = lambda tx, callback: broadcast(
+            tx, callback if tx.txid() == self.txids[0] else lambda response: None)
+        t0 = time.time()
+        with self.assertRaises(BfpUploadError):
+            broadcast_upload_chain(network, self.txs, timeout=10, total_timeout=0.1)
+        self.assertLess(time.time() - t0, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
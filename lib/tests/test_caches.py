@@ -0,0 +1,32 @@
+import unittest
+
+from ..caches import ExpiringCache, get_cache_stats
+
+
+class TestExpiringCache(unittest.TestCase):
+
+    def test_stats(self):
+        c = ExpiringCache(maxlen=10, name='test_stats cache')
+        c.put('a', 1)
+        self.assertEqual(1, c.get('a'))
+        self.assertIsNone(c.get('b'))
+        st = get_cache_stats()['test_stats cache']
+        self.assertEqual((1, 1, 1, 0.5), (st['items'], st['hits'], st['misses'], st['hit_rate']))
+        self.assertIsNone(st['bytes'])
+
+    def test_max_bytes_evicts_lru(self):
+        c = ExpiringCache(name='test_max_bytes cache', max_bytes=30, sizeof=len)
+        c.put('a', 'x' * 10)
+        c.put('b', 'y' * 10)
+        c.get('a')  # 'b' is now the least recently used
+        c.put('c', 'z' * 15)
+        self.assertIsNone(c.get('b'))
+        self.assertEqual('x' * 10, c.get('a'))
+        self.assertEqual('z' * 15, c.get('c'))
+        st = c.stats()
+        self.assertEqual((25, 1), (st['bytes'], st['evictions']))
+        # replacing an item accounts for the old one's size
+        c.put('c', 'z')
+        self.assertEqual(11, c.stats()['bytes'])
+        c.discard('a')
+        self.assertEqual(1, c.stats()['bytes'])
@@ -0,0 +1,70 @@
+import unittest
+
+from .. import coinchooser
+from ..address import Address
+from ..bitcoin import TYPE_ADDRESS
+from ..util import NotEnoughFunds
+
+
+def make_coins(values, address=None):
+    coins = []
+    for n, value in enumerate(values):
+        addr = address or Address.from_P2PKH_hash(n.to_bytes(20, 'big'))
+        coins.append({'address': addr, 'value': value, 'prevout_n': n,
+                      'prevout_hash': '%064x' % (n + 1), 'type': 'p2pkh',
+                      'num_sig': 1, 'signatures': [None], 'x_pubkeys': ['02' + '00' * 32]})
+    return coins
+
+
+def fee_estimator(size):
+    return size
+
+
+class TestCoinChooser(unittest.TestCase):
+
+    def setUp(self):
+        self.dest = Address.from_P2PKH_hash(b'\xaa' * 20)
+        self.change = [Address.from_P2PKH_hash(b'\xbb' * 20)]
+
+    def test_privacy_pays_outputs(self):
+        coins = make_coins([10000 * (n + 1) for n in range(50)])
+        outputs = [(TYPE_ADDRESS, self.dest, 123456)]
+        tx = coinchooser.CoinChooserPrivacy().make_tx(coins, outputs, self.change, fee_estimator, 546)
+        self.assertGreaterEqual(tx.input_value(), tx.output_value())
+        self.assertGreaterEqual(sum(c['value'] for c in tx.inputs()), 123456)
+
+    def test_not_enough_funds(self):
+        coins = make_coins([1000, 2000])
+        outputs = [(TYPE_ADDRESS, self.dest, 100000)]
+        with self.assertRaises(NotEnoughFunds):
+            coinchooser.CoinChooserPrivacy().make_tx(coins, outputs, self.change, fee_estimator, 546)
+
+    def test_mandatory_coins_removed_and_spent(self):
+        coins = make_coins([50000, 60000, 70000])
+        mandatory = [dict(coins[1])]
+        outputs = [(TYPE_ADDRESS, self.dest, 1000)]
+        tx = coinchooser.CoinChooserPrivacy().make_tx(coins, outputs, self.change, fee_estimator, 546,
+                                                      mandatory_coins=mandatory)
+        self.assertEqual(len(coins), 2)
+        self.assertNotIn(mandatory[0]['prevout_hash'], [c['prevout_hash'] for c in coins])
+        self.assertEqual(tx.inputs()[0]['prevout_hash'], mandatory[0]['prevout_hash'])
+
+    def test_branch_and_bound_finds_changeless_set(self):
+        values = [100000, 250000, 300000, 41234, 77777]
+        coins = make_coins(values)
+        chooser = coinchooser.CoinChooserBranchAndBound()
+        # Two of the coins pay this with a little left over for the fee,
+        # less than a change output is worth
+        outputs = [(TYPE_ADDRESS, self.dest, 41234 + 77777 - 600)]
+        tx = chooser.make_tx(coins, outputs, self.change, fee_estimator, 546)
+        self.assertEqual(sorted(c['value'] for c in tx.inputs()), [41234, 77777])
+        self.assertEqual(len(tx.outputs()), 1)
+
+    def test_get_coin_chooser(self):
+        self.assertIsInstance(coinchooser.get_coin_chooser({}), coinchooser.CoinChooserPrivacy)
+        self.assertIsInstance(coinchooser.get_coin_chooser({'coin_chooser': 'BranchAndBound'}),
+                              coinchooser.CoinChooserBranchAndBound)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,10 @@
+import threading
+import time
 import unittest
 from decimal import Decimal as PyDecimal
+from unittest import mock
 
+from .. import slp_validator_0x01
 from ..commands import Commands
 
 
@@ -31,3 +35,44 @@ class TestCommands(unittest.TestCase):
         self.assertEqual("2asd", Commands._setconfig_normalize_value('rpcpassword', '2asd'))
         self.assertEqual("['file:///var/www/','https://electrum.org']",
             Commands._setconfig_normalize_value('rpcpassword', "['file:///var/www/','https://electrum.org']"))
+
+
+class FakeJob:
+    running = has_never_run = False
+    stop_reason = 'cancelled'
+
+    def add_callback(self, callback, way=None):
+        threading.Timer(0.05, callback, (self,)).start()
+
+
+class FakeNetwork:
+    def __init__(self, txs):
+        self.txs = txs
+
+    def send(self, messages, callback):
+        for method, params in messages:
+            callback({'result': self.txs[params[0]], 'params': params})
+
+
+class FakeWallet:
+    transactions = {}
+
+
+class TestSlpValidateBatch(unittest.TestCase):
+
+    def test_job_ending_without_result(self):
+        requests = slp_validator_0x01.ValidationRequests()
+        requests.pending['aa'] = FakeJob()
+        cmds = Commands(config=None, wallet=FakeWallet(), network=FakeNetwork({}))
+        t0 = time.time()
+        with mock.patch.object(slp_validator_0x01, 'shared_requests', requests):
+            results = cmds.slpvalidate_batch(['aa'], timeout=5)
+        # reported as soon as the job stops, not at the timeout
+        self.assertLess(time.time() - t0, 2)
+        self.assertEqual(results, [{'txid': 'aa', 'job_id': 'aa', 'status': 'stopped: cancelled'}])
+
+    def test_fetch_checks_txid(self):
+        raw = '01000000' + '00' + '00' + '00000000'
+        cmds = Commands(config=None, wallet=None, network=FakeNetwork({'aa': raw}))
+        self.assertEqual(cmds._slp_fetch_txs(['aa'], timeout=5), {})
+
@@ -0,0 +1,63 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+
+from lib.exchange_rate import RateTable, date_str_to_day
+
+
+class TestRateTable(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'CoinGecko_USD.rates')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_empty(self):
+        table = RateTable(self.path)
+        self.assertEqual(len(table), 0)
+        self.assertIsNone(table.get(date_str_to_day('2020-01-01')))
+        self.assertIsNone(table.last_day())
+
+    def test_update_and_reload(self):
+        day = date_str_to_day('2020-01-01')
+        table = RateTable(self.path)
+        table.update({day: 200.5, day + 2: 210.25})
+        self.assertEqual(table.get_many([day - 1, day, day + 1, day + 2, day + 3]),
+                         [None, 200.5, None, 210.25, None])
+        self.assertEqual(table.last_day(), day + 2)
+        # merge: extends both ends and overwrites
+        table.update({day - 1: 190.0, day + 2: 211.0, day + 4: 220.0})
+        table.close()
+        table = RateTable(self.path)
+        self.assertEqual(len(table), 6)
+        self.assertEqual(table.get_many(range(day - 1, day + 5)),
+                         [190.0, 200.5, None, 211.0, None, 220.0])
+        table.close()
+
+    def test_empty_update_refreshes_mtime(self):
+        table = RateTable(self.path)
+        table.update({})  # no file yet
+        self.assertEqual(table.mtime(), 0.0)
+        table.update({date_str_to_day('2020-01-01'): 1.0})
+        os.utime(self.path, (1000, 1000))
+        table.update({})
+        self.assertGreater(table.mtime(), 1000)
+        self.assertEqual(len(table), 1)
+        table.close()
+
+    def test_corrupt_file_ignored(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'garbage')
+        table = RateTable(self.path)
+        self.assertEqual(len(table), 0)
+        table.update({date_str_to_day('2020-01-01'): 1.0})
+        self.assertEqual(len(table), 1)
+        table.close()
+
+    def test_date_str_to_day(self):
+        self.assertEqual(date_str_to_day('2020-01-31'),
+                         datetime(2020, 1, 31, 13, 45).toordinal())
@@ -0,0 +1,101 @@
+import random
+import unittest
+
+from ..history_index import HistoryIndex
+
+
+class FakeHistory:
+    ''' tx_hash -> (txpos, delta), with the naive history computation of
+    Abstract_Wallet.get_history to check the index against. '''
+
+    def __init__(self):
+        self.txs = {}
+        self.index = HistoryIndex(self.txs.get, lambda: self.txs.keys())
+
+    def set(self, tx_hash, txpos, delta):
+        self.txs[tx_hash] = (txpos, delta)
+        self.index.invalidate(tx_hash)
+
+    def remove(self, tx_hash):
+        del self.txs[tx_hash]
+        self.index.invalidate(tx_hash)
+
+    def balance(self):
+        return sum(delta or 0 for _, delta in self.txs.values())
+
+    def naive(self):
+        history = sorted(self.txs.items(), key=lambda x: (x[1][0], x[0]), reverse=True)
+        balance = self.balance()
+        ret = []
+        for tx_hash, (txpos, delta) in history:
+            ret.append((tx_hash, delta, balance))
+            if balance is None or delta is None:
+                balance = None
+            else:
+                balance -= delta
+        return ret
+
+
+class TestHistoryIndex(unittest.TestCase):
+
+    def test_empty(self):
+        h = FakeHistory()
+        self.assertEqual(len(h.index), 0)
+        self.assertEqual(h.index.page(0), [])
+        self.assertEqual(h.index.page(0, 5, 10, reverse=False), [])
+
+    def test_running_balance(self):
+        h = FakeHistory()
+        h.set('a', (100, 0), 50)
+        h.set('b', (101, 1), -20)
+        h.set('c', (1e9, 0), 5)  # unconfirmed
+        self.assertEqual(h.index.page(h.balance()),
+                         [('c', 5, 35), ('b', -20, 30), ('a', 50, 50)])
+        # a reorg moves 'a' after 'b'
+        h.set('a', (102, 0), 50)
+        self.assertEqual(h.index.page(h.balance()),
+                         [('c', 5, 35), ('a', 50, 30), ('b', -20, -20)])
+
+    def test_unknown_delta(self):
+        h = FakeHistory()
+        h.set('a', (100, 0), 50)
+        h.set('b', (101, 0), None)
+        h.set('c', (102, 0), 10)
+        self.assertEqual(h.index.page(60),
+                         [('c', 10, 60), ('b', None, 50), ('a', 50, None)])
+        h.set('b', (101, 0), -5)
+        self.assertEqual(h.index.page(55),
+                         [('c', 10, 55), ('b', -5, 45), ('a', 50, 50)])
+
+    def test_pages(self):
+        h = FakeHistory()
+        for i in range(10):
+            h.set('%02d' % i, (i + 1, 0), i)
+        full = h.naive()
+        self.assertEqual(h.index.page(h.balance(), 0, 3), full[:3])
+        self.assertEqual(h.index.page(h.balance(), 3, 3), full[3:6])
+        self.assertEqual(h.index.page(h.balance(), 8, 3), full[8:])
+        self.assertEqual(h.index.page(h.balance(), 12, 3), [])
+        self.assertEqual(h.index.page(h.balance(), 2, 3, reverse=False),
+                         full[::-1][2:5])
+        self.assertEqual(h.index.page(h.balance(), 0, 0), [])
+
+    def test_random_changes(self):
+        rand = random.Random(42)
+        h = FakeHistory()
+        for step in range(500):
+            tx_hash = '%03d' % rand.randrange(60)
+            if tx_hash in h.txs and rand.random() < 0.3:
+                h.remove(tx_hash)
+            else:
+                delta = rand.randrange(-100, 100) if rand.random() < 0.95 else None
+                h.set(tx_hash, (rand.randrange(1, 20), rand.randrange(3)), delta)
+            if step % 7 == 0:
+                self.assertEqual(len(h.index), len(h.txs))
+                self.assertEqual(h.index.page(h.balance()), h.naive())
+        h.index.invalidate_all()
+        self.assertEqual(h.index.page(h.balance()), h.naive())
+
+
+if __name__ == '__main__':
+    unittest.main()
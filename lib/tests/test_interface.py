@@ -1,3 +1,5 @@
+import json
+import socket
 import unittest
 
 from .. import interface
@@ -24,3 +26,73 @@ class TestInterface(unittest.TestCase):
         self.assertTrue(i.check_host_name(
             peercert={'subject': [('commonName', 'foo.bar.com')]},
             name='foo.bar.com'))
+
+
+class TestBatching(unittest.TestCase):
+
+    def setUp(self):
+        self.ours, self.server = socket.socketpair()
+        self.server.settimeout(1.0)
+
+    def tearDown(self):
+        self.ours.close()
+        self.server.close()
+
+    def make_interface(self, **kwargs):
+        return interface.Interface('localhost:50001:t', self.ours, **kwargs)
+
+    def server_read(self):
+        data = b''
+        while not data.endswith(b'\n'):
+            data += self.server.recv(65536)
+        return [json.loads(line) for line in data.decode().splitlines()]
+
+    def server_send(self, *messages):
+        self.server.sendall(b''.join(json.dumps(m).encode() + b'\n' for m in messages))
+
+    def get_responses(self, i):
+        self.ours.settimeout(0.2)  # wait for the data sent above
+        responses = i.get_responses()
+        self.ours.settimeout(0.0)
+        return responses
+
+    def test_unbatched(self):
+        i = self.make_interface(max_unanswered=2)
+        for n in range(3):
+            i.queue_request('blockchain.scripthash.subscribe', ['%d' % n], n)
+        self.assertEqual(i.num_requests(), 2)
+        self.assertTrue(i.send_requests())
+        self.assertEqual([r['id'] for r in self.server_read()], [0, 1])
+        self.assertEqual(i.num_requests(), 0)
+
+    def test_batches(self):
+        i = self.make_interface(batch_size=3, batch_window=2)
+        i.queue_request('server.version', ['x', '1.4'], 0)
+        for n in range(1, 10):
+            i.queue_request('blockchain.scripthash.subscribe', ['%d' % n], n)
+        # nothing is batched before the server answers its first request
+        self.assertEqual(i.num_requests(), 10)
+        i.unsent_requests, rest = i.unsent_requests[:1], i.unsent_requests[1:]
+        i.send_requests()
+        self.assertEqual(self.server_read(), [{'method': 'server.version', 'params': ['x', '1.4'], 'id': 0}])
+        self.server_send({'id': 0, 'result': ['server', '1.4']})
+        self.assertEqual(len(self.get_responses(i)), 1)
+        i.unsent_requests = rest
+        # two batches of 3 fit in the window
+        self.assertEqual(i.num_requests(), 6)
+        i.send_requests()
+        frames = self.server_read()
+        self.assertEqual([[r['id'] for r in f] for f in frames], [[1, 2, 3], [4, 5, 6]])
+        self.assertEqual(i.num_requests(), 0)
+        # the server answers a batch with an array
+        self.server_send([{'id': n, 'result': n} for n in (3, 1, 2)])
+        responses = self.get_responses(i)
+        self.assertEqual([(req[2], resp['result']) for req, resp in responses], [(3, 3), (1, 1), (2, 2)])
+        self.assertEqual(i.num_requests(), 3)
+        i.send_requests()
+        self.assertEqual([[r['id'] for r in f] for f in self.server_read()], [[7, 8, 9]])
+
+    def test_unexpected_array_is_an_error(self):
+        i = self.make_interface(batch_size=3)
+        self.server_send([{'id': 1, 'result': 1}])
+        self.assertEqual(self.get_responses(i), [(None, None)])
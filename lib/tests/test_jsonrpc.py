@@ -0,0 +1,48 @@
+import threading
+import time
+import unittest
+
+import jsonrpclib
+
+from ..jsonrpc import VerifyingJSONRPCServer
+
+
+class TestVerifyingJSONRPCServer(unittest.TestCase):
+
+    def _start_server(self, num_workers):
+        server = VerifyingJSONRPCServer(('127.0.0.1', 0), logRequests=False,
+                                        rpc_user='', rpc_password='',
+                                        num_workers=num_workers)
+        server.timeout = 0.05
+        self.addCleanup(server.server_close)
+        stop = threading.Event()
+        def serve():
+            while not stop.is_set():
+                server.handle_request()
+        t = threading.Thread(target=serve, daemon=True)
+        t.start()
+        self.addCleanup(t.join)
+        self.addCleanup(stop.set)
+        return server, 'http://%s:%d' % server.socket.getsockname()
+
+    def test_slow_request_does_not_block_others(self):
+        release = threading.Event()
+        server, url = self._start_server(num_workers=2)
+        server.register_function(lambda: release.wait(5), 'slow')
+        server.register_function(lambda: 'pong', 'ping')
+
+        slow = threading.Thread(target=lambda: jsonrpclib.Server(url).slow())
+        slow.start()
+        time.sleep(0.1)
+        self.assertEqual('pong', jsonrpclib.Server(url).ping())
+        self.assertTrue(slow.is_alive())
+        release.set()
+        slow.join(5)
+
+    def test_batch_request(self):
+        server, url = self._start_server(num_workers=2)
+        server.register_function(lambda x: x * 2, 'double')
+        batch = jsonrpclib.MultiCall(jsonrpclib.Server(url))
+        batch.double(1)
+        batch.double(2)
+        self.assertEqual([2, 4], list(batch()))
@@ -0,0 +1,53 @@
+import unittest
+
+from lib.metrics import Registry
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_counter_and_gauge(self):
+        registry = Registry()
+        c = registry.counter('requests_total', 'Requests')
+        c.inc()
+        c.inc(2)
+        self.assertIs(registry.counter('requests_total'), c)
+        g = registry.gauge('queue', 'Queue size')
+        g.set(5)
+        g.dec()
+        items = [1, 2, 3]
+        registry.gauge('items', fn=lambda: len(items))
+        items.append(4)
+        self.assertEqual(registry.snapshot(), {'requests_total': 3, 'queue': 4, 'items': 4})
+
+    def test_type_mismatch(self):
+        registry = Registry()
+        registry.counter('x')
+        with self.assertRaises(ValueError):
+            registry.gauge('x')
+
+    def test_histogram(self):
+        registry = Registry()
+        h = registry.histogram('latency', buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 2.0):
+            h.observe(value)
+        snap = registry.snapshot()['latency']
+        self.assertEqual(snap['count'], 4)
+        self.assertAlmostEqual(snap['sum'], 2.65)
+        self.assertEqual(snap['buckets'], {'0.1': 2, '1.0': 3, '+Inf': 4})
+        with h.time():
+            pass
+        self.assertEqual(h.count, 5)
+
+    def test_prometheus_text(self):
+        registry = Registry()
+        registry.counter('requests_total', 'Requests').inc(7)
+        registry.histogram('latency', buckets=(1.0,)).observe(0.5)
+        self.assertEqual(registry.to_prometheus(),
+                         '# TYPE electroncash_latency histogram\n'
+                         'electroncash_latency_bucket{le="1.0"} 1\n'
+                         'electroncash_latency_bucket{le="+Inf"} 1\n'
+                         'electroncash_latency_sum 0.5\n'
+                         'electroncash_latency_count 1\n'
+                         '# HELP electroncash_requests_total Requests\n'
+                         '# TYPE electroncash_requests_total counter\n'
+                         'electroncash_requests_total 7\n')
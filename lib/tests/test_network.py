@@ -0,0 +1,129 @@
+import threading
+import unittest
+from collections import defaultdict
+
+from .. import util
+from ..interface import Interface
+from ..network import Network
+
+
+class _Interface(Interface):
+    def __init__(self, server='dummy'):
+        self.queued = []
+        self.responses = []
+        self.server = server
+
+    def close(self):
+        pass
+
+    def queue_request(self, method, params, message_id):
+        self.queued.append((method, params, message_id))
+
+    def get_responses(self):
+        ret, self.responses = self.responses, []
+        return ret
+
+    def respond(self, result):
+        for request in self.queued:
+            self.responses.append((request, {'id': request[2], 'result': result}))
+        self.queued = []
+
+
+class TestRequestCoalescing(unittest.TestCase):
+
+    def setUp(self):
+        self.saved_instance = Network.INSTANCE
+        network = Network.__new__(Network)
+        Network.INSTANCE = network
+        network.debug = False
+        network.message_id = util.Monotonic(locking=True)
+        network.interface = _Interface()
+        network.default_server = network.interface.server
+        network.interfaces = {network.interface.server: network.interface}
+        network.lock = threading.Lock()
+        network.interface_lock = threading.RLock()
+        network.pending_sends_lock = threading.Lock()
+        network.pending_sends = []
+        network.unanswered_requests = {}
+        network.coalesced_requests = {}
+        network.subscriptions = defaultdict(list)
+        network.sub_cache = {}
+        self.network = network
+
+    def tearDown(self):
+        Network.INSTANCE = self.saved_instance
+
+    def test_identical_requests_sent_once(self):
+        network, interface = self.network, self.network.interface
+        got = defaultdict(list)
+        callbacks = [lambda r, i=i: got[i].append(r['result']) for i in range(3)]
+        for cb in callbacks:
+            network.send([('blockchain.transaction.get', ['aa'])], cb)
+        network.send([('blockchain.transaction.get', ['bb'])], callbacks[0])
+        network.process_pending_sends()
+        self.assertEqual([q[:2] for q in interface.queued],
+                         [('blockchain.transaction.get', ['aa']), ('blockchain.transaction.get', ['bb'])])
+        # one of the waiting callbacks goes away; the others still get the response
+        network.cancel_requests(callbacks[0])
+        interface.respond('raw')
+        network.process_responses(interface)
+        self.assertEqual(dict(got), {1: ['raw'], 2: ['raw']})
+        self.assertEqual(network.unanswered_requests, {})
+        self.assertEqual(network.coalesced_requests, {})
+        # once answered, a new request goes out again
+        network.send([('blockchain.transaction.get', ['aa'])], callbacks[1])
+        network.process_pending_sends()
+        self.assertEqual(len(interface.queued), 1)
+
+    def test_merkle_requests_coalesced(self):
+        network, interface = self.network, self.network.interface
+        got = []
+        id1 = network.get_merkle_for_transaction('aa', 100, got.append)
+        id2 = network.get_merkle_for_transaction('aa', 100, got.append)
+        id3 = network.get_merkle_for_transaction('aa', 100, lambda r: got.append(r))
+        self.assertEqual(id1, id2)
+        self.assertEqual(id1, id3)
+        self.assertEqual(len(interface.queued), 1)
+        interface.respond({'pos': 1})
+        network.process_responses(interface)
+        self.assertEqual(len(got), 2)
+
+    def test_requests_resent_when_interface_closes(self):
+        network, interface = self.network, self.network.interface
+        other = network.interfaces['other'] = _Interface('other')
+        got = []
+        network.get_merkle_for_transaction('aa', 100, got.append, interface=other)
+        network.get_merkle_for_transaction('aa', 100, lambda r: got.append(r))
+        self.assertEqual(len(other.queued), 1)
+        network.close_interface(other)
+        self.assertEqual([q[:2] for q in interface.queued],
+                         [('blockchain.transaction.get_merkle', ['aa', 100])])
+        interface.respond({'pos': 1})
+        network.process_responses(interface)
+        self.assertEqual(len(got), 2)
+        self.assertEqual(network.unanswered_requests, {})
+        self.assertEqual(network.coalesced_requests, {})
+
+    def test_stale_requests_not_coalesced(self):
+        network, interface = self.network, self.network.interface
+        got = defaultdict(list)
+        callbacks = [lambda r, i=i: got[i].append(r['result']) for i in range(3)]
+        for cb in callbacks[:2]:
+            network.get_merkle_for_transaction('aa', 100, cb)
+        self.assertEqual(len(interface.queued), 1)
+        # the first response never comes
+        lost = interface.queued.pop()
+        network.coalesced_requests[('blockchain.transaction.get_merkle', ('aa', 100))][2] -= Network.COALESCE_MAX_AGE + 1
+        network.get_merkle_for_transaction('aa', 100, callbacks[2])
+        self.assertEqual(len(interface.queued), 1)
+        self.assertNotEqual(interface.queued[0][2], lost[2])
+        interface.respond({'pos': 1})
+        network.process_responses(interface)
+        # the waiting callback moved over to the new request
+        self.assertEqual(dict(got), {1: [{'pos': 1}], 2: [{'pos': 1}]})
+        self.assertEqual(network.coalesced_requests, {})
+        self.assertEqual(list(network.unanswered_requests), [lost[2]])
+
+
+if __name__ == '__main__':
+    unittest.main()
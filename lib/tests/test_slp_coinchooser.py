@@ -0,0 +1,33 @@
+import unittest
+
+from ..slp_coinchooser import SlpCoinChooser
+
+
+def coins(*values):
+    return [{'token_value': v, 'prevout_hash': '%064x' % i, 'prevout_n': 0}
+            for i, v in enumerate(sorted(values, reverse=True))]
+
+
+class TestSlpCoinChooser(unittest.TestCase):
+
+    def values(self, selected):
+        return [c['token_value'] for c in selected]
+
+    def test_min_inputs(self):
+        self.assertEqual(self.values(SlpCoinChooser.pick(coins(1, 5, 10, 20), 22)), [20, 10])
+        self.assertEqual(self.values(SlpCoinChooser.pick(coins(1, 5, 10, 20), 20)), [20])
+
+    def test_min_fragments(self):
+        self.assertEqual(self.values(SlpCoinChooser.pick(coins(1, 5, 10, 20), 12, 'min_fragments')), [1, 5, 10])
+
+    def test_exact_match_preferred(self):
+        self.assertEqual(self.values(SlpCoinChooser.pick(coins(1, 5, 10, 20), 5)), [5])
+        self.assertEqual(self.values(SlpCoinChooser.pick(coins(1, 5, 10, 20), 5, 'min_fragments')), [5])
+
+    def test_nothing_to_pick(self):
+        self.assertEqual(SlpCoinChooser.pick(coins(1, 2), 0), [])
+        self.assertEqual(SlpCoinChooser.pick([], 10), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import random
+import threading
+import unittest
+from collections import defaultdict
+
+from .. import slp_columns
+from ..slp_columns import TokenColumns
+from ..wallet import Abstract_Wallet
+
+
+class FakeWallet:
+    ''' Just the wallet state TokenColumns reads, with the per-address
+    implementations of Abstract_Wallet to check it against. '''
+    get_addr_io = Abstract_Wallet.get_addr_io
+    get_slp_addr_utxo = Abstract_Wallet.get_slp_addr_utxo
+    get_slp_utxos = Abstract_Wallet.get_slp_utxos
+    get_slp_coins = Abstract_Wallet.get_slp_coins
+    get_slp_token_balance = Abstract_Wallet.get_slp_token_balance
+    _get_slp_token_tx_deltas = Abstract_Wallet._get_slp_token_tx_deltas
+
+    def __init__(self, seed):
+        rand = random.Random(seed)
+        self.lock = threading.RLock()
+        self.addresses = ['addr%d' % i for i in range(4)]
+        self.tokens = ['token%d' % i for i in range(3)]
+        self._slp_txo = defaultdict(lambda: defaultdict(dict))
+        self.txi, self.txo, self.tx_tokinfo, self.pruned_txo = {}, {}, {}, {}
+        self._history = defaultdict(list)
+        self.frozen_addresses = {'addr3'}
+        self.frozen_coins = set()
+        utxos = []  # (ser, addr)
+        for i in range(40):
+            tx_hash = 'tx%02d' % i
+            height = 100 + i if i < 35 else 0
+            touched = set()
+            for _ in range(rand.randrange(3)):
+                if not utxos:
+                    break
+                ser, addr = utxos.pop(rand.randrange(len(utxos)))
+                self.txi.setdefault(tx_hash, {}).setdefault(addr, []).append((ser, 546))
+                touched.add(addr)
+            r = rand.random()
+            if r < 0.1:
+                pass  # no tx_tokinfo
+            else:
+                self.tx_tokinfo[tx_hash] = {'validity': rand.choice((None, 0, 1, 1, 1, 2))}
+            token_id = rand.choice(self.tokens)
+            for n in range(1, rand.randrange(2, 5)):
+                addr = rand.choice(self.addresses)
+                qty = 'MINT_BATON' if rand.random() < 0.1 else rand.randrange(1, 1000)
+                self._slp_txo[addr][tx_hash][n] = {'token_id': token_id, 'qty': qty}
+                self.txo.setdefault(tx_hash, {}).setdefault(addr, []).append((n, 546, False))
+                ser = tx_hash + ':%d' % n
+                utxos.append((ser, addr))
+                if rand.random() < 0.1:
+                    self.frozen_coins.add(ser)
+                touched.add(addr)
+            for addr in touched:
+                self._history[addr].append((tx_hash, height))
+        self.pruned_txo['tx99:0'] = 'tx07'
+
+    def get_address_history(self, addr):
+        return self._history.get(addr, [])
+
+    def get_addresses(self):
+        return self.addresses
+
+
+class TestTokenColumns(unittest.TestCase):
+
+    def check(self, use_numpy):
+        for seed in range(5):
+            wallet = FakeWallet(seed)
+            columns = TokenColumns(wallet, use_numpy=use_numpy)
+            self.assertEqual(columns.numpy, use_numpy)
+            for confirmed_only in (False, True):
+                balances = columns.balances(confirmed_only)
+                config = {'confirmed_only': confirmed_only}
+                for token_id in wallet.tokens:
+                    expected = wallet.get_slp_token_balance(token_id, config)
+                    self.assertEqual(balances.get(token_id, (0, 0, 0, 0, 0)), expected)
+            for validities in ((0, 1), (None, 0, 1), (None, 0, 1, 2, 3, 4)):
+                expected = wallet._get_slp_token_tx_deltas(wallet.addresses, validities)
+                self.assertEqual(columns.deltas(validities),
+                                 {k: dict(v) for k, v in expected.items()})
+
+    def test_pure_python(self):
+        self.check(use_numpy=False)
+
+    @unittest.skipIf(slp_columns.np is None, "NumPy is not installed")
+    def test_numpy(self):
+        self.check(use_numpy=True)
+
+    def test_numpy_falls_back_on_large_quantities(self):
+        wallet = FakeWallet(0)
+        wallet._slp_txo['addr0']['tx00'][9] = {'token_id': 'token0', 'qty': 2**64 - 1}
+        self.assertFalse(TokenColumns(wallet).numpy)
+
+
+if __name__ == '__main__':
+    unittest.main()
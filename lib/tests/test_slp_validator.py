@@ -0,0 +1,78 @@
+import unittest
+
+from ..slp_validator_0x01 import GraphContext, ValidationRequests, Validator_SLP1
+
+
+class _FakeNode:
+    def __init__(self):
+        self.validity = 0
+
+
+class _FakeGraph:
+    validator = Validator_SLP1(token_id_hex='00' * 32)
+
+
+class _FakeJob:
+    ''' Just enough of a ValidationJob for ValidationRequests. '''
+    graph = _FakeGraph()
+
+    def __init__(self, txid):
+        self.nodes = {txid: _FakeNode()}
+        self.callbacks = []
+
+    def add_callback(self, cb, way='direct'):
+        self.callbacks.append(cb)
+
+    def finish(self, validity):
+        for node in self.nodes.values():
+            node.validity = validity
+        for cb in self.callbacks:
+            cb(self)
+
+
+class TestValidationRequests(unittest.TestCase):
+
+    def test_result_after_done(self):
+        requests = ValidationRequests()
+        job = _FakeJob('aa')
+        requests.add('aa', job)
+        self.assertIs(requests.get_job('aa'), job)
+        self.assertIsNone(requests.get_result('aa'))
+        job.finish(1)
+        self.assertIsNone(requests.get_job('aa'))
+        self.assertEqual(requests.get_result('aa'), 'Valid')
+
+    def test_unknown_validity_not_remembered(self):
+        requests = ValidationRequests()
+        job = _FakeJob('aa')
+        requests.add('aa', job)
+        job.finish(0)
+        self.assertIsNone(requests.get_job('aa'))
+        self.assertIsNone(requests.get_result('aa'))
+
+    def test_bounds(self):
+        requests = ValidationRequests(max_pending=2, max_finished=2)
+        jobs = [_FakeJob(txid) for txid in ('aa', 'bb', 'cc')]
+        requests.add('aa', jobs[0])
+        requests.add('bb', jobs[1])
+        self.assertFalse(requests.can_add())
+        jobs[0].finish(1)
+        self.assertTrue(requests.can_add())
+        requests.add('cc', jobs[2])
+        jobs[1].finish(3)
+        jobs[2].finish(1)
+        # oldest result was dropped
+        self.assertIsNone(requests.get_result('aa'))
+        self.assertEqual(requests.get_result('bb'), 'Invalid: insufficient valid inputs')
+        self.assertEqual(requests.get_result('cc'), 'Valid')
+
+
+class TestGraphContext(unittest.TestCase):
+
+    def test_threads_start_on_first_use(self):
+        ctx = GraphContext(name='TestGraphContext')
+        self.assertIsNone(ctx.job_mgr.thread.ident)
+        self.assertIsNone(ctx.graph_search_mgr.search_thread.ident)
+        # killing a manager that never ran doesn't leave waiters hanging
+        ctx.job_mgr.kill()
+        self.assertTrue(ctx.job_mgr.exited.wait(timeout=1.0))
@@ -3,7 +3,7 @@ from pprint import pprint
 
 from .. import transaction
 from ..address import Address, ScriptOutput, PublicKey
-from ..bitcoin import TYPE_ADDRESS, TYPE_PUBKEY, TYPE_SCRIPT
+from ..bitcoin import TYPE_ADDRESS, TYPE_PUBKEY, TYPE_SCRIPT, Hash, public_key_from_private_key
 
 from ..keystore import xpubkey_to_address
 
@@ -130,6 +130,54 @@ class TestTransaction(unittest.TestCase):
 
         self.assertEqual(tx.estimated_size(), 191)
 
+    def _make_unsigned_tx(self, sec, n_inputs):
+        pubkey = public_key_from_private_key(sec, True)
+        address = Address.from_pubkey(pubkey)
+        inputs = [{'type': 'p2pkh', 'address': address, 'value': 100000,
+                   'prevout_hash': '%064x' % (i + 1), 'prevout_n': i,
+                   'sequence': 0xfffffffe, 'num_sig': 1, 'signatures': [None],
+                   'x_pubkeys': [pubkey], 'pubkeys': [pubkey]}
+                  for i in range(n_inputs)]
+        outputs = [(TYPE_ADDRESS, address, 100000 * n_inputs - 1000)]
+        return transaction.Transaction.from_io(inputs, outputs, locktime=0), pubkey
+
+    def test_sign_and_verify_signatures(self):
+        sec = bytes(range(1, 33))
+        for sign_schnorr in (False, True):
+            tx, pubkey = self._make_unsigned_tx(sec, 3)
+            tx.set_sign_schnorr(sign_schnorr)
+            tx.sign({pubkey: (sec, True)})
+            self.assertTrue(tx.is_complete())
+            triples = []
+            for i, txin in enumerate(tx.inputs()):
+                sig = bytes.fromhex(txin['signatures'][0])[:-1]
+                pre_hash = Hash(bytes.fromhex(tx.serialize_preimage(i)))
+                self.assertEqual(len(sig) == 64, sign_schnorr)
+                triples.append((bytes.fromhex(pubkey), sig, pre_hash))
+            # a signature for the wrong message, and a garbage pubkey
+            triples.append((triples[0][0], triples[0][1], triples[1][2]))
+            triples.append((b'\x02' + b'\xff' * 32, triples[0][1], triples[0][2]))
+            self.assertEqual(transaction.Transaction.verify_signatures(triples),
+                             [True, True, True, False, False])
+        # bad arguments don't raise
+        self.assertEqual(transaction.Transaction.verify_signatures(
+            [(b'', b'x', b'y' * 32), ('x', b'x', b'y' * 32), triples[0]]), [False, False, True])
+        self.assertFalse(transaction.Transaction.verify_signature(b'', b'x', b'y' * 32))
+        self.assertFalse(transaction.Transaction.verify_signature(b'x', b'x', None))
+
+    def test_parallel_sign_matches_serial(self):
+        sec = bytes(range(1, 33))
+        for sign_schnorr in (False, True):
+            serial_tx, pubkey = self._make_unsigned_tx(sec, 6)
+            serial_tx.set_sign_schnorr(sign_schnorr)
+            serial_tx.sign({pubkey: (sec, True)})
+            parallel_tx, pubkey = self._make_unsigned_tx(sec, 6)
+            parallel_tx.set_sign_schnorr(sign_schnorr)
+            parallel_tx.PARALLEL_SIGN_MIN_JOBS = 2
+            parallel_tx.sign({pubkey: (sec, True)}, num_workers=3)
+            self.assertTrue(parallel_tx.is_complete())
+            self.assertEqual(serial_tx.raw, parallel_tx.raw)
+
     def test_tx_nonminimal_scriptSig(self):
         # The nonminimal push is the '4c41...' (PUSHDATA1 length=0x41 [...]) at
         # the start of the scriptSig. Minimal is '41...' (PUSH0x41 [...]).
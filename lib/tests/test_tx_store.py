@@ -0,0 +1,77 @@
+import shutil
+import tempfile
+import unittest
+
+from ..tx_store import TxStore, txid_of_raw
+
+# The store only hashes tx's, so these needn't be real.
+RAW_TX1 = '0100000001d1b8d7b2b8a8a3f2c17bb2ad5de3b0aa50a4aa5e8d4bb42c0f9a6bf38c0bd1b1000000006a47304402205fb52b5f8f2e3bcb6f7d4ee3c7ea6d3b6df0dbd6d7d2bd0a8f7fa4a2cb7e0c4d022034f0f6b9f0b5dd1f1e7c06d0b8e6b7d7a8c2a9c6dce2e1e2d4ab2a6b4d3d0d1e4121030b4c866585dd868a9d62348a9cd008d6a312937048fff31670e7e920cfc7a744ffffffff0150c30000000000001976a914b0e2a1e38b9c77cc3df4e7a7d9a1f26a18a1b2c388ac00000000'
+RAW_TX2 = RAW_TX1[:-8] + '01000000'  # different locktime
+
+
+class TestTxStore(unittest.TestCase):
+
+    def test_put_get(self):
+        store = TxStore()
+        txid = txid_of_raw(bytes.fromhex(RAW_TX1))
+        self.assertIsNone(store.get(txid))
+        self.assertTrue(store.put(RAW_TX1))
+        self.assertEqual(RAW_TX1, store.get(txid))
+        self.assertIn(txid, store)
+        self.assertEqual(1, store.stats()['hits'])
+        self.assertEqual(1, store.stats()['misses'])
+
+    def test_rejects_mismatched_txid(self):
+        store = TxStore()
+        txid2 = txid_of_raw(bytes.fromhex(RAW_TX2))
+        self.assertFalse(store.put(RAW_TX1, txid2))
+        self.assertIsNone(store.get(txid2))
+        self.assertFalse(store.put('not hex'))
+
+    def test_lru_byte_budget(self):
+        store = TxStore(max_bytes=len(RAW_TX1) // 2 + 1)  # room for one tx
+        txid1 = txid_of_raw(bytes.fromhex(RAW_TX1))
+        txid2 = txid_of_raw(bytes.fromhex(RAW_TX2))
+        store.put(RAW_TX1)
+        store.put(RAW_TX2)
+        self.assertIsNone(store.get(txid1))
+        self.assertEqual(RAW_TX2, store.get(txid2))
+
+    def test_disk_tier(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        store = TxStore()
+        store.set_directory(directory)
+        txid = txid_of_raw(bytes.fromhex(RAW_TX1))
+        store.put(RAW_TX1)
+        store.clear()
+        self.assertEqual(RAW_TX1, store.get(txid))
+        # a fresh store sees it too
+        store = TxStore()
+        store.set_directory(directory)
+        self.assertEqual(RAW_TX1, store.get(txid))
+
+    def test_no_disk_writes_for_private_owners(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        store = TxStore()
+        store.set_directory(directory)
+        class Wallet:
+            pass
+        wallet = Wallet()
+        store.add_private_owner(wallet)
+        self.assertTrue(store.stats()['disk_writes_paused'])
+        txid1 = txid_of_raw(bytes.fromhex(RAW_TX1))
+        store.put(RAW_TX1)
+        self.assertEqual(RAW_TX1, store.get(txid1))  # still cached in memory
+        store.clear()
+        self.assertIsNone(store.get(txid1))
+        # writes resume once the wallet is removed, or gone
+        store.remove_private_owner(wallet)
+        store.add_private_owner(wallet)
+        del wallet
+        self.assertFalse(store.stats()['disk_writes_paused'])
+        txid2 = txid_of_raw(bytes.fromhex(RAW_TX2))
+        store.put(RAW_TX2)
+        store.clear()
+        self.assertEqual(RAW_TX2, store.get(txid2))
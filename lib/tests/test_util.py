@@ -1,5 +1,6 @@
+import threading
 import unittest
-from ..util import format_satoshis
+from ..util import format_satoshis, RWLock
 from ..web import parse_URI
 
 class TestUtil(unittest.TestCase):
@@ -110,3 +111,20 @@ class TestUtil(unittest.TestCase):
 
     def test_parse_URI_parameter_polution(self):
         self.assertRaises(Exception, parse_URI, 'bitcoincash:15mKKb2eos1hWa6tisdPwwDC1a5J1y9nma?amount=0.0003&label=test&amount=30.0')
+
+    def test_rwlock(self):
+        lock = RWLock()
+        with lock.read_locked(), lock.read_locked():
+            pass  # readers share the lock
+        events = []
+        def write():
+            with lock.write_locked():
+                events.append('w')
+        with lock.read_locked():
+            writer = threading.Thread(target=write)
+            writer.start()
+            writer.join(0.1)
+            self.assertTrue(writer.is_alive())  # writer waits for the reader
+            events.append('r')
+        writer.join(1)
+        self.assertEqual(['r', 'w'], events)
@@ -0,0 +1,179 @@
+import threading
+import unittest
+
+from .. import networks
+from .. import verifier
+from ..verifier import SPV
+
+
+class _Blockchain:
+    def __init__(self, headers):
+        self.headers = headers
+        self.reads = []
+
+    def read_header(self, height):
+        self.reads.append(height)
+        return self.headers.get(height)
+
+
+class _Interface:
+    def __init__(self, blockchain):
+        self.blockchain = blockchain
+        self.server = 'dummy'
+
+    def print_error(self, *args):
+        pass
+
+
+class _Network:
+    def __init__(self, blockchain, local_height, config=None):
+        self.config = config or {}
+        self.interface = _Interface(blockchain)
+        self._blockchain = blockchain
+        self.local_height = local_height
+        self.merkle_requests = []
+        self.requested_chunks = set()
+
+    def blockchain(self):
+        return self._blockchain
+
+    def get_local_height(self):
+        return self.local_height
+
+    def get_merkle_for_transaction(self, tx_hash, tx_height, callback, max_qlen=10, interface=None):
+        self.merkle_requests.append((tx_hash, tx_height, interface))
+        return len(self.merkle_requests)
+
+    def request_chunk(self, interface, index):
+        if index in self.requested_chunks:
+            return False
+        self.requested_chunks.add(index)
+        return True
+
+
+class _Wallet:
+    def __init__(self, unverified):
+        self.unverified_tx = unverified
+        self.verified = {}
+        self.saves = 0
+
+    def get_unverified_txs(self):
+        return self.unverified_tx.copy()
+
+    def add_verified_tx(self, tx_hash, info):
+        self.unverified_tx.pop(tx_hash, None)
+        self.verified[tx_hash] = info
+
+    def is_up_to_date(self):
+        return True
+
+    def save_verified_tx(self, write=False):
+        self.saves += 1
+
+
+class TestSPV(unittest.TestCase):
+
+    def test_requests_newest_first_within_window(self):
+        headers = {h: {'merkle_root': ''} for h in range(1000, 1010)}
+        blockchain = _Blockchain(headers)
+        network = _Network(blockchain, 2000, {'spv_merkle_window': 3})
+        unverified = {'a': 1001, 'b': 1005, 'c': 1005, 'd': 1003, 'e': 0, 'f': 3000}
+        spv = SPV(network, _Wallet(unverified))
+        spv.run()
+        self.assertEqual([r[0:2] for r in network.merkle_requests],
+                         [('b', 1005), ('c', 1005), ('d', 1003)])
+        self.assertTrue(spv.qbusy)
+        # each block header is read once even though it holds two txs
+        self.assertEqual(blockchain.reads.count(1005), 1)
+        # window is full; nothing more is requested until a response arrives
+        spv.run()
+        self.assertEqual(len(network.merkle_requests), 3)
+        del spv.inflight_merkle['b']
+        spv.run()
+        self.assertEqual(network.merkle_requests[-1][0:2], ('a', 1001))
+
+    def test_unanswered_requests_time_out(self):
+        headers = {h: {'merkle_root': ''} for h in range(1000, 1010)}
+        network = _Network(_Blockchain(headers), 2000, {'spv_merkle_window': 2})
+        spv = SPV(network, _Wallet({'a': 1001, 'b': 1002, 'c': 1003}))
+        spv.run()
+        self.assertEqual([r[0] for r in network.merkle_requests], ['c', 'b'])
+        self.assertTrue(spv.qbusy)
+        # the server never answers 'c'
+        spv.inflight_merkle['c'] -= SPV.MERKLE_TIMEOUT + 1
+        spv.run()
+        self.assertEqual([r[0] for r in network.merkle_requests], ['c', 'b', 'c'])
+        self.assertEqual(set(spv.inflight_merkle), {'b', 'c'})
+
+    def test_prefetches_missing_chunks(self):
+        blockchain = _Blockchain({})
+        network = _Network(blockchain, networks.net.VERIFICATION_BLOCK_HEIGHT,
+                           {'spv_chunk_prefetch': 2, 'spv_multi_server': True})
+        unverified = {'a': 2016 * 1 + 5, 'b': 2016 * 1 + 7, 'c': 2016 * 3, 'd': 2016 * 5}
+        spv = SPV(network, _Wallet(unverified))
+        spv.run()
+        self.assertEqual(network.merkle_requests, [])
+        self.assertEqual(network.requested_chunks, {5, 3})
+        network.requested_chunks.clear()
+        blockchain.headers.update({2016 * 5: {}, 2016 * 3: {}})
+        spv.run()
+        self.assertEqual(network.requested_chunks, {1})
+        self.assertEqual(network.merkle_requests, [('d', 2016 * 5, 'random'), ('c', 2016 * 3, 'random')])
+
+    def test_uses_proofs_verified_by_other_wallets(self):
+        headers = {1000: {'merkle_root': 'root', 'timestamp': 1234}, 1001: {'merkle_root': 'other'}}
+        network = _Network(_Blockchain(headers), 2000)
+        network.trigger_callback = lambda *args: None
+        verifier._verified_proofs.put('a', (1000, 5, 'root'))
+        verifier._verified_proofs.put('b', (1001, 1, 'stale root'))
+        wallet = _Wallet({'a': 1000, 'b': 1001})
+        spv = SPV(network, wallet)
+        spv.run()
+        self.assertEqual(wallet.verified, {'a': (1000, 1234, 5)})
+        self.assertEqual([r[0:2] for r in network.merkle_requests], [('b', 1001)])
+        # nothing is saved until the last proof arrives
+        self.assertEqual(wallet.saves, 0)
+
+
+class TestVerifiedTxIndex(unittest.TestCase):
+
+    def test_add_remove(self):
+        index = verifier.VerifiedTxIndex({'a': (100, 1, 0), 'b': [105, 2, 1]})
+        index.add('c', 105)
+        index.add('d', 110)
+        self.assertEqual(index.at_or_above(101), [(105, {'b', 'c'}), (110, {'d'})])
+        index.add('d', 103)  # moved by a reorg
+        index.remove('b')
+        index.remove('nope')
+        self.assertEqual(index.at_or_above(0), [(100, {'a'}), (103, {'d'}), (105, {'c'})])
+        index.remove('c')
+        self.assertEqual(index.heights, [100, 103])
+        self.assertEqual(len(index), 2)
+        self.assertEqual(index.at_or_above(104), [])
+
+    def test_wallet_undo_reads_only_blocks_above_fork(self):
+        from ..wallet import Abstract_Wallet
+        from ..history_index import HistoryIndex
+        class W:
+            lock = threading.RLock()
+            verified_tx = {'a%d' % h: (h, h, 0) for h in range(1000, 1100)}
+            _verified_index = verifier.VerifiedTxIndex(verified_tx)
+            _history_index = HistoryIndex(lambda tx_hash: None, lambda: ())
+            _addr_bal_cache = {}
+        # headers 1095 and up were replaced by a fork, with other timestamps
+        headers = {h: {'timestamp': h if h < 1095 else 0} for h in range(1000, 1100)}
+        blockchain = _Blockchain(headers)
+        txs = Abstract_Wallet.undo_verifications(W, blockchain, 1090)
+        self.assertEqual(txs, {'a%d' % h for h in range(1095, 1100)})
+        self.assertEqual(blockchain.reads, list(range(1090, 1100)))
+        self.assertEqual(len(W.verified_tx), 95)
+        self.assertEqual(W._verified_index.heights[-1], 1094)
+
+        # tx's the index still has but verified_tx doesn't are just dropped
+        W.verified_tx.pop('a1093')
+        self.assertEqual(Abstract_Wallet.undo_verifications(W, blockchain, 1090), set())
+        self.assertEqual(len(W._verified_index), 94)
+
+
+if __name__ == '__main__':
+    unittest.main()
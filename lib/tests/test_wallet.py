@@ -6,7 +6,9 @@ import os
 import json
 
 from io import StringIO
+from ..bitcoin import int_to_hex, serialize_privkey, var_int
 from ..storage import WalletStorage, FINAL_SEED_VERSION
+from ..transaction import Transaction
 from .. import wallet
 
 
@@ -68,3 +70,192 @@ class TestWalletStorage(WalletTestCase):
         with open(self.wallet_path, "r") as f:
             contents = f.read()
         self.assertEqual(some_dict, json.loads(contents))
+
+    def read_file(self):
+        with open(self.wallet_path, "r") as f:
+            return f.read()
+
+    def test_write_only_reserializes_changed_keys(self):
+        storage = WalletStorage(self.wallet_path)
+        storage.put("txi", {"ab": {"addr": [["ab:0", 5]]}, "cd": {}})
+        storage.put("labels", {"x": "y"})
+        storage.put("verified_tx3", {"ab": (100, 1234, 5)})
+        storage.write()
+        self.assertEqual(self.read_file(), json.dumps(storage.data, indent=4, sort_keys=True))
+
+        # unchanged values are a no-op
+        storage.put("labels", {"x": "y"})
+        self.assertFalse(storage._dirty)
+        storage.put("labels", {"x": "z"})
+        storage.put("txi", None)
+        self.assertEqual(storage._dirty, {"labels"})
+        storage.write()
+        self.assertEqual(self.read_file(), json.dumps(storage.data, indent=4, sort_keys=True))
+        self.assertNotIn("txi", json.loads(self.read_file()))
+
+        # a value that can't be serialized isn't saved
+        storage.put("bad", {"x": object()})
+        storage.write()
+        self.assertNotIn("bad", json.loads(self.read_file()))
+        self.assertIsNone(storage.get("bad"))
+
+        # ... and doesn't lose the key's last saved value either
+        storage.put("labels", {"x": object()})
+        storage.write()
+        self.assertEqual(storage.get("labels"), {"x": "z"})
+
+        storage = WalletStorage(self.wallet_path)
+        self.assertEqual(storage.get("labels"), {"x": "z"})
+
+    def test_write_copied_data(self):
+        # as WalletStorage.split_accounts does
+        storage = WalletStorage(self.wallet_path)
+        storage.put("keystore", {"type": "bip32"})
+        storage.put("addresses", {"receiving": ["a"]})
+        storage.write()
+        path2 = self.wallet_path + ".0"
+        storage2 = WalletStorage(path2)
+        storage2.write()
+        storage2.data = json.loads(json.dumps(storage.data))
+        storage2.put("accounts", {"0": {}})
+        storage2.write()
+        with open(path2, "r") as f:
+            self.assertEqual(json.loads(f.read()), dict(storage.data, accounts={"0": {}}))
+
+    def test_write_soon_coalesces_writes(self):
+        storage = WalletStorage(self.wallet_path)
+        storage.WRITE_DELAY = 0.05
+        writes = []
+        write_file = storage._write_file
+        storage._write_file = lambda s: writes.append(s) or write_file(s)
+        for n in range(5):
+            storage.put("n", n)
+            storage.write_soon()
+        timer = storage._write_timer
+        timer.join(timeout=5)
+        self.assertEqual(len(writes), 1)
+        self.assertEqual(json.loads(self.read_file())["n"], 4)
+        # write() does a pending write at once
+        storage.put("n", 5)
+        storage.write_soon()
+        timer = storage._write_timer
+        storage.write()
+        timer.join(timeout=5)
+        self.assertEqual(len(writes), 2)
+        self.assertEqual(json.loads(self.read_file())["n"], 5)
+
+
+class TestWalletLoadTimings(WalletTestCase):
+
+    def test_load_timings(self):
+        storage = WalletStorage(self.wallet_path)
+        wallet.ImportedAddressWallet.from_text(storage, '1KXrWXciRDZUpQwQmuM1DbwsKDLYAYsVLR')
+        storage.write()
+
+        storage = WalletStorage(self.wallet_path)
+        w = wallet.ImportedAddressWallet(storage)
+        timings = w.get_load_timings()
+        for phase in ('storage', 'keystore', 'addresses', 'transactions',
+                      'reverse_history', 'check_history', 'init'):
+            self.assertIn(phase, timings)
+        self.assertTrue(all(t >= 0 for t in timings.values()))
+        self.assertGreaterEqual(timings['init'], timings['transactions'])
+
+
+class TestSaveTransactions(WalletTestCase):
+
+    def saved(self, w, key):
+        return json.loads(json.dumps(w.storage.get(key, {})))
+
+    def expected(self, d):
+        return json.loads(json.dumps({tx_hash: wallet.Abstract_Wallet.from_Address_dict(value)
+                                      for tx_hash, value in d.items() if value}))
+
+    def test_only_changed_entries_are_converted(self):
+        storage = WalletStorage(self.wallet_path)
+        w = wallet.ImportedAddressWallet.from_text(storage, '1KXrWXciRDZUpQwQmuM1DbwsKDLYAYsVLR')
+        addr = w.get_addresses()[0]
+        with w.lock:
+            w.txo['aa'] = {addr: [(0, 5, False)]}
+            w.txi['bb'] = {addr: [('aa:0', 5)]}
+            w.txo['bb'] = {addr: [(1, 3, False)]}
+            w.txo['cc'] = {addr: [(0, 7, False)]}
+            for tx_hash in ('aa', 'bb', 'cc'):
+                w._tx_unsaved(tx_hash)
+        w.save_transactions()
+        self.assertEqual(self.saved(w, 'txi'), self.expected(w.txi))
+        self.assertEqual(self.saved(w, 'txo'), self.expected(w.txo))
+        saved_txo = w.storage.data['txo']
+
+        # removing 'aa' takes its output out of the txi of 'bb' too
+        w.remove_transaction('aa')
+        self.assertEqual(w._unsaved_txs, {'aa', 'bb'})
+        w.save_transactions()
+        self.assertEqual(self.saved(w, 'txi'), {})
+        self.assertEqual(self.saved(w, 'txo'), self.expected(w.txo))
+        # the unchanged entry was reused, and the dict put before not touched
+        self.assertIs(w.storage.data['txo']['cc'], saved_txo['cc'])
+        self.assertIn('aa', saved_txo)
+
+        # storage doesn't share the wallet's lists
+        w.txo['bb'][addr].append((2, 1, False))
+        self.assertEqual(len(w.storage.data['txo']['bb'][addr.to_storage_string()]), 1)
+
+        # nothing changed: nothing put
+        storage.modified = False
+        w.save_transactions()
+        self.assertFalse(storage.modified)
+
+
+class TestActivateSlp(unittest.TestCase):
+
+    def test_validation_is_started_in_batches(self):
+        holds = []
+        class Lock:
+            def __enter__(self):
+                holds.append([])
+            def __exit__(self, *args):
+                pass
+        class W(wallet.Abstract_Wallet):
+            ACTIVATE_SLP_BATCH = 10
+            def __init__(self):
+                self.lock = Lock()
+                self.transactions = {'tx%d' % i: object() for i in range(25)}
+                self.tx_tokinfo = {tx_hash: {'validity': 0} for tx_hash in self.transactions}
+                self.tx_tokinfo['tx3'] = {'validity': 1}
+                self.tx_tokinfo['tx4'] = {}
+                self.tx_tokinfo['gone'] = {'validity': 0}
+            def slp_check_validation(self, tx_hash, tx):
+                holds[-1].append(tx_hash)
+        W().activate_slp()
+        # one hold to list the unvalidated tx's, then one per batch
+        self.assertEqual([len(h) for h in holds], [0, 10, 10, 3])
+        checked = [tx_hash for h in holds for tx_hash in h]
+        self.assertEqual(set(checked), {'tx%d' % i for i in range(25)} - {'tx3', 'tx4'})
+
+
+class TestExportHistory(WalletTestCase):
+
+    def test_unconfirmed_tx(self):
+        wif = serialize_privkey(bytes([1] * 32), True, 'p2pkh')
+        w = wallet.ImportedPrivkeyWallet.from_text(WalletStorage(self.wallet_path), wif)
+        addr = w.get_addresses()[0]
+        script = addr.to_script()
+        tx = Transaction('01000000' + '01' + 'ab' * 32 + int_to_hex(0, 4) + '00' + 'ffffffff' + '01'
+                         + int_to_hex(100000, 8) + var_int(len(script)) + script.hex() + '00000000')
+        w.receive_history_callback(addr, [(tx.txid(), 0)], {})
+        w.receive_tx_callback(tx.txid(), tx, 0)
+        items = list(w.export_history_iter())
+        self.assertEqual([item['txid'] for item in items], [tx.txid()])
+        self.assertEqual(items[0]['date'], 'unconfirmed')
+
+
+class TestInvoices(WalletTestCase):
+
+    def test_loaded_on_first_use(self):
+        wif = serialize_privkey(bytes([1] * 32), True, 'p2pkh')
+        w = wallet.ImportedPrivkeyWallet.from_text(WalletStorage(self.wallet_path), wif)
+        self.assertNotIn('invoices', vars(w))
+        self.assertIs(w.invoices, w.invoices)
+        self.assertEqual(list(w.invoices.sorted_list()), [])
+
@@ -0,0 +1,76 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+import requests
+
+from .. import rsakey, x509
+
+
+class TestCAIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.index_path = os.path.join(self.tmpdir, 'ca_index.json')
+        self.ca_path = requests.certs.where()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_matches_load_certificates(self):
+        ca_list, ca_keyID = x509.load_certificates(self.ca_path)
+        index = x509.CAIndex(self.ca_path, self.index_path)
+        self.assertTrue(os.path.exists(self.index_path))
+        # a second index is loaded from disk and parses nothing up front
+        loaded = x509.CAIndex(self.ca_path, self.index_path)
+        self.assertEqual(loaded.certs, {})
+        for idx in (index, loaded):
+            for fp, x in ca_list.items():
+                self.assertIn(fp, idx)
+                self.assertEqual(idx[fp].bytes, x.bytes)
+            for keyID, fp in ca_keyID.items():
+                self.assertEqual(idx.get(idx.get_by_keyID(keyID)).get_keyID(), keyID)
+        self.assertNotIn(b'\0' * 20, loaded)
+
+    def test_stale_index(self):
+        x509.CAIndex(self.ca_path, self.index_path)
+        bundle = os.path.join(self.tmpdir, 'bundle.pem')
+        shutil.copy(self.ca_path, bundle)
+        with open(self.index_path) as f:
+            stale = f.read().replace(self.ca_path.replace('\\', '\\\\'), bundle)
+        with open(self.index_path, 'w') as f:
+            f.write(stale)
+        with open(bundle, 'a') as f:
+            f.write('\n')  # changes the size, so the saved index is ignored
+        index = x509.CAIndex(bundle, self.index_path)
+        self.assertTrue(index.certs)
+
+
+class TestRSAKey(unittest.TestCase):
+
+    def test_converters(self):
+        for n in (0, 1, 255, 256, 2**64 + 3):
+            b = rsakey.numberToByteArray(n)
+            self.assertEqual(rsakey.bytesToNumber(b), n)
+            self.assertEqual(len(b), rsakey.numBytes(n))
+        self.assertEqual(rsakey.numberToByteArray(0x1234, 4), bytearray(b'\0\0\x12\x34'))
+        # excess high-order bytes are dropped
+        self.assertEqual(rsakey.numberToByteArray(0x123456, 2), bytearray(b'\x34\x56'))
+
+    def test_sign_verify(self):
+        key = rsakey.RSAKey.generate(512)
+        pubkey = rsakey.RSAKey(key.n, key.e)
+        msg = b'payment request'
+        sig = key.hashAndSign(msg)
+        self.assertTrue(pubkey.hashAndVerify(sig, msg))
+        self.assertFalse(pubkey.hashAndVerify(sig, msg + b'!'))
+        digest = bytearray(hashlib.sha256(msg).digest())
+        sig = key.sign(x509.PREFIX_RSA_SHA256 + digest)
+        self.assertTrue(pubkey.verify(sig, x509.PREFIX_RSA_SHA256 + digest))
+        self.assertFalse(pubkey.verify(sig[:-1], x509.PREFIX_RSA_SHA256 + digest))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -28,13 +28,14 @@
 # Note: The deserialization code originally comes from ABE.
 
 from .util import print_error, profiler
-from .caches import ExpiringCache
+from . import tx_store
 
 from .bitcoin import *
 from .address import (PublicKey, Address, Script, ScriptOutput, hash160,
                       UnknownAddress, OpCodes as opcodes,
                       P2PKH_prefix, P2PKH_suffix, P2SH_prefix, P2SH_suffix)
 from . import schnorr
+from . import ecc_fast
 from . import util
 import struct
 import warnings
@@ -515,6 +516,7 @@ class Transaction:
             raise Exception('API changed: update_signatures expects a list.')
         if len(self.inputs()) != len(signatures):
             raise Exception('expected {} signatures; got {}'.format(len(self.inputs()), len(signatures)))
+        pending = []
         for i, txin in enumerate(self.inputs()):
             pubkeys, x_pubkeys = self.get_sorted_pubkeys(txin)
             sig = signatures[i]
@@ -526,16 +528,26 @@ class Transaction:
                 # skip if we already have this signature
                 continue
             pre_hash = Hash(bfh(self.serialize_preimage(i)))
-            sig_bytes = bfh(sig)
+            pending.append((i, pubkeys, sig, pre_hash))
+        # Verify every (input, candidate pubkey) pair in one batch
+        triples = [(bfh(pubkey), bfh(sig), pre_hash)
+                   for i, pubkeys, sig, pre_hash in pending
+                   for pubkey in pubkeys]
+        results = iter(self.verify_signatures(triples))
+        for i, pubkeys, sig, pre_hash in pending:
+            sig_final = sig + '41'
             added = False
-            reason = []
             for j, pubkey in enumerate(pubkeys):
                 # see which pubkey matches this sig (in non-multisig only 1 pubkey, in multisig may be multiple pubkeys)
-                if self.verify_signature(bfh(pubkey), sig_bytes, pre_hash, reason):
+                if next(results):
                     print_error("adding sig", i, j, pubkey, sig_final)
                     self._inputs[i]['signatures'][j] = sig_final
                     added = True
             if not added:
+                # slow path, just to find out why
+                reason = []
+                for pubkey in pubkeys:
+                    self.verify_signature(bfh(pubkey), bfh(sig), pre_hash, reason)
                 resn = ', '.join(reversed(reason)) if reason else ''
                 print_error("failed to add signature {} for any pubkey for reason(s): '{}' ; pubkey(s) / sig / pre_hash = ".format(i, resn),
                             pubkeys, '/', sig, '/', bh2u(pre_hash))
@@ -908,17 +920,25 @@ class Transaction:
     def verify_signature(pubkey, sig, msghash, reason=None):
         ''' Given a pubkey (bytes), signature (bytes -- without sighash byte),
         and a sha256d message digest, returns True iff the signature is good
-        for the given public key, False otherwise.  Does not raise normally
-        unless given bad or garbage arguments.
+        for the given public key, False otherwise (including for empty or
+        non-bytes arguments).
 
         Optional arg 'reason' should be a list which will have a string pushed
         at the front (failure reason) on False return. '''
         if (any(not arg or not isinstance(arg, bytes) for arg in (pubkey, sig, msghash))
                 or len(msghash) != 32):
-            raise ValueError('bad arguments to verify_signature')
+            if isinstance(reason, list):
+                reason.insert(0, 'bad arguments to verify_signature')
+            return False
         if len(sig) == 64:
             # Schnorr signatures are always exactly 64 bytes
-            return schnorr.verify(pubkey, sig, msghash)
+            try:
+                return schnorr.verify(pubkey, sig, msghash)
+            except ValueError as e:
+                # schnorr.verify raises on unparseable pubkeys
+                if isinstance(reason, list):
+                    reason.insert(0, repr(e))
+                return False
         else:
             from ecdsa import BadSignatureError, BadDigestError
             from ecdsa.der import UnexpectedDER
@@ -940,65 +960,136 @@ class Transaction:
                     reason.insert(0, repr(e))
             return False
 
+    @classmethod
+    def verify_signatures(cls, triples):
+        ''' Batch version of verify_signature. Given an iterable of
+        (pubkey, sig, msghash) bytes triples, returns a list of bools, one per
+        triple. Uses libsecp256k1 directly if available, otherwise falls back
+        to calling verify_signature on each triple. Never raises; bad
+        signatures, pubkeys or arguments just yield False. '''
+        triples = list(triples)
+        good = [i for i, triple in enumerate(triples)
+                if all(arg and isinstance(arg, bytes) for arg in triple)
+                and len(triple[2]) == 32]
+        results = [False] * len(triples)
+        good_results = ecc_fast.verify_batch([triples[i] for i in good])
+        if good_results is None:
+            good_results = [cls.verify_signature(*triples[i]) for i in good]
+        for i, result in zip(good, good_results):
+            results[i] = result
+        return results
 
     @staticmethod
     def _ecdsa_sign(sec, pre_hash):
+        ''' Note: the resulting signature is not verified here; callers are
+        expected to check it with verify_signature(s). '''
         pkey = regenerate_key(sec)
         secexp = pkey.secret
         private_key = MySigningKey.from_secret_exponent(secexp, curve = SECP256k1)
-        public_key = private_key.get_verifying_key()
-        sig = private_key.sign_digest_deterministic(pre_hash, hashfunc=hashlib.sha256, sigencode = ecdsa.util.sigencode_der)
-        assert public_key.verify_digest(sig, pre_hash, sigdecode = ecdsa.util.sigdecode_der)
-        return sig
+        return private_key.sign_digest_deterministic(pre_hash, hashfunc=hashlib.sha256, sigencode = ecdsa.util.sigencode_der)
 
     @staticmethod
     def _schnorr_sign(pubkey, sec, pre_hash):
-        pubkey = bytes.fromhex(pubkey)
-        sig = schnorr.sign(sec, pre_hash)
-        assert schnorr.verify(pubkey, sig, pre_hash)  # verify what we just signed
-        return sig
-
+        ''' Note: the resulting signature is not verified here; callers are
+        expected to check it with verify_signature(s). '''
+        return schnorr.sign(sec, pre_hash)
+
+
+    # Transaction.sign only uses worker processes if there are at least this
+    # many signatures to make; below that the process startup isn't worth it.
+    PARALLEL_SIGN_MIN_JOBS = 64
+
+    def sign(self, keypairs, *, use_cache=False, num_workers=0):
+        ''' Sign all inputs we have keys for in `keypairs`.
+
+        If `num_workers` > 1 and there are many inputs to sign, the signatures
+        are computed in that many worker processes. The common sighash is
+        computed once up front in that case (as if `use_cache` were True).
+        Since signing is deterministic the result is identical to signing
+        serially. '''
+        jobs = self._get_sign_jobs(keypairs)
+        for i, j, _pubkey, kname in jobs:
+            print_error(f"adding signature for input#{i} sig#{j}; {kname}: {_pubkey} schnorr: {self._sign_schnorr}")
+        if num_workers > 1 and len(jobs) >= self.PARALLEL_SIGN_MIN_JOBS:
+            self.calc_common_sighash(use_cache=True)
+            nHashType = 0x00000041
+            pre_hashes = [Hash(bfh(self.serialize_preimage(i, nHashType, use_cache=True)))
+                          for i, j, _pubkey, kname in jobs]
+            work = [keypairs[_pubkey] + (pre_hash,)
+                    for (i, j, _pubkey, kname), pre_hash in zip(jobs, pre_hashes)]
+            results = util.process_pool_map(_sign_digests, (self._sign_schnorr,), work, num_workers)
+            made = [(pubkey, sig, pre_hash)
+                    for (pubkey, sig), pre_hash in zip(results, pre_hashes)]
+        else:
+            made = []
+            for i, j, _pubkey, kname in jobs:
+                sec, compressed = keypairs.get(_pubkey)
+                made.append(self._make_txin_sig(i, sec, compressed, use_cache=use_cache))
+        signed = []  # (i, j, txin_backup, pubkey, sig, pre_hash)
+        for (i, j, _pubkey, kname), (pubkey, sig, pre_hash) in zip(jobs, made):
+            txin = self._inputs[i]
+            backup = (txin['signatures'][j], txin['pubkeys'][j])
+            self._add_txin_sig(i, j, pubkey, sig)
+            signed.append((i, j, backup, pubkey, sig, pre_hash))
+        # Verify everything we just signed in one go, and take back any
+        # signature that didn't check out.
+        results = self.verify_signatures((bfh(pubkey), sig, pre_hash)
+                                         for i, j, backup, pubkey, sig, pre_hash in signed)
+        for (i, j, backup, *_), ok in zip(signed, results):
+            if not ok:
+                print_error(f"Signature verification failed for input#{i} sig#{j}")
+                self._inputs[i]['signatures'][j], self._inputs[i]['pubkeys'][j] = backup
+        print_error("is_complete", self.is_complete())
+        self.raw = self.serialize()
 
-    def sign(self, keypairs, *, use_cache=False):
+    def _get_sign_jobs(self, keypairs):
+        ''' Returns a list of (input_index, sig_index, keypairs_key, kname)
+        for every signature we can make with `keypairs`, stopping for each
+        input once it would have enough signatures. '''
+        jobs = []
         for i, txin in enumerate(self.inputs()):
+            if self.is_txin_complete(txin):
+                continue
             pubkeys, x_pubkeys = self.get_sorted_pubkeys(txin)
+            num_sig = txin.get('num_sig', 1)
+            have = len(list(filter(None, txin['signatures'])))
             for j, (pubkey, x_pubkey) in enumerate(zip(pubkeys, x_pubkeys)):
-                if self.is_txin_complete(txin):
-                    # txin is complete
+                if have >= num_sig:
+                    # txin will be complete
                     break
                 if pubkey in keypairs:
-                    _pubkey = pubkey
-                    kname = 'pubkey'
+                    jobs.append((i, j, pubkey, 'pubkey'))
                 elif x_pubkey in keypairs:
-                    _pubkey = x_pubkey
-                    kname = 'x_pubkey'
+                    jobs.append((i, j, x_pubkey, 'x_pubkey'))
                 else:
                     continue
-                print_error(f"adding signature for input#{i} sig#{j}; {kname}: {_pubkey} schnorr: {self._sign_schnorr}")
-                sec, compressed = keypairs.get(_pubkey)
-                self._sign_txin(i, j, sec, compressed, use_cache=use_cache)
-        print_error("is_complete", self.is_complete())
-        self.raw = self.serialize()
+                if not txin['signatures'][j]:
+                    have += 1
+        return jobs
 
-    def _sign_txin(self, i, j, sec, compressed, *, use_cache=False):
-        '''Note: precondition is self._inputs is valid (ie: tx is already deserialized)'''
-        pubkey = public_key_from_private_key(sec, compressed)
-        # add signature
+    def _make_txin_sig(self, i, sec, compressed, *, use_cache=False):
+        ''' Returns a (pubkey_hex, sig_bytes, pre_hash) tuple for input i.
+        The signature is not verified. '''
         nHashType = 0x00000041 # hardcoded, perhaps should be taken from unsigned input dict
         pre_hash = Hash(bfh(self.serialize_preimage(i, nHashType, use_cache=use_cache)))
-        if self._sign_schnorr:
-            sig = self._schnorr_sign(pubkey, sec, pre_hash)
-        else:
-            sig = self._ecdsa_sign(sec, pre_hash)
-        reason = []
-        if not self.verify_signature(bfh(pubkey), sig, pre_hash, reason=reason):
-            print_error(f"Signature verification failed for input#{i} sig#{j}, reason: {str(reason)}")
-            return None
+        return _sign_digests(self._sign_schnorr, [(sec, compressed, pre_hash)])[0] + (pre_hash,)
+
+    def _add_txin_sig(self, i, j, pubkey, sig):
+        nHashType = 0x00000041
         txin = self._inputs[i]
         txin['signatures'][j] = bh2u(sig + bytes((nHashType & 0xff,)))
         txin['pubkeys'][j] = pubkey # needed for fd keys
         return txin
 
+    def _sign_txin(self, i, j, sec, compressed, *, use_cache=False):
+        '''Note: precondition is self._inputs is valid (ie: tx is already deserialized)'''
+        pubkey, sig, pre_hash = self._make_txin_sig(i, sec, compressed, use_cache=use_cache)
+        reason = []
+        if not self.verify_signature(bfh(pubkey), sig, pre_hash, reason=reason):
+            print_error(f"Signature verification failed for input#{i} sig#{j}, reason: {str(reason)}")
+            return None
+        return self._add_txin_sig(i, j, pubkey, sig)
+
     def get_outputs(self):
         """convert pubkeys to addresses"""
         o = []
@@ -1029,21 +1120,6 @@ class Transaction:
         }
         return out
 
-    # This cache stores foreign (non-wallet) tx's we fetched from the network
-    # for the purposes of the "fetch_input_data" mechanism. Its max size has
-    # been thoughtfully calibrated to provide a decent tradeoff between
-    # memory consumption and UX.
-    #
-    # In even aggressive/pathological cases this cache won't ever exceed
-    # 100MB even when full. [see ExpiringCache.size_bytes() to test it].
-    # This is acceptable considering this is Python + Qt and it eats memory
-    # anyway.. and also this is 2019 ;). Note that all tx's in this cache
-    # are in the non-deserialized state (hex encoded bytes only) as a memory
-    # savings optimization.  Please maintain that invariant if you modify this
-    # code, otherwise the cache may grow to 10x memory consumption if you
-    # put deserialized tx's in here.
-    _fetched_tx_cache = ExpiringCache(maxlen=1000, name="TransactionFetchCache")
-
     def fetch_input_data(self, wallet, done_callback=None, done_args=tuple(),
                          prog_callback=None, *, force=False, use_network=True):
         '''
@@ -1326,25 +1402,37 @@ class Transaction:
 
     @classmethod
     def tx_cache_get(cls, txid : str) -> object:
-        ''' Attempts to retrieve txid from the tx cache that this class
-        keeps in-memory.  Returns None on failure. The returned tx is
-        not deserialized, and is a copy of the one in the cache. '''
-        tx = cls._fetched_tx_cache.get(txid)
-        if tx is not None and tx.raw:
-            # make sure to return a copy of the transaction from the cache
-            # so that if caller does .deserialize(), *his* instance will
-            # use up 10x memory consumption, and not the cached instance which
-            # should just be an undeserialized raw tx.
-            return Transaction(tx.raw)
+        ''' Attempts to retrieve txid from the app-wide tx store (see
+        tx_store.py).  Returns None on failure. The returned tx is
+        not deserialized. '''
+        raw = tx_store.shared_store.get(txid)
+        if raw:
+            return Transaction(raw)
         return None
 
     @classmethod
     def tx_cache_put(cls, tx : object, txid : str = None):
-        ''' Puts a non-deserialized copy of tx into the tx_cache. '''
+        ''' Puts the raw bytes of tx into the tx_cache (the app-wide
+        tx_store.shared_store). If txid is specified, the tx is only cached if
+        it matches. '''
         if not tx or not tx.raw:
             raise ValueError('Please pass a tx which has a valid .raw attribute!')
-        txid = txid or cls._txid(tx.raw)  # optionally, caller can pass-in txid to save CPU time for hashing
-        cls._fetched_tx_cache.put(txid, Transaction(tx.raw))
+        tx_store.shared_store.put(tx.raw, txid)
+
+
+def _sign_digests(sign_schnorr, jobs):
+    ''' Given a list of (sec, compressed, pre_hash) tuples, returns a list of
+    (pubkey_hex, sig_bytes). Module-level so that it may also be run in a
+    worker process, see Transaction.sign. '''
+    results = []
+    for sec, compressed, pre_hash in jobs:
+        pubkey = public_key_from_private_key(sec, compressed)
+        if sign_schnorr:
+            sig = Transaction._schnorr_sign(pubkey, sec, pre_hash)
+        else:
+            sig = Transaction._ecdsa_sign(sec, pre_hash)
+        results.append((pubkey, sig))
+    return results
 
 
 def tx_from_str(txt):
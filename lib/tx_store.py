@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+#
+# Electron Cash - A Bitcoin Cash SPV Wallet
+# License: MIT License
+#
+'''
+An app-wide, content-addressed store of raw transactions.
+
+Many parts of the app download the same transactions over and over: the
+fetch_input_data mechanism, the SLP validator, graph search and the
+synchronizers of every open wallet. They all share the `shared_store`
+instance here so that a tx downloaded once is available to all of them.
+'''
+import hashlib
+import os
+import threading
+import weakref
+from collections import OrderedDict
+
+from .util import PrintError
+
+
+def txid_of_raw(raw: bytes) -> str:
+    ''' The txid (hex) of raw tx bytes. '''
+    return hashlib.sha256(hashlib.sha256(raw).digest()).digest()[::-1].hex()
+
+
+class TxStore(PrintError):
+    ''' A store of txid -> raw tx. Every tx put in the store is checked
+    against its txid, so it may safely be filled with server replies.
+
+    Transactions are kept in memory in an LRU cache holding up to `max_bytes`
+    of raw tx data. Optionally (see `set_directory`), they are also written
+    to disk, one file per tx, so that they survive across restarts and LRU
+    eviction. The files aren't encrypted, so nothing is written to disk while
+    a wallet with encrypted storage is open (see `add_private_owner`).
+
+    get() and put() take and return raw tx's as hex strings, as used by the
+    Transaction class. Internally, tx's are held as bytes to save memory. '''
+
+    def __init__(self, *, max_bytes=32*1024*1024, name="TxStore"):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.mem = OrderedDict()  # txid -> raw bytes, least recently used first
+        self.mem_bytes = 0
+        self.directory = None
+        self.private_owners = weakref.WeakSet()
+        self.hits = self.misses = 0
+
+    def diagnostic_name(self):
+        return self.name
+
+    def set_directory(self, directory):
+        ''' Enable (or with None, disable) the on-disk tier, under
+        `directory`. '''
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+
+    def add_private_owner(self, owner):
+        ''' Stop writing tx's to disk while `owner` (a wallet with encrypted
+        storage, whose tx's flow through the store) is alive and not removed
+        with `remove_private_owner`. Reading from disk goes on. '''
+        with self.lock:
+            self.private_owners.add(owner)
+
+    def remove_private_owner(self, owner):
+        with self.lock:
+            self.private_owners.discard(owner)
+
+    def _path(self, txid):
+        return os.path.join(self.directory, txid[:2], txid)
+
+    def __contains__(self, txid):
+        with self.lock:
+            if txid in self.mem:
+                return True
+        return bool(self.directory) and os.path.exists(self._path(txid))
+
+    def get(self, txid: str):
+        ''' Returns the raw tx hex for `txid`, or None if not in the store. '''
+        with self.lock:
+            raw = self.mem.get(txid)
+            if raw is not None:
+                self.mem.move_to_end(txid)
+                self.hits += 1
+                return raw.hex()
+        raw = self.directory and self._read(txid)
+        with self.lock:
+            if not raw:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._put_mem(txid, raw)
+        return raw.hex()
+
+    def put(self, raw, txid: str = None) -> bool:
+        ''' Adds raw tx (hex string or bytes) to the store. If `txid` is
+        specified, the tx is only added if it matches. Returns True if the tx
+        was added (or was already present). '''
+        if isinstance(raw, str):
+            try:
+                raw = bytes.fromhex(raw)
+            except ValueError:
+                return False
+        if not raw:
+            return False
+        actual_txid = txid_of_raw(raw)
+        if txid is not None and txid != actual_txid:
+            self.print_error("rejecting tx with mismatched txid", txid)
+            return False
+        with self.lock:
+            if actual_txid in self.mem:
+                self.mem.move_to_end(actual_txid)
+                return True
+            self._put_mem(actual_txid, raw)
+            write = self.directory and not self.private_owners
+        if write:
+            self._write(actual_txid, raw)
+        return True
+
+    def _put_mem(self, txid, raw):
+        # call with lock held
+        self.mem[txid] = raw
+        self.mem_bytes += len(raw)
+        while self.mem_bytes > self.max_bytes and len(self.mem) > 1:
+            _, old = self.mem.popitem(last=False)
+            self.mem_bytes -= len(old)
+
+    def _read(self, txid):
+        try:
+            with open(self._path(txid), 'rb') as f:
+                raw = f.read()
+        except OSError:
+            return None
+        if txid_of_raw(raw) != txid:
+            self.print_error("corrupt tx file, ignoring", txid)
+            return None
+        return raw
+
+    def _write(self, txid, raw):
+        path = self._path(txid)
+        if os.path.exists(path):
+            return
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = path + '.tmp{}'.format(threading.get_ident())
+            with open(tmp, 'wb') as f:
+                f.write(raw)
+            os.replace(tmp, path)
+        except OSError as e:
+            self.print_error("could not write tx to disk:", repr(e))
+
+    def clear(self):
+        ''' Clears the in-memory tier. '''
+        with self.lock:
+            self.mem.clear()
+            self.mem_bytes = 0
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                'count': len(self.mem),
+                'bytes': self.mem_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'directory': self.directory,
+                'disk_writes_paused': bool(self.private_owners),
+            }
+
+
+# App-wide instance. The on-disk tier is enabled by the Network if the
+# 'tx_store_on_disk' config key is set.
+shared_store = TxStore()
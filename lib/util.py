@@ -27,6 +27,7 @@ from collections import defaultdict
 from datetime import datetime
 from decimal import Decimal as PyDecimal  # Qt 5.12 also exports Decimal
 import decimal  # for SLP-specific function format_satoshis_plain_nofloat
+from contextlib import contextmanager
 from functools import lru_cache
 import traceback
 import threading
@@ -53,6 +54,13 @@ def _(message): return message
 
 fee_levels = [_('Within 25 blocks'), _('Within 10 blocks'), _('Within 5 blocks'), _('Within 2 blocks'), _('In the next block')]
 
+# status of payment requests (here rather than in paymentrequest.py, which is
+# slow to import)
+PR_UNPAID  = 0
+PR_EXPIRED = 1
+PR_UNKNOWN = 2     # sent but not propagated
+PR_PAID    = 3     # send and propagated
+
 del _
 from .i18n import _, ngettext
 
@@ -283,6 +291,65 @@ class Monotonic:
                 with lock: return incr()
             self.__call__ = incr_with_lock
 
+class RWLock:
+    ''' A readers-writer lock. Any number of threads may hold it shared (for
+    reading) at once, or a single thread may hold it exclusively (for
+    writing). Waiting writers block new readers so they can't be starved.
+    Not re-entrant. Use the `read_locked` and `write_locked` context managers
+    e.g.:
+
+        with rwlock.read_locked():
+            ... '''
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    def acquire_read(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+
+    def release_read(self):
+        with self._cond:
+            self._readers -= 1
+            if not self._readers:
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            try:
+                while self._writer or self._readers:
+                    self._cond.wait()
+            finally:
+                self._writers_waiting -= 1
+            self._writer = True
+
+    def release_write(self):
+        with self._cond:
+            self._writer = False
+            self._cond.notify_all()
+
+    @contextmanager
+    def read_locked(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write_locked(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
 _human_readable_thread_ids = defaultdict(Monotonic(locking=False))  # locking not needed on Monotonic instance as we lock the dict anyway
 _human_readable_thread_ids_lock = threading.Lock()
 _t0 = time.time()
@@ -344,6 +411,28 @@ def profiler(func):
     return lambda *args, **kw_args: do_profile(args, kw_args)
 
 
+def process_pool_map(func, args, items, num_workers):
+    ''' Splits the sequence `items` into at most `num_workers` contiguous
+    chunks and calls `func(*args, chunk)` for each chunk in a pool of worker
+    processes. `func` must return a list, and must be a module-level (ie
+    picklable) function. Returns the concatenation of the returned lists, in
+    the same order as `items`. '''
+    from concurrent.futures import ProcessPoolExecutor
+    import multiprocessing
+    items = list(items)
+    num_workers = max(1, min(num_workers, os.cpu_count() or 1, len(items)))
+    chunk_size = -(-len(items) // num_workers)  # ceil
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+    kwargs = {}
+    if sys.version_info >= (3, 7):
+        # Don't fork: the forked workers would inherit a copy of a running
+        # process with all its threads' locks in whatever state they were in.
+        kwargs['mp_context'] = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=len(chunks), **kwargs) as executor:
+        futures = [executor.submit(func, *args, chunk) for chunk in chunks]
+        return list(itertools.chain.from_iterable(f.result() for f in futures))
+
+
 @lru_cache()
 def android_data_dir():
     from com.chaquo.python import Python
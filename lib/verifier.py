@@ -20,23 +20,112 @@
 # ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
 # CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
+import time
+import weakref
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+from .caches import ExpiringCache
 from .util import ThreadJob, bh2u
 from .bitcoin import Hash, hash_decode, hash_encode
+from . import metrics
 from . import networks
 from .transaction import Transaction
 
+# Every SPV instance adds itself here. A released verifier lingers until it
+# is garbage collected, so the unverified count skips the cleaned up ones.
+_verifiers = weakref.WeakSet()
+
+# Proofs checked by any wallet's verifier, so that other wallets (eg in a
+# daemon hosting many wallets) with the same tx needn't ask a server again.
+# tx_hash -> (tx_height, pos, merkle_root)
+_verified_proofs = ExpiringCache(maxlen=100000, name="SPV verified proofs")
+
+metrics.gauge('spv_unverified_txs', 'Wallet transactions awaiting SPV verification',
+              fn=lambda: sum(len(v.wallet.unverified_tx) for v in list(_verifiers) if not v.cleaned_up))
+metrics.gauge('spv_merkle_inflight', 'Merkle proof requests awaiting a server response',
+              fn=lambda: sum(len(v.inflight_merkle) for v in list(_verifiers)))
+
+
+class VerifiedTxIndex:
+    ''' The heights of a wallet's verified txs: height -> set of tx_hash, with
+    the heights kept sorted, so that on a reorg only the txs in the blocks
+    above the fork point need looking at.
+
+    The wallet keeps it in step with its verified_tx dict, with its lock
+    held. '''
+
+    def __init__(self, verified_tx=None):
+        self.by_height = {}
+        self.heights = []  # sorted keys of by_height
+        self.height_of = {}  # tx_hash -> height
+        for tx_hash, (height, timestamp, pos) in (verified_tx or {}).items():
+            self.add(tx_hash, height)
+
+    def add(self, tx_hash, height):
+        old = self.height_of.get(tx_hash)
+        if old == height:
+            return
+        if old is not None:
+            self.remove(tx_hash)
+        s = self.by_height.get(height)
+        if s is None:
+            self.by_height[height] = s = set()
+            insort(self.heights, height)
+        s.add(tx_hash)
+        self.height_of[tx_hash] = height
+
+    def remove(self, tx_hash):
+        height = self.height_of.pop(tx_hash, None)
+        if height is None:
+            return
+        s = self.by_height[height]
+        s.discard(tx_hash)
+        if not s:
+            del self.by_height[height]
+            del self.heights[bisect_left(self.heights, height)]
+
+    def at_or_above(self, height):
+        ''' Returns a list of (height, set of tx_hash) for the blocks at or
+        above `height`, lowest first. The sets are copies. '''
+        i = bisect_left(self.heights, height)
+        return [(h, set(self.by_height[h])) for h in self.heights[i:]]
+
+    def __len__(self):
+        return len(self.height_of)
+
+
 class SPV(ThreadJob):
     """ Simple Payment Verification """
 
+    # Default number of merkle proof requests a single verifier may have
+    # outstanding at once. Configurable via the 'spv_merkle_window' key.
+    DEFAULT_MERKLE_WINDOW = 10
+    # Default number of checkpoint-region header chunks we allow to be in
+    # flight at once while prefetching. Configurable via 'spv_chunk_prefetch'.
+    DEFAULT_CHUNK_PREFETCH = 4
+    # Seconds after which an unanswered merkle request no longer counts
+    # against the window, and the proof is requested again.
+    MERKLE_TIMEOUT = 60
+
     def __init__(self, network, wallet):
         self.wallet = wallet
         self.network = network
         self.blockchain = network.blockchain()
         self.merkle_roots = {}  # txid -> merkle root (once it has been verified)
         self.requested_merkle = set()  # txid set of pending requests
+        self.inflight_merkle = {}  # txid -> time of requests awaiting a server response
         self.qbusy = False
+        self.save_pending = False
         self.cleaned_up = False
         self._need_release = False
+        config = network.config
+        self.merkle_window = max(1, int(config.get('spv_merkle_window', self.DEFAULT_MERKLE_WINDOW)))
+        self.chunk_prefetch = max(1, int(config.get('spv_chunk_prefetch', self.DEFAULT_CHUNK_PREFETCH)))
+        # If True, spread merkle requests across all connected servers. This
+        # is safe since proofs are always checked against our local headers.
+        self.multi_server = bool(config.get('spv_multi_server', False))
+        _verifiers.add(self)
 
     def _release(self):
         ''' Called from the Network (DaemonThread) -- to prevent race conditions
@@ -67,8 +156,63 @@ class SPV(ThreadJob):
             self.spam_error("v.no blockchain", interface.server)
             return
 
-        local_height = self.network.get_local_height()
-        unverified = self.wallet.get_unverified_txs()
+        self.expire_inflight_merkle()
+        if len(self.inflight_merkle) >= self.merkle_window:
+            # window is full, wait for responses before doing any more work
+            self.qbusy = True
+        elif not self.wallet.unverified_tx:
+            # nothing to verify -- the usual case for a synchronized wallet
+            self.qbusy = False
+        else:
+            self.qbusy = False
+            by_height = self.pending_by_height(self.wallet.get_unverified_txs(),
+                                               self.network.get_local_height())
+            missing_chunks = []
+            # Most recent blocks first: those txs are at the top of the
+            # history list, so they're what the user is looking at.
+            for tx_height in sorted(by_height, reverse=True):
+                # if it's in the checkpoint region, we still might not have the header
+                header = blockchain.read_header(tx_height)
+                if header is None:
+                    if tx_height <= networks.net.VERIFICATION_BLOCK_HEIGHT:
+                        # Per-header requests might be a lot heavier.
+                        # Also, they're not supported as header requests are
+                        # currently designed for catching up post-checkpoint headers.
+                        index = tx_height // 2016
+                        if not missing_chunks or missing_chunks[-1] != index:
+                            missing_chunks.append(index)
+                    continue
+                if self.qbusy:
+                    continue
+                for tx_hash in by_height[tx_height]:
+                    if not self.request_merkle(tx_hash, tx_height):
+                        break
+            self.prefetch_chunks(interface, missing_chunks)
+            if self.save_pending:
+                # some txs were verified with other wallets' proofs
+                self.save_pending = False
+                self.save_if_done()
+
+        if self.network.blockchain() != self.blockchain:
+            self.blockchain = self.network.blockchain()
+            self.undo_verifications()
+
+    def expire_inflight_merkle(self):
+        ''' Forgets merkle requests that went unanswered for longer than
+        MERKLE_TIMEOUT (eg the server they were sent to went away) so that
+        they don't fill up the window for good, and can be requested again. '''
+        cutoff = time.time() - self.MERKLE_TIMEOUT
+        for tx_hash, sent in list(self.inflight_merkle.items()):
+            if sent < cutoff:
+                self.print_error('merkle request timed out', tx_hash)
+                del self.inflight_merkle[tx_hash]
+                self.requested_merkle.discard(tx_hash)
+
+    def pending_by_height(self, unverified, local_height):
+        ''' Returns a dict of height -> list of tx_hash for the txs in
+        `unverified` that still need a merkle proof requested and whose block
+        may already have a header locally. '''
+        by_height = defaultdict(list)
         for tx_hash, tx_height in unverified.items():
             # do not request merkle branch if we already requested it
             if tx_hash in self.requested_merkle or tx_hash in self.merkle_roots:
@@ -76,40 +220,49 @@ class SPV(ThreadJob):
             # or before headers are available
             if tx_height <= 0 or tx_height > local_height:
                 continue
+            by_height[tx_height].append(tx_hash)
+        return by_height
 
-            # if it's in the checkpoint region, we still might not have the header
-            header = blockchain.read_header(tx_height)
-            if header is None:
-                if tx_height <= networks.net.VERIFICATION_BLOCK_HEIGHT:
-                    # Per-header requests might be a lot heavier.
-                    # Also, they're not supported as header requests are
-                    # currently designed for catching up post-checkpoint headers.
-                    index = tx_height // 2016
-                    if self.network.request_chunk(interface, index):
-                        interface.print_error("verifier requesting chunk {} for height {}".format(index, tx_height))
-                continue
-            # enqueue request
-            msg_id = self.network.get_merkle_for_transaction(tx_hash, tx_height,
-                                                             self.verify_merkle)
-            self.qbusy = msg_id is None
-            if self.qbusy:
-                # interface queue busy, will try again later
-                break
-            self.print_error('requested merkle', tx_hash)
-            self.requested_merkle.add(tx_hash)
+    def request_merkle(self, tx_hash, tx_height):
+        ''' Enqueue a merkle proof request. Returns False (and sets
+        self.qbusy) if the window or the network queue is full. '''
+        if self.verify_from_shared_proof(tx_hash, tx_height):
+            return True
+        if len(self.inflight_merkle) >= self.merkle_window:
+            self.qbusy = True
+            return False
+        interface = 'random' if self.multi_server else None
+        msg_id = self.network.get_merkle_for_transaction(tx_hash, tx_height,
+                                                         self.verify_merkle,
+                                                         max_qlen=None,
+                                                         interface=interface)
+        self.qbusy = msg_id is None
+        if self.qbusy:
+            # interface queue busy, will try again later
+            return False
+        self.print_error('requested merkle', tx_hash)
+        self.requested_merkle.add(tx_hash)
+        self.inflight_merkle[tx_hash] = time.time()
+        return True
 
-        if self.network.blockchain() != self.blockchain:
-            self.blockchain = self.network.blockchain()
-            self.undo_verifications()
+    def prefetch_chunks(self, interface, chunk_indices):
+        ''' Request the checkpoint-region header chunks we need, highest first,
+        keeping at most self.chunk_prefetch chunk requests in flight. '''
+        for index in chunk_indices:
+            if len(self.network.requested_chunks) >= self.chunk_prefetch:
+                break
+            if self.network.request_chunk(interface, index):
+                interface.print_error("verifier requesting chunk {}".format(index))
 
     def verify_merkle(self, response):
         if self.cleaned_up:
             return  # we have been killed, this was just an orphan callback
+        params = response['params']
+        self.inflight_merkle.pop(params[0], None)
         if response.get('error'):
             # FIXME: tx will never verify now until server reconnect.
             self.print_error('received an error:', response)
             return
-        params = response['params']
         merkle = response['result']
         # Verify the hash of the server-provided merkle branch to a
         # transaction matches the merkle root of its block
@@ -137,12 +290,34 @@ class SPV(ThreadJob):
                 .format(tx_hash, header.get('merkle_root'), merkle_root))
             return
         # we passed all the tests
+        _verified_proofs.put(tx_hash, (tx_height, pos, merkle_root))
+        self.on_verified(tx_hash, tx_height, pos, merkle_root, header)
+        self.save_if_done()
+
+    def verify_from_shared_proof(self, tx_hash, tx_height):
+        ''' If another verifier already checked a proof for tx_hash at
+        tx_height, and its block is still in our chain, marks the tx verified
+        and returns True. '''
+        proof = _verified_proofs.get(tx_hash)
+        if not proof or proof[0] != tx_height:
+            return False
+        _, pos, merkle_root = proof
+        header = self.network.blockchain().read_header(tx_height)
+        if not header or header.get('merkle_root') != merkle_root:
+            return False
+        self.on_verified(tx_hash, tx_height, pos, merkle_root, header)
+        self.save_pending = True  # see run()
+        return True
+
+    def on_verified(self, tx_hash, tx_height, pos, merkle_root, header):
         self.merkle_roots[tx_hash] = merkle_root
         # note: we could pop in the beginning, but then we would request
         # this proof again in case of verification failure from the same server
         self.requested_merkle.discard(tx_hash)
         self.print_error("verified %s" % tx_hash)
         self.wallet.add_verified_tx(tx_hash, (tx_height, header.get('timestamp'), pos))
+
+    def save_if_done(self):
         if self.is_up_to_date() and self.wallet.is_up_to_date() and not self.qbusy:
             self.wallet.save_verified_tx(write=True)
             self.network.trigger_callback('wallet_updated', self.wallet)  # This callback will happen very rarely.. mostly right as the last tx is verified. It's to ensure GUI is updated fully.
@@ -186,6 +361,7 @@ class SPV(ThreadJob):
     def remove_spv_proof_for_tx(self, tx_hash):
         self.merkle_roots.pop(tx_hash, None)
         self.requested_merkle.discard(tx_hash)
+        self.inflight_merkle.discard(tx_hash)
 
     def is_up_to_date(self):
         return not self.requested_merkle
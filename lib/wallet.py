@@ -37,7 +37,8 @@ import random
 import re
 import time
 import threading
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
+from contextlib import contextmanager
 from functools import partial
 
 from .i18n import ngettext
@@ -46,27 +47,30 @@ from .util import NotEnoughFunds, NotEnoughFundsSlp, NotEnoughUnfrozenFundsSlp,
 from .address import Address, Script, ScriptOutput, PublicKey
 from .bitcoin import *
 from .version import *
-from .keystore import load_keystore, Hardware_KeyStore, Imported_KeyStore, BIP32_KeyStore, xpubkey_to_address
+from .keystore import load_keystore, Hardware_KeyStore, Imported_KeyStore, BIP32_KeyStore, Software_KeyStore, xpubkey_to_address
 from . import networks
 from .storage import multisig_type
 
 from . import transaction
-from .transaction import Transaction, InputValueMissing
+from .transaction import Transaction
 from .plugins import run_hook
 from . import bitcoin
 from . import coinchooser
 from .synchronizer import Synchronizer
-from .verifier import SPV
+from .verifier import SPV, VerifiedTxIndex
 from . import schnorr
 from . import ecc_fast
 
-from . import paymentrequest
-from .paymentrequest import PR_PAID, PR_UNPAID, PR_UNKNOWN, PR_EXPIRED
-from .paymentrequest import InvoiceStore
+from .util import PR_PAID, PR_UNPAID, PR_UNKNOWN, PR_EXPIRED, cachedproperty
 from .contacts import Contacts
 
 from .slp import SlpMessage, SlpParsingError, SlpUnsupportedSlpTokenType, SlpNoMintingBatonFound, OpreturnError
-from . import slp_validator_0x01, slp_validator_0x01_nft1
+from .slp_columns import TokenColumns
+from . import metrics
+from . import tx_store
+from .history_index import HistoryIndex
+
+LOAD_SECONDS = metrics.histogram('wallet_load_seconds', 'Time taken to load wallets from storage')
 
 def _(message): return message
 
@@ -165,7 +169,7 @@ def sweep(privkeys, network, config, recipient, fee=None, imax=100, sign_schnorr
 
     tx = Transaction.from_io(inputs, outputs, locktime=locktime, sign_schnorr=sign_schnorr)
     tx.BIP_LI01_sort()
-    tx.sign(keypairs)
+    tx.sign(keypairs, num_workers=config.get_sign_workers())
     return tx
 
 
@@ -178,6 +182,9 @@ class Abstract_Wallet(PrintError):
     max_change_outputs = 3
 
     def __init__(self, storage):
+        t0 = time.time()
+        # phase name -> seconds spent, see get_load_timings()
+        self.load_timings = OrderedDict(storage=storage.load_time)
         self.electrum_version = PACKAGE_VERSION
         self.storage = storage
         self.thread = None  # this is used by the qt main_window to store a QThread. We just make sure it's always defined as an attribute here.
@@ -247,26 +254,60 @@ class Abstract_Wallet(PrintError):
 
         # Verified transactions.  Each value is a (height, timestamp, block_pos) tuple.  Access with self.lock.
         self.verified_tx = storage.get('verified_tx3', {})
+        # The same, by height, for undo_verifications(). Keep it in step.
+        self._verified_index = VerifiedTxIndex(self.verified_tx)
+
+        # The history, in (height, pos) order, for get_history_page(). Code
+        # changing the history, txi, txo or the above tx heights must
+        # invalidate the tx's concerned (or all of it) in the index.
+        self._history_index = HistoryIndex(self._history_index_entry, lambda: self.tx_addr_hist.keys())
+
+        # The tx's whose txi or txo changed since save_transactions() last
+        # put them in storage, or None for all of them; and what it put.
+        self._unsaved_txs = None
+        self._saved_tx, self._saved_tx_objs, self._saved_txi, self._saved_txo = {}, {}, {}, {}
 
         # save wallet type the first time
         if self.storage.get('wallet_type') is None:
             self.storage.put('wallet_type', self.wallet_type)
 
-        # invoices and contacts
-        self.invoices = InvoiceStore(self.storage)
+        # contacts (invoices are loaded on first use, see below)
         self.contacts = Contacts(self.storage)
 
         # Now, finally, after object is constructed -- we can do this
-        self.load_keystore()
-        self.load_addresses()
-        self.load_transactions()
-        self.build_reverse_history()
-
-        self.check_history()
+        with self._load_phase('keystore'):
+            self.load_keystore()
+        with self._load_phase('addresses'):
+            self.load_addresses()
+        with self._load_phase('transactions'):
+            self.load_transactions()
+        with self._load_phase('reverse_history'):
+            self.build_reverse_history()
+        with self._load_phase('check_history'):
+            self.check_history()
+        self.load_timings['init'] = time.time() - t0
+        LOAD_SECONDS.observe(self.load_timings['init'] + self.load_timings['storage'])
 
         # Print debug message on finalization
         finalization_print_error(self, "[{}/{}] finalized".format(__class__.__name__, self.diagnostic_name()))
 
+    @contextmanager
+    def _load_phase(self, name):
+        ''' Adds the time spent in the with block to load phase `name`. '''
+        t0 = time.time()
+        try:
+            yield
+        finally:
+            self.load_timings[name] = self.load_timings.get(name, 0.0) + time.time() - t0
+
+    def get_load_timings(self):
+        ''' Returns a dict of phase -> seconds spent opening this wallet.
+        'storage' is reading and parsing the wallet file, 'init' is the total
+        of the wallet object's construction, which the other phases (except
+        'start_threads' and the background 'activate_slp') are part of.
+        'rebuild_slp' is part of 'transactions'. '''
+        return OrderedDict((k, round(v, 3)) for k, v in self.load_timings.items())
+
     @property
     def is_slp(self):
         ''' Note that the various Slp_* classes explicitly write to storage
@@ -291,6 +332,14 @@ class Abstract_Wallet(PrintError):
     def __str__(self):
         return self.basename()
 
+    @cachedproperty
+    def invoices(self):
+        ''' The wallet's InvoiceStore. Loaded on first use, since importing
+        paymentrequest (protobuf, requests) is slow and most commands never
+        need it. '''
+        from .paymentrequest import InvoiceStore
+        return InvoiceStore(self.storage)
+
     def get_master_public_key(self):
         return None
 
@@ -309,6 +358,7 @@ class Abstract_Wallet(PrintError):
         self.tx_fees = self.storage.get('tx_fees', {})
         self.pruned_txo = self.storage.get('pruned_txo', {})
         self.pruned_txo_values = set(self.pruned_txo.values())
+        self._unsaved_txs = None
         tx_list = self.storage.get('transactions', {})
 
         self.transactions = {}
@@ -329,28 +379,53 @@ class Abstract_Wallet(PrintError):
             for txid, txdict in addrdict.items():
                 # need to do this iteration since json stores int keys as decimal strings.
                 self._slp_txo[addr][txid] = {int(idx):d for idx,d in txdict.items()}
+        self._rebuild_slp_token_index()
 
         ok = self.storage.get('slp_data_version', False)
         if ok != 3:
-            self.rebuild_slp()
+            with self._load_phase('rebuild_slp'):
+                self.rebuild_slp()
 
     @profiler
     def save_transactions(self, write=False):
+        ''' Puts the wallet's tx data in storage. Sections that haven't
+        changed since the last save cost a comparison only.
+
+        If `write`, the wallet file is written soon after, by the storage's
+        background writer (see WalletStorage.write_soon), which coalesces
+        the writes requested meanwhile into one and serializes without the
+        wallet lock held. Call storage.write() to write synchronously. '''
         with self.lock:
-            tx = {}
-            for k,v in self.transactions.items():
-                tx[k] = str(v)
-            self.storage.put('transactions', tx)
-            txi = {tx_hash: self.from_Address_dict(value)
-                   for tx_hash, value in self.txi.items()
-                   # skip empty entries to save memory and disk space
-                   if value}
-            txo = {tx_hash: self.from_Address_dict(value)
-                   for tx_hash, value in self.txo.items()
-                   # skip empty entries to save memory and disk space
-                   if value}
-            self.storage.put('txi', txi)
-            self.storage.put('txo', txo)
+            # The transactions, txi and txo sections are the big ones. Only
+            # the entries of the tx's that changed since the last save are
+            # converted again, and storage gets new dicts it can keep as
+            # they are (we never modify them) instead of copies.
+            txs, objs = self.transactions, self._saved_tx_objs
+            if len(objs) != len(txs) or any(objs.get(k) is not v for k, v in txs.items()):
+                old = self._saved_tx
+                self._saved_tx = {k: old[k] if objs.get(k) is v else str(v)
+                                  for k, v in txs.items()}
+                self._saved_tx_objs = dict(txs)
+                self.storage.put('transactions', self._saved_tx, copy_value=False)
+            dirty, self._unsaved_txs = self._unsaved_txs, set()
+            if dirty is None:
+                # skip empty entries to save memory and disk space
+                self._saved_txi = {tx_hash: self._storage_io_entry(value)
+                                   for tx_hash, value in self.txi.items() if value}
+                self._saved_txo = {tx_hash: self._storage_io_entry(value)
+                                   for tx_hash, value in self.txo.items() if value}
+            elif dirty:
+                self._saved_txi, self._saved_txo = dict(self._saved_txi), dict(self._saved_txo)
+                for saved, live in ((self._saved_txi, self.txi), (self._saved_txo, self.txo)):
+                    for tx_hash in dirty:
+                        value = live.get(tx_hash)
+                        if value:
+                            saved[tx_hash] = self._storage_io_entry(value)
+                        else:
+                            saved.pop(tx_hash, None)
+            if dirty is None or dirty:
+                self.storage.put('txi', self._saved_txi, copy_value=False)
+                self.storage.put('txo', self._saved_txo, copy_value=False)
             self.storage.put('tx_fees', self.tx_fees)
             self.storage.put('pruned_txo', self.pruned_txo)
             history = self.from_Address_dict(self._history)
@@ -364,21 +439,51 @@ class Abstract_Wallet(PrintError):
 
             self.storage.put('slp_data_version', 3)
 
-            if write:
-                self.storage.write()
+        if write:
+            self.storage.write_soon()
+
+    def _tx_unsaved(self, tx_hash):
+        ''' The txi or txo of tx_hash changed. Call with the lock held. '''
+        if self._unsaved_txs is not None:
+            self._unsaved_txs.add(tx_hash)
+
+    @classmethod
+    def _storage_io_entry(cls, d):
+        ''' A txi or txo entry as put in storage: with the lists copied,
+        since the wallet appends to and removes from them. '''
+        return {addr.to_storage_string(): list(l) for addr, l in d.items()}
+
+    # Number of tx's activate_slp() checks per hold of the wallet lock
+    ACTIVATE_SLP_BATCH = 100
 
     def activate_slp(self):
         # This gets called in two situations:
         # - Upon wallet startup, it checks config to see if SLP should be enabled.
         # - During wallet operation, on a network reconnect, to "wake up" the validator -- According to JSCramer this is required.  TODO: Investigate why that is
         with self.lock:
+            pending = []
             for tx_hash, tti in self.tx_tokinfo.items():
-                # Fire up validation on unvalidated txes
-                try:
-                    tx = self.transactions[tx_hash]
-                    self.slp_check_validation(tx_hash, tx)
-                except KeyError:
-                    continue
+                tx = self.transactions.get(tx_hash)
+                if tx is not None and tti.get('validity') == 0:
+                    pending.append((tx_hash, tx))
+        # Fire up validation on unvalidated txes, taking the lock for one
+        # batch at a time so the GUI and network threads get a turn between.
+        for i in range(0, len(pending), self.ACTIVATE_SLP_BATCH):
+            with self.lock:
+                for tx_hash, tx in pending[i:i + self.ACTIVATE_SLP_BATCH]:
+                    try:
+                        self.slp_check_validation(tx_hash, tx)
+                    except KeyError:
+                        continue
+
+    def _activate_slp_deferred(self):
+        with self._load_phase('activate_slp'):
+            try:
+                self.activate_slp()
+            except Exception as e:
+                # stop_threads() may have torn down the SLP graphs meanwhile
+                if self.slp_graph_0x01 is not None:
+                    self.print_error("activate_slp:", repr(e))
 
     _add_token_hex_re = re.compile('^[a-f0-9]{64}$')
     def add_token_type(self, token_id, entry, check_validation=True):
@@ -500,15 +605,17 @@ class Abstract_Wallet(PrintError):
             return None
 
     def save_verified_tx(self, write=False):
+        ''' See save_transactions for `write`. '''
         with self.lock:
             self.storage.put('verified_tx3', self.verified_tx)
-            if write:
-                self.storage.write()
+        if write:
+            self.storage.write_soon()
 
     def clear_history(self):
         with self.lock:
             self.txi = {}
             self.txo = {}
+            self._unsaved_txs = None
             self.tx_fees = {}
             self.pruned_txo = {}
             self.pruned_txo_values = set()
@@ -516,6 +623,7 @@ class Abstract_Wallet(PrintError):
             self._addr_bal_cache = {}
             self._history = {}
             self.tx_addr_hist = defaultdict(set)
+            self._history_index.invalidate_all()
 
     @profiler
     def build_reverse_history(self):
@@ -523,6 +631,7 @@ class Abstract_Wallet(PrintError):
         for addr, hist in self._history.items():
             for tx_hash, h in hist:
                 self.tx_addr_hist[tx_hash].add(addr)
+        self._history_index.invalidate_all()
 
     @profiler
     def check_history(self):
@@ -692,18 +801,22 @@ class Abstract_Wallet(PrintError):
         with self.lock:
             if tx_height == 0 and tx_hash in self.verified_tx:
                 self.verified_tx.pop(tx_hash)
+                self._verified_index.remove(tx_hash)
                 if self.verifier:
                     self.verifier.merkle_roots.pop(tx_hash, None)
 
             # tx will be verified only if height > 0
             if tx_hash not in self.verified_tx:
                 self.unverified_tx[tx_hash] = tx_height
+            self._history_index.invalidate(tx_hash)
 
     def add_verified_tx(self, tx_hash, info):
         # Remove from the unverified map and add to the verified map and
         with self.lock:
             self.unverified_tx.pop(tx_hash, None)
             self.verified_tx[tx_hash] = info  # (tx_height, timestamp, pos)
+            self._verified_index.add(tx_hash, info[0])
+            self._history_index.invalidate(tx_hash)
             height, conf, timestamp = self.get_tx_height(tx_hash)
         self.network.trigger_callback('verified2', self, tx_hash, height, conf, timestamp)
 
@@ -719,16 +832,26 @@ class Abstract_Wallet(PrintError):
             return len([1 for height in self.unverified_tx.values() if height > 0])
 
     def undo_verifications(self, blockchain, height):
-        '''Used by the verifier when a reorg has happened'''
+        '''Used by the verifier when a reorg has happened. Returns the set of
+        tx's whose verification was undone. Only the blocks at or above
+        `height` that hold verified tx's are looked at, one header read
+        each.'''
         txs = set()
         with self.lock:
-            for tx_hash, item in list(self.verified_tx.items()):
-                tx_height, timestamp, pos = item
-                if tx_height >= height:
-                    header = blockchain.read_header(tx_height)
+            for tx_height, tx_hashes in self._verified_index.at_or_above(height):
+                header = blockchain.read_header(tx_height)
+                for tx_hash in tx_hashes:
+                    info = self.verified_tx.get(tx_hash)
+                    if info is None:
+                        # not verified anymore; the index missed it
+                        self._verified_index.remove(tx_hash)
+                        continue
+                    timestamp = info[1]
                     # fixme: use block hash, not timestamp
                     if not header or header.get('timestamp') != timestamp:
                         self.verified_tx.pop(tx_hash, None)
+                        self._verified_index.remove(tx_hash)
+                        self._history_index.invalidate(tx_hash)
                         txs.add(tx_hash)
         if txs:
             self._addr_bal_cache = {}  # this is probably not necessary -- as the receive_history_callback will invalidate bad cache items -- but just to be paranoid we clear the whole balance cache on reorg anyway as a safety measure
@@ -1112,6 +1235,71 @@ class Abstract_Wallet(PrintError):
                 unvalidated_token_bal += coin['token_value']
         return (valid_token_bal, unvalidated_token_bal, invalid_token_bal, unfrozen_valid_token_bal, valid_token_bal - unfrozen_valid_token_bal)
 
+    def get_slp_token_columns(self):
+        ''' Returns a TokenColumns view of the wallet's token outputs, for
+        working out the balances or histories of all tokens at once. '''
+        with self.lock:
+            return TokenColumns(self)
+
+    def get_slp_token_balances(self, config):
+        ''' Returns a dict of token_id -> the balance tuple of
+        get_slp_token_balance, for all tokens at once. Tokens without
+        spendable outputs aren't in the dict. '''
+        return self.get_slp_token_columns().balances(config.get('confirmed_only', False))
+
+    def get_slp_token_coins_sorted(self, slpTokenId, config, *, domain=None):
+        """ Single pass over the per-token index (rather than every wallet
+        address) for the unspent, valid, non-baton outputs of `slpTokenId`.
+
+        Returns (balance, coins) where balance is the same tuple as
+        get_slp_token_balance returns (ignoring `domain`), and coins is the
+        list of spendable coins (as from get_slp_spendable_coins) in `domain`,
+        sorted by token_value, largest first. """
+        confirmed_only = config.get('confirmed_only', False)
+        domain = None if domain is None else set(domain)
+        valid_token_bal = unfrozen_valid_token_bal = 0
+        coins = []
+        addr_io = {}
+        with self.lock:
+            for txo, addr in self._slp_token_index.get(slpTokenId, {}).items():
+                txid, n = txo.rsplit(':', 1)
+                n = int(n)
+                tti = self.tx_tokinfo.get(txid)
+                slp_txo = self._slp_txo[addr][txid].get(n)
+                if (not tti or tti.get('validity') != 1 or not slp_txo
+                        or slp_txo['qty'] == 'MINT_BATON'):
+                    continue
+                if addr not in addr_io:
+                    addr_io[addr] = self.get_addr_io(addr)
+                received, sent = addr_io[addr]
+                if txo not in received or txo in sent:
+                    continue
+                tx_height, value, is_cb = received[txo]
+                if confirmed_only and tx_height <= 0:
+                    continue
+                is_frozen_coin = txo in self.frozen_coins
+                qty = slp_txo['qty']
+                valid_token_bal += qty
+                if is_frozen_coin or addr in self.frozen_addresses:
+                    continue
+                unfrozen_valid_token_bal += qty
+                if domain is not None and addr not in domain:
+                    continue
+                coins.append({
+                    'address': addr,
+                    'value': value,
+                    'prevout_n': n,
+                    'prevout_hash': txid,
+                    'height': tx_height,
+                    'coinbase': is_cb,
+                    'is_frozen_coin': is_frozen_coin,
+                    'token_value': qty,
+                    'token_validation_state': tti['validity'],
+                })
+        coins.sort(key=lambda c: -c['token_value'])
+        balance = (valid_token_bal, 0, 0, unfrozen_valid_token_bal, valid_token_bal - unfrozen_valid_token_bal)
+        return balance, coins
+
     def get_utxos(self, *, domain = None, exclude_frozen = False, mature = False, confirmed_only = False, exclude_slp = True):
         ''' Note that exclude_frozen = True checks for BOTH address-level and coin-level frozen status. '''
         coins = []
@@ -1351,6 +1539,8 @@ class Abstract_Wallet(PrintError):
             # HELPER FUNCTIONS
             def add_to_self_txi(tx_hash, addr, ser, v):
                 ''' addr must be 'is_mine' '''
+                self._history_index.invalidate(tx_hash)
+                self._tx_unsaved(tx_hash)
                 d = self.txi.get(tx_hash)
                 if d is None:
                     self.txi[tx_hash] = d = {}
@@ -1384,11 +1574,14 @@ class Abstract_Wallet(PrintError):
                 next_tx = self.pruned_txo.pop(ser, None)
                 if next_tx:
                     self.pruned_txo_values.discard(next_tx)
+                    self._history_index.invalidate(next_tx)
                     t = self.pruned_txo_cleaner_thread
                     if t and t.q: t.q.put('r_' + ser)  # notify of removal
                 return next_tx
             # /HELPER FUNCTIONS
 
+            self._history_index.invalidate(tx_hash)
+            self._tx_unsaved(tx_hash)
             # add inputs
             self.txi[tx_hash] = d = {}
             for txi in tx.inputs():
@@ -1485,11 +1678,11 @@ class Abstract_Wallet(PrintError):
             token_type = 'SLP%d'%(e.args[0],)
             for i, (_type, addr, _) in enumerate(txouts):
                 if _type == TYPE_ADDRESS and self.is_mine(addr):
-                    self._slp_txo[addr][tx_hash][i] = {
+                    self._put_slp_txo(addr, tx_hash, i, {
                             'type': token_type,
                             'qty': None,
                             'token_id': None,
-                            }
+                            })
             return
         except (SlpParsingError, IndexError, OpreturnError):
             return
@@ -1501,31 +1694,31 @@ class Abstract_Wallet(PrintError):
             for i, qty in enumerate(amounts):
                 _type, addr, _ = txouts[i]
                 if _type == TYPE_ADDRESS and qty > 0 and self.is_mine(addr):
-                    self._slp_txo[addr][tx_hash][i] = {
+                    self._put_slp_txo(addr, tx_hash, i, {
                             'type': 'SLP%d'%(slpMsg.token_type,),
                             'token_id': token_id_hex,
                             'qty': qty,
-                            }
+                            })
         elif slpMsg.transaction_type == 'GENESIS':
             token_id_hex = tx_hash
             try:
                 _type, addr, _ = txouts[1]
                 if _type == TYPE_ADDRESS:
                     if slpMsg.op_return_fields['initial_token_mint_quantity'] > 0 and self.is_mine(addr):
-                        self._slp_txo[addr][tx_hash][1] = {
+                        self._put_slp_txo(addr, tx_hash, 1, {
                                 'type': 'SLP%d'%(slpMsg.token_type,),
                                 'token_id': token_id_hex,
                                 'qty': slpMsg.op_return_fields['initial_token_mint_quantity'],
-                            }
+                            })
                     if slpMsg.op_return_fields['mint_baton_vout'] is not None:
                         i = slpMsg.op_return_fields['mint_baton_vout']
                         _type, addr, _ = txouts[i]
                         if _type == TYPE_ADDRESS:
-                            self._slp_txo[addr][tx_hash][i] = {
+                            self._put_slp_txo(addr, tx_hash, i, {
                                     'type': 'SLP%d'%(slpMsg.token_type,),
                                     'token_id': token_id_hex,
                                     'qty': 'MINT_BATON',
-                                }
+                                })
             except IndexError: # if too few outputs (compared to mint_baton_vout)
                 pass
         elif slpMsg.transaction_type == "MINT":
@@ -1534,20 +1727,20 @@ class Abstract_Wallet(PrintError):
                 _type, addr, _ = txouts[1]
                 if _type == TYPE_ADDRESS:
                     if slpMsg.op_return_fields['additional_token_quantity'] > 0 and self.is_mine(addr):
-                        self._slp_txo[addr][tx_hash][1] = {
+                        self._put_slp_txo(addr, tx_hash, 1, {
                                 'type': 'SLP%d'%(slpMsg.token_type,),
                                 'token_id': token_id_hex,
                                 'qty': slpMsg.op_return_fields['additional_token_quantity'],
-                            }
+                            })
                     if slpMsg.op_return_fields['mint_baton_vout'] is not None:
                         i = slpMsg.op_return_fields['mint_baton_vout']
                         _type, addr, _ = txouts[i]
                         if _type == TYPE_ADDRESS:
-                            self._slp_txo[addr][tx_hash][i] = {
+                            self._put_slp_txo(addr, tx_hash, i, {
                                     'type': 'SLP%d'%(slpMsg.token_type,),
                                     'token_id': token_id_hex,
                                     'qty': 'MINT_BATON',
-                                }
+                                })
             except IndexError: # if too few outputs (compared to mint_baton_vout)
                 pass
         elif slpMsg.transaction_type == 'COMMIT':
@@ -1626,16 +1819,36 @@ class Abstract_Wallet(PrintError):
         """
         with self.lock:
             self._slp_txo = defaultdict(lambda: defaultdict(dict))
+            self._slp_token_index = defaultdict(dict)
             self.tx_tokinfo = {}
             for txid, tx in self.transactions.items():
                 self.handleSlpTransaction(txid, tx)
 
+    def _put_slp_txo(self, addr, tx_hash, n, d):
+        """ Record SLP output `n` of `tx_hash` to `addr` in self._slp_txo and
+        in the per-token index. Callers are expected to take lock(s). """
+        self._slp_txo[addr][tx_hash][n] = d
+        self._slp_token_index[d['token_id']][tx_hash + ':' + str(n)] = addr
+
+    def _rebuild_slp_token_index(self):
+        """ Build self._slp_token_index from self._slp_txo. The index maps
+        token_id -> {'txid:n': address} for every SLP output we have seen,
+        spent or not, so that per-token queries only look at that token's
+        outputs. Callers are expected to take lock(s). """
+        self._slp_token_index = defaultdict(dict)
+        for addr, addrdict in self._slp_txo.items():
+            for txid, txdict in addrdict.items():
+                for idx, d in txdict.items():
+                    self._slp_token_index[d['token_id']][txid + ':' + str(idx)] = addr
+
     def remove_transaction(self, tx_hash):
         with self.lock:
             self.print_error("removing tx from history", tx_hash)
             # Note that we don't actually remove the tx_hash from
             # self.transactions, but instead rely on the unreferenced tx being
             # removed the next time the wallet is loaded in self.load_transactions()
+            self._history_index.invalidate(tx_hash)
+            self._tx_unsaved(tx_hash)
 
             for ser, hh in list(self.pruned_txo.items()):
                 if hh == tx_hash:
@@ -1653,6 +1866,8 @@ class Abstract_Wallet(PrintError):
                             l.remove(item)
                             self.pruned_txo[ser] = next_tx
                             self.pruned_txo_values.add(next_tx)
+                            self._history_index.invalidate(next_tx)
+                            self._tx_unsaved(next_tx)
                     if l == []:
                         dd.pop(addr)
                     else:
@@ -1669,7 +1884,10 @@ class Abstract_Wallet(PrintError):
             self.tx_tokinfo[tx_hash] = {}
 
             for addr, addrdict in self._slp_txo.items():
-                if tx_hash in addrdict: addrdict[tx_hash] = {}
+                if tx_hash in addrdict:
+                    for idx, d in addrdict[tx_hash].items():
+                        self._slp_token_index[d['token_id']].pop(tx_hash + ':' + str(idx), None)
+                    addrdict[tx_hash] = {}
 
     def receive_tx_callback(self, tx_hash, tx, tx_height):
         self.add_transaction(tx_hash, tx)
@@ -1680,6 +1898,7 @@ class Abstract_Wallet(PrintError):
             old_hist = self.get_address_history(addr)
             for tx_hash, height in old_hist:
                 if (tx_hash, height) not in hist:
+                    self._history_index.invalidate(tx_hash)
                     s = self.tx_addr_hist.get(tx_hash)
                     if s:
                         s.discard(addr)
@@ -1701,6 +1920,7 @@ class Abstract_Wallet(PrintError):
                 self.add_unverified_tx(tx_hash, tx_height)
                 # add reference in tx_addr_hist
                 self.tx_addr_hist[tx_hash].add(addr)
+                self._history_index.invalidate(tx_hash)
                 # if addr is new, we have to recompute txi and txo
                 tx = self.transactions.get(tx_hash)
                 if tx is not None and self.txi.get(tx_hash, {}).get(addr) is None and self.txo.get(tx_hash, {}).get(addr) is None:
@@ -1723,15 +1943,9 @@ class Abstract_Wallet(PrintError):
 
         return history
 
-    def get_slp_histories(self, domain=None, validities_considered=(0,1)):
-        # Based on get_history.
-        # We return a dict of histories, one history per token_id.
-
-        # get domain
-        if domain is None:
-            domain = self.get_addresses()
-
-        #1. Big iteration to find all deltas and put them in the right place.
+    def _get_slp_token_tx_deltas(self, domain, validities_considered):
+        # Find all deltas of the addresses in domain and put them in the
+        # right place: token_id -> tx_hash -> delta.
         token_tx_deltas = defaultdict(lambda: defaultdict(int)) # defaultdict of defaultdicts of ints :)
         for addr in domain:
             h = self.get_address_history(addr)
@@ -1762,6 +1976,19 @@ class Abstract_Wallet(PrintError):
                         if isinstance(d.get('qty',None),int):
                             token_tx_deltas[d['token_id']][tx_hash] -= d['qty']  # received!
 
+        return token_tx_deltas
+
+    def get_slp_histories(self, domain=None, validities_considered=(0,1)):
+        # Based on get_history.
+        # We return a dict of histories, one history per token_id.
+
+        #1. Find all deltas, per token and tx. For the whole wallet, this is
+        #   a group-by over the columns of the wallet's token outputs.
+        if domain is None:
+            token_tx_deltas = self.get_slp_token_columns().deltas(validities_considered)
+        else:
+            token_tx_deltas = self._get_slp_token_tx_deltas(domain, validities_considered)
+
         # 2. create history (no sorting needed since balances won't be computed)
         histories = {}
         for token_id, tx_deltas in token_tx_deltas.items():
@@ -1775,10 +2002,44 @@ class Abstract_Wallet(PrintError):
 
         return histories
 
+    def _history_index_entry(self, tx_hash):
+        ''' Returns (txpos, delta) of tx_hash for the history index, or None
+        if it's not in the history. Called with self.lock held. '''
+        addrs = self.tx_addr_hist.get(tx_hash)
+        if not addrs:
+            return None
+        delta = 0
+        for addr in addrs:
+            d = self.get_tx_delta(tx_hash, addr)
+            if d is None:
+                delta = None
+                break
+            delta += d
+        return self.get_txpos(tx_hash), delta
+
+    def get_history_count(self):
+        ''' The number of tx's in the wallet's history. '''
+        with self.lock:
+            return len(self._history_index)
+
+    def get_history_page(self, offset=0, limit=None, *, reverse=True):
+        ''' Returns up to `limit` items (all if None) of the wallet's history,
+        starting at `offset`, newest first unless `reverse` is False. Items
+        are as returned by get_history().
+
+        This is served from the history index: after the first call, a page
+        costs O(limit) plus the work of indexing whatever tx's changed since
+        the previous call. '''
+        with self.lock:
+            c, u, x = self.get_balance()
+            rows = self._history_index.page(c + u + x, offset, limit, reverse=reverse)
+            return [(tx_hash, *self.get_tx_height(tx_hash), delta, balance)
+                    for tx_hash, delta, balance in rows]
+
     def get_history(self, domain=None, *, reverse=False):
-        # get domain
         if domain is None:
-            domain = self.get_addresses()
+            # The whole wallet: use the index
+            return self.get_history_page(reverse=reverse)
         # 1. Get the history of each address in the domain, maintain the
         #    delta of a tx as the sum of its deltas on domain addresses
         tx_deltas = defaultdict(int)
@@ -1817,41 +2078,63 @@ class Abstract_Wallet(PrintError):
     def export_history(self, domain=None, from_timestamp=None, to_timestamp=None, fx=None,
                        show_addresses=False, decimal_point=8,
                        *, fee_calc_timeout=10.0, download_inputs=False,
-                       progress_callback=None):
-        ''' Export history. Used by RPC & GUI.
+                       progress_callback=None, offset=0, limit=None):
+        ''' Export history. Used by RPC & GUI. Returns a list of dicts, one
+        per history item. See export_history_iter to get them one at a time
+        instead, eg to write them out to a file as they are produced.
 
         Arg notes:
-        - `fee_calc_timeout` is used when computing the fee (which is done
-          asynchronously in another thread) to limit the total amount of time in
-          seconds spent waiting for fee calculation. The timeout is a total time
-          allotment for this function call. (The reason the fee calc can take a
-          long time is for some pathological tx's, it is very slow to calculate
-          fee as it involves deserializing prevout_tx from the wallet, for each
-          input).
+        - `fee_calc_timeout` limits the total amount of time in seconds spent
+          waiting for prevout tx's to be downloaded for fee calculation (see
+          `download_inputs`). Fees that can't be calculated in time are
+          exported as '--'.
         - `download_inputs`, if True, will allow for more accurate fee data to
-          be exported with the history by using the Transaction class input
-          fetcher to download *all* prevout_hash tx's for inputs (even for
-          inputs not in wallet). This feature requires self.network (ie, we need
-          to be online) otherwise it will behave as if download_inputs=False.
+          be exported with the history by downloading the prevout tx's for
+          inputs not in the wallet. All of them are requested up-front, in one
+          batch. This feature requires self.network (ie, we need to be online)
+          otherwise it will behave as if download_inputs=False.
         - `progress_callback`, if specified, is a callback which receives a
           single float argument in the range [0.0,1.0] indicating how far along
           the history export is going. This is intended for interop with GUI
           code. Node the progress callback is not guaranteed to be called in the
           context of the main thread, therefore GUI code should use appropriate
           signals/slots to update the GUI with progress info.
+        - `offset` and `limit` select a page of the history (newest first): the
+          first `offset` items are skipped and at most `limit` items (all if
+          None) are exported. For the whole wallet without a time range,
+          only the items of the page are looked at (see get_history_page).
 
         Note on side effects: This function may update self.tx_fees. Rationale:
         it will spend some time trying very hard to calculate accurate fees by
-        examining prevout_tx's (leveraging the fetch_input_data code in the
-        Transaction class). As such, it is worthwhile to cache the results in
+        examining prevout_tx's. As such, it is worthwhile to cache the results in
         self.tx_fees, which gets saved to wallet storage. This is not very
         demanding on storage as even for very large wallets with huge histories,
         tx_fees does not use more than a few hundred kb of space. '''
-        from .util import timestamp_to_datetime
-        # we save copies of tx's we deserialize to this temp dict because we do
-        # *not* want to deserialize tx's in wallet.transactoins since that
-        # wastes memory
-        local_tx_cache = {}
+        return list(self.export_history_iter(domain, from_timestamp, to_timestamp, fx,
+                                             show_addresses, decimal_point,
+                                             fee_calc_timeout=fee_calc_timeout,
+                                             download_inputs=download_inputs,
+                                             progress_callback=progress_callback,
+                                             offset=offset, limit=limit))
+
+    # Max. number of deserialized tx's export_history_iter keeps around
+    EXPORT_TX_CACHE_SIZE = 500
+
+    def export_history_iter(self, domain=None, from_timestamp=None, to_timestamp=None, fx=None,
+                            show_addresses=False, decimal_point=8,
+                            *, fee_calc_timeout=10.0, download_inputs=False,
+                            progress_callback=None, offset=0, limit=None):
+        ''' Generator version of export_history (see that function for the
+        arguments), yielding history items one at a time.
+
+        Fees not already in self.tx_fees are worked out before the first item
+        is yielded, so that any prevout tx's missing from the wallet can be
+        downloaded in a single batch. Memory use stays bounded: at most
+        EXPORT_TX_CACHE_SIZE deserialized tx's are kept at any one time. '''
+        # We keep the tx's we deserialize in this small LRU cache. We do *not*
+        # want to deserialize tx's in wallet.transactions since deserialized
+        # tx's use about 10x the memory of raw ones.
+        tx_cache = OrderedDict()
         # some helpers for this function
         t0 = time.time()
         def time_remaining(): return max(fee_calc_timeout - (time.time()-t0), 0)
@@ -1859,54 +2142,78 @@ class Abstract_Wallet(PrintError):
             ''' Can happen in rare circumstances if wallet history is being
             radically reorged by network thread while we are in this code. '''
         def get_tx(tx_hash):
-            ''' Try to get a tx from wallet, then from the Transaction class
-            cache if that fails. In either case it deserializes the copy and
-            puts the deserialized tx in local stack dict local_tx_cache. The
-            reason we don't deserialize the tx's from self.transactions is that
-            we do not want to keep deserialized tx's in memory. The
-            self.transactions dict should contain just raw tx's (not
-            deserialized). Deserialized tx's eat on the order of 10x the memory
-            because because of the Python lists, dict, etc they contain, per
-            instance. '''
-            tx = local_tx_cache.get(tx_hash)
+            ''' Returns a deserialized copy of a tx from the wallet or from the
+            Transaction class cache, or None if it's in neither. '''
+            tx = tx_cache.get(tx_hash)
             if tx:
+                tx_cache.move_to_end(tx_hash)
                 return tx
-            tx = Transaction.tx_cache_get(tx_hash)
+            tx = self.transactions.get(tx_hash) or Transaction.tx_cache_get(tx_hash)
             if not tx:
-                tx = copy.deepcopy(self.transactions.get(tx_hash))
-            if tx:
-                tx.deserialize()
-                local_tx_cache[tx_hash] = tx
-            else:
-                raise MissingTx(f'txid {tx_hash} dropped out of wallet history while exporting')
+                return None
+            tx = Transaction(tx.raw)
+            tx.deserialize()
+            tx_cache[tx_hash] = tx
+            if len(tx_cache) > self.EXPORT_TX_CACHE_SIZE:
+                tx_cache.popitem(last=False)
             return tx
-        def try_calc_fee(tx_hash):
-            ''' Try to calc fee from cheapest to most expensive calculation.
-            Ultimately asks the transaction class to look at prevouts in wallet and uses
-            that scheme as a last (more CPU intensive) resort. '''
-            fee = self.tx_fees.get(tx_hash)
-            if fee is not None:
-                return fee
-            def do_get_fee(tx_hash):
-                tx = get_tx(tx_hash)
-                def try_get_fee(tx):
-                    try: return tx.get_fee()
-                    except InputValueMissing: pass
-                fee = try_get_fee(tx)
+        prevout_values = dict()  # 'prevout_hash:n' -> value, for downloaded prevouts
+        def calc_fee(tx_hash):
+            ''' Returns (fee, missing). If the value of some inputs can't be
+            found in the wallet, fee is None and missing is a list of their
+            (prevout_hash, prevout_n). '''
+            tx = get_tx(tx_hash)
+            if not tx:
+                raise MissingTx(f'txid {tx_hash} dropped out of wallet history while exporting')
+            inputs = tx.inputs()
+            if inputs and inputs[0].get('type') == 'coinbase':
+                return 0, ()
+            # values of inputs spending our own coins are in self.txi
+            known = {ser: v for l in self.txi.get(tx_hash, {}).values() for ser, v in l}
+            input_value, missing = 0, []
+            for txin in inputs:
+                prevout_hash, n = txin['prevout_hash'], txin['prevout_n']
+                ser = prevout_hash + ':%d'%n
+                value = known.get(ser, prevout_values.get(ser))
+                if value is None:
+                    prev_tx = get_tx(prevout_hash)
+                    if prev_tx and n < len(prev_tx.outputs()):
+                        value = prev_tx.outputs()[n][2]
+                if value is None:
+                    missing.append((prevout_hash, n))
+                else:
+                    input_value += value
+            if missing:
+                return None, missing
+            return input_value - tx.output_value(), ()
+        def download_prevouts(needed):
+            ''' Requests all the tx's in `needed` (a dict of prevout_hash ->
+            set of prevout_n) at once, and puts the values of the needed
+            outputs into prevout_values as they come in. '''
+            q = queue.Queue()
+            self.network.send([('blockchain.transaction.get', [prevout_hash])
+                               for prevout_hash in needed], q.put)
+            for _ in range(len(needed)):
                 t_remain = time_remaining()
-                if fee is None and t_remain:
-                    q = queue.Queue()
-                    def done():
-                        q.put(1)
-                    tx.fetch_input_data(self, use_network=bool(download_inputs), done_callback=done)
-                    try: q.get(timeout=t_remain)
-                    except queue.Empty: pass
-                    fee = try_get_fee(tx)
-                return fee
-            fee = do_get_fee(tx_hash)
-            if fee is not None:
-                self.tx_fees[tx_hash] = fee  # save fee to wallet if we bothered to dl/calculate it.
-            return fee
+                if not t_remain:
+                    break
+                try:
+                    r = q.get(timeout=t_remain)
+                except queue.Empty:
+                    break
+                try:
+                    prevout_hash = r['params'][0]
+                    tx = Transaction(r['result'])
+                    assert prevout_hash == Transaction._txid(tx.raw), "txid-is-sane-check"  # protection against phony responses
+                    Transaction.tx_cache_put(tx=tx, txid=prevout_hash)
+                    tx.deserialize()
+                except Exception as e:
+                    self.print_error("export_history: failed to download prevout tx", repr(e))
+                    continue
+                outputs = tx.outputs()
+                for n in needed.get(prevout_hash, ()):
+                    if n < len(outputs):
+                        prevout_values[prevout_hash + ':%d'%n] = outputs[n][2]
         def fmt_amt(v, is_diff):
             if v is None:
                 return '--'
@@ -1914,14 +2221,13 @@ class Abstract_Wallet(PrintError):
                                    is_diff=is_diff)
 
         # grab history
-        h = self.get_history(domain, reverse=True)
-        out = []
-
-        n, l = 0, max(1, float(len(h)))
-        for tx_hash, height, conf, timestamp, value, balance in h:
-            if progress_callback:
-                progress_callback(n/l)
-            n += 1
+        if domain is None and not from_timestamp and not to_timestamp:
+            hist = self.get_history_page(offset, limit)
+            offset, limit = 0, None  # already applied
+        else:
+            hist = self.get_history(domain, reverse=True)
+        h = []
+        for tx_hash, height, conf, timestamp, value, balance in hist:
             timestamp_safe = timestamp
             if timestamp is None:
                 timestamp_safe = time.time()  # set it to "now" so below code doesn't explode.
@@ -1929,8 +2235,52 @@ class Abstract_Wallet(PrintError):
                 continue
             if to_timestamp and timestamp_safe >= to_timestamp:
                 continue
+            h.append((tx_hash, height, conf, timestamp, timestamp_safe, value, balance))
+        if offset or limit is not None:
+            h = h[offset:offset + limit if limit is not None else None]
+
+        # First pass: calculate the fees we can from wallet data, and note the
+        # prevouts we'd need to download for the rest.
+        l = max(1, float(len(h)))
+        needed = defaultdict(set)  # prevout_hash -> {prevout_n, ...}
+        fees_missing = set()
+        for n, item in enumerate(h):
+            tx_hash = item[0]
+            if progress_callback:
+                progress_callback(n/l/2.0)
+            if self.tx_fees.get(tx_hash) is not None:
+                continue
             try:
-                fee = try_calc_fee(tx_hash)
+                fee, missing = calc_fee(tx_hash)
+            except MissingTx:
+                continue  # will be reported below
+            if fee is not None:
+                with self.lock:  # may run from a concurrent RPC 'history' command
+                    self.tx_fees[tx_hash] = fee  # save fee to wallet since we bothered to calculate it.
+            else:
+                fees_missing.add(tx_hash)
+                for prevout_hash, prevout_n in missing:
+                    needed[prevout_hash].add(prevout_n)
+        if needed and download_inputs and self.network:
+            download_prevouts(needed)
+        needed.clear()
+
+        # Looking up all the fiat rates at once is much faster than per item
+        fx_rates = fx.history_rates([item[4] for item in h]) if fx is not None else None
+
+        for n, (tx_hash, height, conf, timestamp, timestamp_safe, value, balance) in enumerate(h):
+            if progress_callback:
+                progress_callback(0.5 + n/l/2.0)
+            try:
+                fee = self.tx_fees.get(tx_hash)
+                if fee is None and tx_hash in fees_missing and prevout_values:
+                    fee = calc_fee(tx_hash)[0]
+                    if fee is not None:
+                        with self.lock:
+                            self.tx_fees[tx_hash] = fee
+                tx = get_tx(tx_hash) if show_addresses else None
+                if show_addresses and not tx:
+                    raise MissingTx(f'txid {tx_hash} dropped out of wallet history while exporting')
             except MissingTx as e:
                 self.print_error(str(e))
                 continue
@@ -1957,7 +2307,6 @@ class Abstract_Wallet(PrintError):
                 self.print_error(f"Warning: could not export label for {tx_hash}, defaulting to ???")
                 item['label'] = "???"
             if show_addresses:
-                tx = get_tx(tx_hash)
                 input_addresses = []
                 output_addresses = []
                 for x in tx.inputs():
@@ -1970,14 +2319,13 @@ class Abstract_Wallet(PrintError):
                 item['input_addresses'] = input_addresses
                 item['output_addresses'] = output_addresses
             if fx is not None:
-                date = timestamp_to_datetime(timestamp_safe)
-                item['fiat_value'] = fx.historical_value_str(value, date)
-                item['fiat_balance'] = fx.historical_value_str(balance, date)
-                item['fiat_fee'] = fx.historical_value_str(fee, date)
-            out.append(item)
+                rate = fx_rates[n]
+                item['fiat_value'] = fx.value_str(value, rate)
+                item['fiat_balance'] = fx.value_str(balance, rate)
+                item['fiat_fee'] = fx.value_str(fee, rate)
+            yield item
         if progress_callback:
             progress_callback(1.0)  # indicate done, just in case client code expects a 1.0 in order to detect completion
-        return out
 
     def get_label(self, tx_hash):
         label = self.labels.get(tx_hash, '')
@@ -2100,7 +2448,7 @@ class Abstract_Wallet(PrintError):
         if i_max is None:
             # Let the coin chooser select the coins to spend
             max_change = self.max_change_outputs if self.multiple_change else 1
-            coin_chooser = coinchooser.CoinChooserPrivacy()
+            coin_chooser = coinchooser.get_coin_chooser(config)
             tx = coin_chooser.make_tx(inputs, outputs, change_addrs[:max_change],
                                         fee_estimator, self.dust_threshold(), sign_schnorr=sign_schnorr,
                                         mandatory_coins=mandatory_coins)
@@ -2184,7 +2532,7 @@ class Abstract_Wallet(PrintError):
         if i_max is None:
             # Let the coin chooser select the coins to spend
             max_change = self.max_change_outputs if self.multiple_change else 1
-            coin_chooser = coinchooser.CoinChooserPrivacy()
+            coin_chooser = coinchooser.get_coin_chooser(config)
             # determine if this transaction should utilize all available inputs
             tx = coin_chooser.make_tx(inputs, outputs, change_addrs[:max_change],
                                       fee_estimator, self.dust_threshold(), sign_schnorr=sign_schnorr)
@@ -2298,16 +2646,27 @@ class Abstract_Wallet(PrintError):
             self.activate_slp()
 
     def start_threads(self, network):
+        with self._load_phase('start_threads'):
+            self._start_threads(network)
+
+    def _start_threads(self, network):
         self.network = network
         if self.network is not None:
+            self._update_tx_store_privacy()
             if self.is_slp:
                 # Note: it's important that SLP data structures are defined
                 # before the network (SPV/Synchronizer) callbacks are installed
                 # otherwise we may receive a tx from the network thread
                 # before SLP objects are properly constructed.
+                # (The validators are imported here as they're only needed
+                # once online, and one-shot commands never need them.)
+                from . import slp_validator_0x01, slp_validator_0x01_nft1
                 self.slp_graph_0x01 = slp_validator_0x01.shared_context
                 self.slp_graph_0x01_nft = slp_validator_0x01_nft1.shared_context_nft1
-                self.activate_slp()
+                # Kicking off validation of every token tx isn't needed to
+                # show the wallet, so it's done in the background.
+                threading.Thread(target=self._activate_slp_deferred, daemon=True,
+                                 name="activate_slp/" + self.diagnostic_name()).start()
                 self.network.register_callback(self._slp_callback_on_status, ['status'])
             self.start_pruned_txo_cleaner_thread()
             self.prepare_for_verifier()
@@ -2320,6 +2679,14 @@ class Abstract_Wallet(PrintError):
             self.verifier = None
             self.synchronizer = None
 
+    def _update_tx_store_privacy(self):
+        ''' Keeps the app-wide tx store from writing our tx's to disk, in
+        the clear, if our own storage is encrypted. '''
+        if self.storage.is_encrypted():
+            tx_store.shared_store.add_private_owner(self)
+        else:
+            tx_store.shared_store.remove_private_owner(self)
+
     def stop_threads(self):
         if self.network:
             # Note: syncrhonizer and verifier will remove themselves from the
@@ -2333,6 +2700,7 @@ class Abstract_Wallet(PrintError):
             self.verifier.release()
             self.synchronizer = None
             self.verifier = None
+            tx_store.shared_store.remove_private_owner(self)
             self.stop_pruned_txo_cleaner_thread()
             # Now no references to the syncronizer or verifier
             # remain so they will be GC-ed
@@ -2518,7 +2886,7 @@ class Abstract_Wallet(PrintError):
                 info[addr] = index, sorted_xpubs, self.m if isinstance(self, Multisig_Wallet) else None, self.txin_type
         tx.output_info = info
 
-    def sign_transaction(self, tx, password, *, use_cache=False):
+    def sign_transaction(self, tx, password, *, use_cache=False, num_workers=0):
         """ Sign a transaction, requires password (may be None for password-less
         wallets). If `use_cache` is enabled then signing will be much faster.
 
@@ -2526,6 +2894,11 @@ class Abstract_Wallet(PrintError):
         takes only O(N + M) with the cache, as opposed to O(N^2 + NM) without
         the cache.
 
+        If `num_workers` > 1, software keystores derive keys and sign large
+        transactions using that many worker processes (see the 'sign_workers'
+        config key). The resulting signatures are the same as when signing
+        serially.
+
         Warning: If you modify non-signature parts of the transaction
         afterwards, do not use `use_cache`! """
 
@@ -2540,7 +2913,10 @@ class Abstract_Wallet(PrintError):
         for k in self.get_keystores():
             try:
                 if k.can_sign(tx):
-                    k.sign_transaction(tx, password, use_cache=use_cache)
+                    if num_workers > 1 and isinstance(k, Software_KeyStore):
+                        k.sign_transaction(tx, password, use_cache=use_cache, num_workers=num_workers)
+                    else:
+                        k.sign_transaction(tx, password, use_cache=use_cache)
             except UserCancelled:
                 continue
 
@@ -2716,6 +3092,7 @@ class Abstract_Wallet(PrintError):
     def sign_payment_request(self, key, alias, alias_addr, password):
         req = self.receive_requests.get(key)
         alias_privkey = self.export_private_key(alias_addr, password)
+        from . import paymentrequest
         pr = paymentrequest.make_unsigned_request(req)
         paymentrequest.sign_request_with_alias(pr, alias, alias_privkey)
         req['name'] = pr.pki_data
@@ -2736,6 +3113,7 @@ class Abstract_Wallet(PrintError):
         rdir = config.get('requests_dir')
         if rdir and amount is not None:
             key = req.get('id', addr_text)
+            from . import paymentrequest
             pr = paymentrequest.make_request(config, req)
             path = os.path.join(rdir, 'req', key[0], key[1], key)
             if not os.path.exists(path):
@@ -2850,7 +3228,8 @@ class Abstract_Wallet(PrintError):
         do_addr_save = False
         with self.lock:
             self.transactions.clear(); self.unverified_tx.clear(); self.verified_tx.clear()
-            self._slp_txo.clear(); self.slpv1_validity.clear(); self.token_types.clear(); self.tx_tokinfo.clear()
+            self._verified_index = VerifiedTxIndex()
+            self._slp_txo.clear(); self._slp_token_index.clear(); self.slpv1_validity.clear(); self.token_types.clear(); self.tx_tokinfo.clear()
             self.clear_history()
             if isinstance(self, Standard_Wallet):
                 # reset the address list to default too, just in case. New synchronizer will pick up the addresses again.
@@ -2944,6 +3323,8 @@ class Simple_Wallet(Abstract_Wallet):
             self.save_keystore()
         self.storage.set_password(new_pw, encrypt)
         self.storage.write()
+        if self.network:
+            self._update_tx_store_privacy()
 
     def save_keystore(self):
         self.storage.put('keystore', self.keystore.dump())
@@ -3003,11 +3384,13 @@ class ImportedWalletBase(Simple_Wallet):
                         transactions_new.add(tx_hash)
             transactions_to_remove -= transactions_new
             self._history.pop(address, None)
+            self._history_index.invalidate_all()
 
             for tx_hash in transactions_to_remove:
                 self.remove_transaction(tx_hash)
                 self.tx_fees.pop(tx_hash, None)
                 self.verified_tx.pop(tx_hash, None)
+                self._verified_index.remove(tx_hash)
                 self.unverified_tx.pop(tx_hash, None)
                 self.transactions.pop(tx_hash, None)
                 self._addr_bal_cache.pop(address, None)  # not strictly necessary, above calls also have this side-effect. but here to be safe. :)
@@ -3435,6 +3818,8 @@ class Multisig_Wallet(Deterministic_Wallet):
                 self.storage.put(name, keystore.dump())
         self.storage.set_password(new_pw, encrypt)
         self.storage.write()
+        if self.network:
+            self._update_tx_store_privacy()
 
     def has_seed(self):
         return self.keystore.has_seed()
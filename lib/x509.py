@@ -26,6 +26,10 @@ from . import util
 from .util import profiler, bh2u
 import ecdsa
 import hashlib
+import json
+import os
+import threading
+import time
 
 # algo OIDs
 ALGO_RSA_SHA1 = '1.2.840.113549.1.1.5'
@@ -293,12 +297,16 @@ class X509(object):
     def check_ca(self):
         return self.CA
 
-    def check_date(self):
-        import time
-        now = time.time()
+    def get_validity(self):
+        ''' Returns (not_before, not_after) as timestamps. '''
         TIMESTAMP_FMT = '%y%m%d%H%M%SZ'
         not_before = time.mktime(time.strptime(self.notBefore.decode('ascii'), TIMESTAMP_FMT))
         not_after = time.mktime(time.strptime(self.notAfter.decode('ascii'), TIMESTAMP_FMT))
+        return not_before, not_after
+
+    def check_date(self):
+        now = time.time()
+        not_before, not_after = self.get_validity()
         if not_before > now:
             raise CertificateError('Certificate for {} has not yet entered its valid date range. ({})'
                                    .format(self.get_common_name(),
@@ -338,6 +346,122 @@ def load_certificates(ca_path):
     return ca_list, ca_keyID
 
 
+class CAIndex:
+    ''' The trusted CA certificates of a PEM bundle, by fingerprint and keyID.
+
+    Building the index parses every certificate in the bundle, which is slow
+    in pure Python. If `index_path` is given, the index is saved there along
+    with the bundle's size and mtime and reused by later runs, which then only
+    parse a certificate when it is first looked up.
+
+    Lookups only return certificates within their validity period. '''
+
+    VERSION = 1
+
+    def __init__(self, ca_path, index_path=None):
+        self.ca_path = ca_path
+        self.index_path = index_path
+        self.lock = threading.Lock()
+        self.ders = None  # the DER certificates of the bundle, read when needed
+        self.certs = {}  # fingerprint -> X509, parsed when needed
+        self.entries = {}  # fingerprint -> (position in bundle, not_before, not_after)
+        self.keyIDs = {}  # keyID -> [fingerprint, ...]
+        if not (index_path and self._load_index()):
+            self._build()
+            if index_path:
+                self._save_index()
+
+    def _bundle_stat(self):
+        st = os.stat(self.ca_path)
+        return [st.st_size, st.st_mtime]
+
+    def _read_ders(self):
+        from . import pem
+        with open(self.ca_path, 'r', encoding='utf-8') as f:
+            return pem.dePemList(f.read(), "CERTIFICATE")
+
+    def _add(self, fp, pos, not_before, not_after, keyID):
+        self.entries[fp] = (pos, not_before, not_after)
+        self.keyIDs.setdefault(keyID, []).append(fp)
+
+    @profiler
+    def _build(self):
+        self.ders = self._read_ders()
+        for pos, b in enumerate(self.ders):
+            try:
+                x = X509(b)
+                not_before, not_after = x.get_validity()
+            except BaseException as e:
+                util.print_error("cert error:", e)
+                continue
+            fp = x.getFingerprint()
+            self.certs[fp] = x
+            self._add(fp, pos, not_before, not_after, x.get_keyID())
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                d = json.load(f)
+            if (d.get('version') != self.VERSION or d.get('ca_path') != self.ca_path
+                    or d.get('stat') != self._bundle_stat()):
+                return False
+            for fp, pos, not_before, not_after, keyID in d['certs']:
+                self._add(bytes.fromhex(fp), pos, not_before, not_after, keyID)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            util.print_error("CA index not loaded:", repr(e))
+            self.entries, self.keyIDs = {}, {}
+            return False
+        return True
+
+    def _save_index(self):
+        keyID_of = {fp: keyID for keyID, fps in self.keyIDs.items() for fp in fps}
+        d = {
+            'version': self.VERSION,
+            'ca_path': self.ca_path,
+            'stat': self._bundle_stat(),
+            'certs': [[fp.hex(), pos, not_before, not_after, keyID_of[fp]]
+                      for fp, (pos, not_before, not_after) in self.entries.items()],
+        }
+        try:
+            tmp = self.index_path + '.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(d, f)
+            os.replace(tmp, self.index_path)
+        except OSError as e:
+            util.print_error("CA index not saved:", repr(e))
+
+    def get(self, fp, default=None):
+        ''' Returns the X509 with fingerprint `fp`, if currently valid. '''
+        entry = self.entries.get(fp)
+        if not entry or not entry[1] <= time.time() < entry[2]:
+            return default
+        x = self.certs.get(fp)
+        if x is None:
+            with self.lock:
+                if self.ders is None:
+                    self.ders = self._read_ders()
+                x = self.certs[fp] = X509(self.ders[entry[0]])
+        return x
+
+    def get_by_keyID(self, keyID):
+        ''' Returns the fingerprint of the valid certificate with `keyID`, or None. '''
+        for fp in self.keyIDs.get(keyID, ()):
+            if self.get(fp) is not None:
+                return fp
+
+    def __contains__(self, fp):
+        return self.get(fp) is not None
+
+    def __getitem__(self, fp):
+        x = self.get(fp)
+        if x is None:
+            raise KeyError(fp)
+        return x
+
+    def __len__(self):
+        return len(self.entries)
+
+
 if __name__ == "__main__":
     import requests
 